@@ -1,73 +1,375 @@
+import time
+STARTED = time.perf_counter() # Before the other imports, so the startup profile includes them
+import io
 import os
+import hmac
+import json
 import joblib
 import numpy as np
-import pandas as pd
-from flask import Flask, request, render_template
+from flask import Flask, Response, g, jsonify, request, render_template, stream_with_context
+from src.batch_prediction import LABELS, iter_csv_chunks, records_to_array
+from src.drift_monitor import DriftMonitor, RetrainTrigger, load_reference
+from src.explanations import explanation_records
+from src.feature_transform import FeatureTransform, RAW_FEATURES
+from src.model_bundle import BundleManager, ModelBundle, build_predictor, current_version
+from src.metrics import METRICS, PREDICTIONS, REQUEST_SECONDS, SERVING_STAGE_SECONDS
+from src.request_batcher import MicroBatcher
+from src.prediction_cache import PredictionCache
+from utils.common_functions import read_yaml
+from config.paths_config import (BUNDLES_DIR, CONFIG_PATH, DRIFT_REFERENCE_PATH, DRIFT_TRIGGER_PATH, ENGINE_OUTPUT_PATH,
+                                 FEATURE_TRANSFORM_PATH, GLOBAL_IMPORTANCE_PATH)
 
 # This code is part of a Flask web application that serves a machine learning model for diabetes prediction.
-# It includes routes for the home page and a prediction endpoint.
+# It includes routes for the home page, a single-row prediction endpoint and a batch prediction endpoint.
+# `python app.py` starts the development server; production runs the same module under gunicorn
+# (gunicorn -c gunicorn.conf.py app:app), which imports it once and forks the workers from it.
+# The model comes from the versioned bundle named by artifacts/bundles/CURRENT (src/model_bundle.py); a new bundle
+# is loaded and swapped in without a restart, and every prediction response carries its version in X-Model-Version.
+# Startup is kept short for autoscaling: pandas and the training libraries are imported only by the code that needs
+# them, and the model and Flask are warmed up at import, so /health reports ready only once a request is fast.
+# /metrics exposes per-step latency histograms (src/metrics.py) in the Prometheus text format.
+# /explain returns the contribution of every raw input to a prediction (src/explanations.py), for one row or a batch.
+# Every scored row is counted into the bins of the bundle's training reference; /drift compares them (src/drift_monitor.py).
 app = Flask(__name__)  # Initialize Flask application
 
-MODEL_PATH = os.path.join('artifacts', 'models', 'lgmb_model.pkl') # Path to the trained model
-SCALER_PATH = os.path.join('artifacts', 'processed', 'scaler.joblib') # Path to the scaler used for feature scaling
+MODEL_PATH = os.path.join('artifacts', 'models', 'lgmb_model.pkl') # Path to the trained model, used when no bundle was published
+SCALER_PATH = os.path.join('artifacts', 'processed', 'scaler.joblib') # Path to the scaler, used when no feature transform was saved
+SERVING_CONFIG = read_yaml(CONFIG_PATH).get('serving', {}) # Serving settings from config.yaml
+BATCH_CHUNK_SIZE = SERVING_CONFIG.get('batch_chunk_size', 10000) # Rows scored per transform/model call
+ENGINE = SERVING_CONFIG.get('engine', 'sklearn') # Which artifacts back the predictor
+MODEL_THREADS = SERVING_CONFIG.get('server', {}).get('model_threads') # LightGBM threads per model call, None for all cores
+BUNDLE_CONFIG = SERVING_CONFIG.get('bundles', {}) # Hot reload settings
+MICRO_BATCHING = SERVING_CONFIG.get('micro_batching', {}) # Optional request coalescing for /predict
+EXPLAIN_TOP_K = SERVING_CONFIG.get('explanations', {}).get('top_k', 3) # Inputs listed as the main reasons of a prediction
+DRIFT_CONFIG = SERVING_CONFIG.get('drift', {}) # Live traffic against the training distribution
+PARSE_SPAN = SERVING_STAGE_SECONDS.labels('parse') # Steps of /predict; the predictor times the ones in between
+RENDER_SPAN = SERVING_STAGE_SECONDS.labels('render')
+STARTUP_TARGET = SERVING_CONFIG.get('startup', {}).get('target_seconds') # Cold start budget, warned about when exceeded
+startup = {'imports_seconds': round(time.perf_counter() - STARTED, 3)} # Startup profile, reported by /health
 
+def load_transform(): # Fitted FeatureTransform; older runs only saved scaler.joblib, which is wrapped without imputation
+    if os.path.exists(FEATURE_TRANSFORM_PATH):
+        return joblib.load(FEATURE_TRANSFORM_PATH)
+    return FeatureTransform.from_scaler(joblib.load(SCALER_PATH))
+
+def attach_drift(bundle): # Drift monitor against the bundle's own reference, in place before the bundle takes traffic
+    reference = load_reference(bundle.files.get('drift')) if DRIFT_CONFIG.get('enabled', True) else None
+    if reference is not None:
+        bundle.drift = DriftMonitor(
+            reference,
+            window_seconds=DRIFT_CONFIG.get('window_seconds', 3600),
+            min_rows=DRIFT_CONFIG.get('min_rows', 500),
+            psi_threshold=DRIFT_CONFIG.get('psi_threshold', 0.2),
+            ks_threshold=DRIFT_CONFIG.get('ks_threshold', 0.1),
+        )
+    return bundle
+
+def load_bundle(version): # Predictor of one published bundle
+    return attach_drift(ModelBundle.load(BUNDLES_DIR, version, ENGINE, BATCH_CHUNK_SIZE, MODEL_THREADS))
+
+def load_unversioned(): # Artifacts of a training run from before bundles were published
+    predictor = build_predictor(ENGINE, load_transform(), MODEL_PATH, ENGINE_OUTPUT_PATH, BATCH_CHUNK_SIZE, MODEL_THREADS)
+    files = {'model': MODEL_PATH, 'importance': GLOBAL_IMPORTANCE_PATH, 'drift': DRIFT_REFERENCE_PATH}
+    return attach_drift(ModelBundle("unversioned", predictor, files=files, model_threads=MODEL_THREADS))
+
+def attach_batcher(bundle, old=None): # Every bundle gets its own batcher, so a batch never mixes two models
+    if MICRO_BATCHING.get('enabled', False) and bundle.batcher is None:
+        bundle.batcher = MicroBatcher(
+            bundle.predictor,
+            max_batch_size=MICRO_BATCHING.get('max_batch_size', 64),
+            max_wait_ms=MICRO_BATCHING.get('max_wait_ms', 2),
+        )
+    elif bundle.batcher is not None:
+        bundle.batcher.reopen() # Back after a rollback
+    if old is not None and old.batcher is not None:
+        old.batcher.close() # Requests still holding the old bundle are scored directly
+
+bundles = BundleManager(
+    BUNDLES_DIR, load_bundle,
+    poll_seconds=BUNDLE_CONFIG.get('poll_seconds', 5),
+    keep_loaded=BUNDLE_CONFIG.get('keep_loaded', 1),
+    on_swap=attach_batcher,
+)
 try:
-    # Load the pre-trained model and scaler
-    model = joblib.load(MODEL_PATH) # Load the LightGBM model
-    scaler = joblib.load(SCALER_PATH) # Load the scaler for feature scaling
-    print("Model and scaler loaded successfully.")
+    # Loaded before gunicorn forks, so the workers share the first bundle's pages
+    loading = time.perf_counter()
+    bundle = bundles.start() if current_version(BUNDLES_DIR) else bundles.start(load_unversioned().warm_up())
+    attach_batcher(bundle)
+    startup['load_seconds'] = round(time.perf_counter() - loading, 3) # Includes the warm-up prediction
+    print(f"Model bundle {bundle.version} loaded successfully.")
 except FileNotFoundError as e:
     print(f"Error loading artifacts: {e}. Make sure the paths are correct and artifacts exist.")
-    model = None
-    scaler = None
 except Exception as e:
     print(f"An unexpected error occurred during artifact loading: {e}")
-    model = None
-    scaler = None
+
+RETRAIN_CONFIG = DRIFT_CONFIG.get('retrain', {}) # Optional retrain request when a check finds drift
+retrain = None
+if RETRAIN_CONFIG.get('enabled', False):
+    retrain = RetrainTrigger(
+        DRIFT_TRIGGER_PATH,
+        check_seconds=RETRAIN_CONFIG.get('check_seconds', 300),
+        cooldown_seconds=RETRAIN_CONFIG.get('cooldown_seconds', 86400),
+        command=RETRAIN_CONFIG.get('command', ''),
+    )
+
+CACHE_CONFIG = SERVING_CONFIG.get('prediction_cache', {}) # Optional cache of /predict results
+cache = None
+if CACHE_CONFIG.get('enabled', False):
+    cache = PredictionCache(
+        max_size=CACHE_CONFIG.get('max_size', 10000),
+        ttl_seconds=CACHE_CONFIG.get('ttl_seconds', 600),
+        decimals=CACHE_CONFIG.get('decimals', 4),
+        artifact_paths=[ENGINE_OUTPUT_PATH if ENGINE == 'numpy' else MODEL_PATH, FEATURE_TRANSFORM_PATH, SCALER_PATH], # A new model or transform empties the cache
+    )
 
 @app.route('/', methods=['GET']) # Home route
 def home(): # Render the home page
     return render_template('index.html', prediction_text='') # Render the home page with an empty prediction text
 
+def serving_bundle(): # Bundle for this request, read once so a concurrent swap cannot change it halfway
+    bundle = bundles.active
+    if bundle is not None:
+        bundles.ensure_watcher()
+        if retrain is not None:
+            retrain.ensure_watcher(lambda: bundles.active)
+        g.model_version = bundle.version
+    return bundle
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def add_model_version(response): # Which bundle answered, for every prediction
+    version = g.get('model_version')
+    if version is not None:
+        response.headers['X-Model-Version'] = version
+    start = g.get('request_start')
+    if start is not None: # Observed when the response is closed, so streamed batches are timed until their last row
+        labels = (request.endpoint or 'unmatched', str(response.status_code))
+        response.call_on_close(lambda: REQUEST_SECONDS.labels(*labels).observe(time.perf_counter() - start))
+    return response
+
+@app.route('/health', methods=['GET']) # Readiness probe for load balancers and autoscalers
+def health(): # 200 once the model is loaded and the first-request costs are paid, 503 otherwise
+    bundle = bundles.active
+    if bundle is None or 'total_seconds' not in startup:
+        return jsonify(status='unavailable', startup=startup), 503
+    return jsonify(status='ready', version=bundle.version, startup=startup)
+
 @app.route('/predict', methods=['POST']) # Prediction route
 def predict(): # Handle prediction requests
-    if model is None or scaler is None:
-        return render_template('index.html', prediction_text='Error: Model or scaler not loaded.')
+    bundle = serving_bundle()
+    if bundle is None:
+        return render_template('index.html', prediction_text='Error: Model or feature transform not loaded.')
     try:
-        form_features = [float(x) for x in request.form.values()] # Get form data and convert to float
-        feature_names = [ 
-            'Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness', 
-            'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age'
-        ] # Define feature names
-        input_df = pd.DataFrame([form_features], columns=feature_names) # Create DataFrame from input features
-        input_df['Glucose_x_BMI'] = input_df['Glucose'] * input_df['BMI'] # Create interaction feature
-        input_df['Glucose_x_Age'] = input_df['Glucose'] * input_df['Age'] # Create interaction feature
-        input_df['SkinThickness_x_Insulin'] = input_df['SkinThickness'] * input_df['Insulin'] # Create interaction feature
-        
-        scaled_features = scaler.transform(input_df) # Scale the features using the loaded scaler
-        prediction = model.predict(scaled_features)     # Make prediction using the loaded model
-        prediction_proba = model.predict_proba(scaled_features) # Get prediction probabilities
-
-        if prediction[0] == 1: # If the prediction is for 'Diabetic'
+        with PARSE_SPAN.time():
+            form_features = [float(request.form[name]) for name in RAW_FEATURES] # Get form data in training order and convert to float
+        row_key = cache.make_key(form_features) if cache is not None else None # None when the row cannot be cached (NaN)
+        key = (bundle.version, row_key) if row_key is not None else None # Entries of an older bundle never match
+        cached = cache.get(key) if key is not None else None
+        if cached is not None:
+            label, proba = cached # Same inputs seen recently with the same artifacts
+        elif bundle.batcher is not None:
+            label, proba = bundle.batcher.predict(form_features) # Scored together with other in-flight requests
+        else:
+            labels, probas = bundle.predictor.predict(np.array([form_features])) # One model pass; the label is derived from the probability
+            label, proba = int(labels[0]), float(probas[0])
+        if key is not None and cached is None:
+            cache.put(key, (label, proba))
+        if bundle.drift is not None:
+            bundle.drift.observe_row(form_features, proba)
+        PREDICTIONS.inc('predict')
+
+        if label == 1: # If the prediction is for 'Diabetic'
             # Get the confidence score for the 'Diabetic' class
-            confidence = prediction_proba[0][1] * 100
+            confidence = proba * 100
             output_text = f"Prediction: Diabetic (Confidence: {confidence:.2f}%)"
         else:
             # Get the confidence score for the 'Not Diabetic' class
-            confidence = prediction_proba[0][0] * 100
+            confidence = (1 - proba) * 100
             output_text = f"Prediction: Not Diabetic (Confidence: {confidence:.2f}%)"
 
     except Exception as e:
         output_text = f"An error occurred during prediction: {e}"
 
     # Render the page again, this time with the prediction result
-    return render_template('index.html', prediction_text=output_text)
+    with RENDER_SPAN.time():
+        return render_template('index.html', prediction_text=output_text)
 
-if __name__ == '__main__':
-    if model is None or scaler is None:
-        print("Model or scaler not loaded. Exiting the application.")
-    else:
-        app.run(debug=True)  # Run the Flask app in debug mode
+@app.route('/predict_batch', methods=['POST']) # Batch prediction route
+def predict_batch(): # Score many rows; JSON in gives NDJSON out, CSV in gives CSV out
+    bundle = serving_bundle()
+    if bundle is None:
+        return jsonify(error="Model or feature transform not loaded."), 503
+    try:
+        if request.is_json:
+            payload = request.get_json()
+            records = payload.get('instances', []) if isinstance(payload, dict) else payload # Accept {"instances": [...]} or a bare list
+            X_raw = records_to_array(records)
+            chunks = (X_raw[start:start + BATCH_CHUNK_SIZE] for start in range(0, X_raw.shape[0], BATCH_CHUNK_SIZE))
+            return Response(stream_with_context(_ndjson_lines(bundle, chunks)), mimetype='application/x-ndjson')
+
+        body = io.BytesIO(request.get_data()) # CSV body with a header row containing the raw feature names
+        chunks = iter_csv_chunks(body, BATCH_CHUNK_SIZE)
+        return Response(stream_with_context(_csv_lines(bundle, chunks)), mimetype='text/csv')
+    except Exception as e:
+        return jsonify(error=f"Invalid batch request: {e}"), 400
+
+@app.route('/explain', methods=['POST']) # Why a row was flagged
+def explain(): # A form or JSON object gives one explanation; {"instances": [...]} or a list streams NDJSON, one per row
+    bundle = serving_bundle()
+    if bundle is None:
+        return jsonify(error="Model or feature transform not loaded."), 503
+    try:
+        payload = request.get_json() if request.is_json else dict(request.form)
+        if isinstance(payload, dict) and 'instances' not in payload: # One row, by feature name
+            return jsonify(explain_rows(bundle, records_to_array([payload]))[0])
+        records = payload.get('instances', []) if isinstance(payload, dict) else payload
+        X_raw = records_to_array(records)
+        chunks = (X_raw[start:start + BATCH_CHUNK_SIZE] for start in range(0, X_raw.shape[0], BATCH_CHUNK_SIZE))
+        return Response(stream_with_context(_explanation_lines(bundle, chunks)), mimetype='application/x-ndjson')
+    except Exception as e:
+        return jsonify(error=f"Invalid explanation request: {e}"), 400
 
+@app.route('/explain/global', methods=['GET']) # Mean absolute contribution of every input, computed at training time
+def explain_global():
+    bundle = serving_bundle()
+    importance = bundle.global_importance() if bundle is not None else None
+    if importance is None:
+        return jsonify(error="No global importance was saved with this model."), 404
+    return jsonify(importance)
 
+def explain_rows(bundle, X_raw): # Explanation records, from the cache where possible; the misses are explained in one call
+    keys = [cache.make_key(row) for row in X_raw] if cache is not None else [None] * len(X_raw) # None: not cached
+    records = [cache.get(('explain', bundle.version, key)) if key is not None else None for key in keys]
+    missing = [i for i, record in enumerate(records) if record is None]
+    if missing:
+        raw, base, proba = bundle.explainer().explain(X_raw[missing])
+        for j, record in enumerate(explanation_records(raw, base, proba, EXPLAIN_TOP_K)):
+            i = missing[j]
+            records[i] = record
+            if keys[i] is not None: # Cached next to the prediction, which a later /predict of the same row reuses
+                cache.put(('explain', bundle.version, keys[i]), record)
+                cache.put((bundle.version, keys[i]), (record['prediction'], float(proba[j])))
+    if bundle.drift is not None:
+        bundle.drift.observe(X_raw, [record['probability'] for record in records])
+    PREDICTIONS.inc('explain', amount=len(records))
+    return records
 
+@app.route('/drift', methods=['GET']) # Live traffic of this worker against the training reference
+def drift(): # PSI and KS per feature and for the predicted probability, computed now over the current window
+    bundle = serving_bundle()
+    if bundle is None or bundle.drift is None:
+        return jsonify(error="No drift reference was saved with this model."), 404
+    report = bundle.drift.check()
+    report['version'] = bundle.version
+    report['worker'] = os.getpid() # Each server process counts its own share of the traffic
+    if retrain is not None:
+        report['retrain_requested'] = retrain.maybe_fire(report, bundle.version)
+    return jsonify(report)
+
+@app.route('/batcher/stats', methods=['GET']) # Micro-batching metrics
+def batcher_stats(): # Batch fill rate and added queueing latency
+    bundle = bundles.active
+    if bundle is None or bundle.batcher is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **bundle.batcher.stats())
+
+@app.route('/metrics', methods=['GET']) # Prometheus scrape endpoint
+def metrics(): # Per-step latency histograms and prediction counters of this worker
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats', methods=['GET']) # Prediction cache metrics
+def cache_stats(): # Hit, miss and eviction counters used to size the cache
+    if cache is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **cache.stats())
+
+def admin_allowed(): # MODEL_ADMIN_TOKEN in the environment enables remote calls with X-Admin-Token; otherwise localhost only
+    token = os.environ.get('MODEL_ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/admin/bundle', methods=['GET']) # Served, pointed-to and available bundle versions
+def bundle_status():
+    if not admin_allowed():
+        return jsonify(error="Forbidden"), 403
+    return jsonify(bundles.status())
+
+@app.route('/admin/reload', methods=['POST']) # Load CURRENT, or {"version": ...}, and swap it in
+def bundle_reload(): # With a version the pointer moves too, so the other server processes follow within poll_seconds
+    if not admin_allowed():
+        return jsonify(error="Forbidden"), 403
+    try:
+        version = (request.get_json(silent=True) or {}).get('version')
+        if version:
+            bundles.activate(version)
+        else:
+            bundles.reload()
+        return jsonify(bundles.status())
+    except FileNotFoundError as e:
+        return jsonify(error=str(e)), 404
+    except Exception as e: # The active bundle keeps serving
+        return jsonify(error=f"Reload failed: {e}"), 500
+
+@app.route('/admin/rollback', methods=['POST']) # Back to the previously served bundle
+def bundle_rollback():
+    if not admin_allowed():
+        return jsonify(error="Forbidden"), 403
+    try:
+        bundles.rollback()
+        return jsonify(bundles.status())
+    except LookupError as e:
+        return jsonify(error=str(e)), 409
+    except Exception as e:
+        return jsonify(error=f"Rollback failed: {e}"), 500
+
+def _scored_chunks(bundle, chunks): # (labels, probabilities) of every chunk, counted by the drift monitor
+    for X_raw in chunks:
+        labels, proba = bundle.predictor.predict(X_raw)
+        if bundle.drift is not None:
+            bundle.drift.observe(X_raw, proba)
+        yield labels, proba
+
+def _ndjson_lines(bundle, chunks): # Stream one JSON object per scored row
+    counter = PREDICTIONS.labels('predict_batch')
+    for labels, proba in _scored_chunks(bundle, chunks):
+        counter.inc(len(labels))
+        yield "".join(
+            json.dumps({"prediction": int(label), "label": LABELS[int(label)], "probability": round(float(p), 6)}) + "\n"
+            for label, p in zip(labels, proba)
+        )
+
+def _explanation_lines(bundle, chunks): # Stream one explanation per row
+    for X_raw in chunks:
+        yield "".join(json.dumps(record) + "\n" for record in explain_rows(bundle, X_raw))
+
+def _csv_lines(bundle, chunks): # Stream a CSV with a header followed by one line per scored row
+    import pandas as pd # Only CSV batches need it; not importing it at startup shortens cold starts
+    yield "prediction,probability\n"
+    counter = PREDICTIONS.labels('predict_batch')
+    for labels, proba in _scored_chunks(bundle, chunks):
+        counter.inc(len(labels))
+        yield pd.DataFrame({"prediction": labels, "probability": proba}).to_csv(header=False, index=False)
+
+def warm_up_app(): # One request through Flask before serving: compiles the template and builds the request machinery
+    warming = time.perf_counter()
+    with app.test_client() as client:
+        client.get('/')
+    startup['warm_up_seconds'] = round(time.perf_counter() - warming, 3)
+    startup['total_seconds'] = round(time.perf_counter() - STARTED, 3)
+    print(f"Started in {startup['total_seconds']:.2f}s (imports {startup['imports_seconds']:.2f}s, "
+          f"model {startup.get('load_seconds', 0):.2f}s, warm-up {startup['warm_up_seconds']:.2f}s)")
+    if STARTUP_TARGET and startup['total_seconds'] > STARTUP_TARGET:
+        print(f"Warning: startup took longer than the {STARTUP_TARGET}s target; profile it with python -m benchmarks.bench_startup")
+
+warm_up_app() # Before gunicorn forks, so every worker starts warm
+
+if __name__ == '__main__':
+    if bundles.active is None:
+        print("Model or feature transform not loaded. Exiting the application.")
+    else:
+        debug = os.environ.get('FLASK_DEBUG', '0').lower() in ('1', 'true', 'yes')  # Debugger off unless asked for, it allows code execution
+        app.run(debug=debug)
@@ -0,0 +1,51 @@
+# Benchmark: rows/sec of /predict_batch against looping the single-row /predict endpoint.
+# Run from the project root after training: python -m benchmarks.bench_batch_prediction --rows 2000
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from src.feature_transform import RAW_FEATURES
+from config.paths_config import RAW_FILE_PATH
+
+
+def sample_rows(n_rows: int) -> pd.DataFrame: # Resample the raw data up to the requested size
+    raw = pd.read_csv(RAW_FILE_PATH)[RAW_FEATURES]
+    return raw.sample(n=n_rows, replace=True, random_state=42).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000, help="Rows scored by each method")
+    parser.add_argument("--loop-rows", type=int, default=500, help="Rows sent one by one to /predict")
+    args = parser.parse_args()
+
+    from app import app # Imported here so the model load is not part of the measured time
+    client = app.test_client()
+    rows = sample_rows(args.rows)
+
+    loop_rows = rows.head(args.loop_rows)
+    start = time.perf_counter()
+    for record in loop_rows.to_dict(orient="records"):
+        client.post("/predict", data={name: str(value) for name, value in record.items()})
+    loop_rate = len(loop_rows) / (time.perf_counter() - start)
+
+    body = json.dumps(rows.to_dict(orient="records"))
+    start = time.perf_counter()
+    response = client.post("/predict_batch", data=body, content_type="application/json")
+    n_json = len(response.get_data(as_text=True).splitlines())
+    json_rate = n_json / (time.perf_counter() - start)
+
+    body = rows.to_csv(index=False)
+    start = time.perf_counter()
+    response = client.post("/predict_batch", data=body, content_type="text/csv")
+    n_csv = len(response.get_data(as_text=True).splitlines()) - 1
+    csv_rate = n_csv / (time.perf_counter() - start)
+
+    print(f"/predict loop      : {loop_rate:>12,.0f} rows/sec ({len(loop_rows)} rows)")
+    print(f"/predict_batch JSON: {json_rate:>12,.0f} rows/sec ({n_json} rows, {json_rate / loop_rate:.0f}x)")
+    print(f"/predict_batch CSV : {csv_rate:>12,.0f} rows/sec ({n_csv} rows, {csv_rate / loop_rate:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
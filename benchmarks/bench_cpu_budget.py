@@ -0,0 +1,45 @@
+# Benchmark: hyperparameter search wall-clock for each way of spending the CPU budget.
+# "unmanaged" is the old behaviour: one search worker per core, each LightGBM model using every core as well.
+# Run from the project root: python -m benchmarks.bench_cpu_budget --search random --repeat 20
+import argparse
+import time
+import numpy as np
+from src.cpu_budget import ParallelPlan, STRATEGIES, resolve_cpu_budget
+from src.model_training import ModelTraining
+from config.paths_config import CONFIG_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--search", choices=["random", "halving"], default=None, help="Defaults to SEARCH_STRATEGY")
+    parser.add_argument("--budget", type=int, default=None, help="Cores to use, defaults to every available core")
+    parser.add_argument("--repeat", type=int, default=1, help="Stack the training set this many times to simulate more data")
+    args = parser.parse_args()
+
+    trainer = ModelTraining(config_path=CONFIG_PATH)
+    trainer.search_strategy = args.search or trainer.search_strategy
+    trainer.cpu_budget = args.budget
+    X_train, y_train, _, _ = trainer.load_processed_data()
+    if args.repeat > 1:
+        X_train = X_train.loc[np.tile(X_train.index, args.repeat)].reset_index(drop=True)
+        y_train = y_train.loc[np.tile(y_train.index, args.repeat)].reset_index(drop=True)
+    scale_pos_weight = (y_train == 0).sum() / (y_train == 1).sum()
+    budget = resolve_cpu_budget(args.budget)
+
+    print(f"{trainer.search_strategy} search, {len(X_train):,} rows, CPU budget {budget}")
+    print(f"{'strategy':<10} {'workers':>8} {'threads':>8} {'wall s':>8}")
+    plans = [("unmanaged", ParallelPlan(workers=budget, threads=0))] # threads=0: LightGBM's default, every core
+    for strategy in STRATEGIES:
+        trainer.parallel_strategy = strategy
+        plans.append((strategy, trainer.parallel_plan(len(X_train))))
+    for name, plan in plans:
+        search = trainer.build_search(scale_pos_weight, plan)
+        if hasattr(search, "verbose"):
+            search.verbose = 0
+        start = time.perf_counter()
+        search.fit(X_train, y_train)
+        print(f"{name:<10} {plan.workers:>8} {plan.threads or 'all':>8} {time.perf_counter() - start:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Benchmark: load time and peak RSS of utils.common_functions.load_data for CSV, Parquet and memory-mapped .npy.
+# Each load runs in a fresh interpreter so the RSS numbers do not leak into each other.
+# Run from the project root: python -m benchmarks.bench_data_formats --rows 1000000
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.feature_transform import MODEL_FEATURES
+from utils.common_functions import save_data
+
+FORMATS = ["csv", "parquet", "npy"]
+
+LOADER = """
+import json, sys, time
+from utils.common_functions import load_data
+start = time.perf_counter()
+df = load_data(sys.argv[1])
+loaded = time.perf_counter() - start
+total = sum(float(df[col].sum()) for col in df.columns) # Touch every value column by column
+scanned = time.perf_counter() - start
+peak_kb = next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmHWM")) # ru_maxrss survives fork/exec, VmHWM does not
+print(json.dumps({"load_s": loaded, "load_and_scan_s": scanned, "max_rss_mb": peak_kb / 1024}))
+"""
+
+
+def make_frame(n_rows: int) -> pd.DataFrame: # Same shape as the processed training data
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(rng.standard_normal((n_rows, len(MODEL_FEATURES))), columns=MODEL_FEATURES)
+    df["Outcome"] = rng.integers(0, 2, n_rows)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'format':<8} {'size MB':>9} {'save s':>8} {'load s':>8} {'load+scan s':>12} {'peak RSS MB':>12}")
+        for fmt in FORMATS:
+            path = os.path.join(tmp, f"processed_train.{fmt}")
+            start = time.perf_counter()
+            try:
+                save_data(df, path)
+            except Exception as e:
+                print(f"{fmt:<8} skipped: {e}")
+                continue
+            save_s = time.perf_counter() - start
+            result = json.loads(subprocess.run([sys.executable, "-c", LOADER, path], check=True,
+                                               capture_output=True, text=True).stdout.splitlines()[-1])
+            print(f"{fmt:<8} {os.path.getsize(path) / 2**20:>9.1f} {save_s:>8.2f} {result['load_s']:>8.3f} "
+                  f"{result['load_and_scan_s']:>12.3f} {result['max_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Benchmark: cost of counting scored rows into the drift monitor (src/drift_monitor.py): one row as in /predict,
+# per row of a batch, with threads updating at once, and the on-demand PSI/KS check. The last lines time /predict
+# with and without the monitor. Run from the project root after training:
+#   python -m benchmarks.bench_drift --rows 20000 --threads 4
+import argparse
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.drift_monitor import DriftMonitor, load_reference
+from src.feature_transform import RAW_FEATURES
+from config.paths_config import DRIFT_REFERENCE_PATH, RAW_FILE_PATH
+
+
+def us_per_call(fn, n: int) -> float: # Best of three
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) / n * 1e6
+
+
+def threaded_us(monitor: DriftMonitor, rows: list, threads: int) -> float: # Wall time per row, every thread updating
+    def work():
+        for row in rows:
+            monitor.observe_row(row, 0.3)
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (len(rows) * threads) * 1e6
+
+
+def predict_medians_us(client, bundle, form: dict, requests: int) -> tuple[float, float]:
+    # Median /predict latency with and without the bundle's monitor, alternating request by request so that
+    # background noise hits both the same
+    monitor, timings = bundle.drift, ([], [])
+    try:
+        for i in range(2 * requests):
+            bundle.drift = monitor if i % 2 == 0 else None
+            form["Glucose"] = 80 + i * 0.01 # A new row every time, so the prediction cache never answers
+            start = time.perf_counter()
+            client.post("/predict", data=form)
+            timings[i % 2].append(time.perf_counter() - start)
+    finally:
+        bundle.drift = monitor
+    return float(np.median(timings[0])) * 1e6, float(np.median(timings[1])) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000, help="Single-row updates timed")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=10000, help="Rows per batch update")
+    parser.add_argument("--requests", type=int, default=2000, help="/predict calls through the Flask test client, per variant")
+    args = parser.parse_args()
+
+    reference = load_reference(DRIFT_REFERENCE_PATH)
+    if reference is None:
+        raise SystemExit(f"No drift reference in {DRIFT_REFERENCE_PATH}; run the training pipeline first")
+    raw = pd.read_csv(RAW_FILE_PATH)[RAW_FEATURES]
+    X = raw.sample(n=max(args.rows, args.batch), replace=True, random_state=42).to_numpy(dtype=np.float64)
+    proba = np.random.default_rng(0).uniform(size=len(X))
+    monitor = DriftMonitor(reference)
+
+    X_rows, proba_rows = X.tolist(), proba.tolist() # /predict passes the parsed form as a list of floats
+    rows = iter(range(10 ** 9))
+    def one_row():
+        i = next(rows) % len(X_rows)
+        monitor.observe_row(X_rows[i], proba_rows[i])
+
+    print(f"{'observe_row':<34} {us_per_call(one_row, args.rows):>8.2f} µs")
+    batch_us = us_per_call(lambda: monitor.observe(X[:args.batch], proba[:args.batch]), 5)
+    print(f"{f'observe, {args.batch} rows':<34} {batch_us / 1e3:>8.2f} ms ({batch_us / args.batch * 1e3:.0f} ns/row)")
+    print(f"{f'observe_row, {args.threads} threads':<34} {threaded_us(monitor, X_rows[:args.rows // args.threads], args.threads):>8.2f} µs")
+    print(f"{'check (PSI and KS, 12 features)':<34} {us_per_call(monitor.check, 200):>8.0f} µs")
+    print(f"{'counts kept':<34} {sum(len(counts) for _, counts in monitor._shards):>8} ({len(monitor._shards)} threads x {monitor.width} bins x {len(monitor.all_names)} distributions)")
+
+    import app # Loads the configured bundle; imported last so the numbers above do not include its threads
+    client = app.app.test_client()
+    form = dict(zip(RAW_FEATURES, X[0]))
+    with_monitor, without = predict_medians_us(client, app.bundles.active, form, args.requests)
+    print(f"{'/predict median, with monitor':<34} {with_monitor:>8.0f} µs")
+    print(f"{'/predict median, without':<34} {without:>8.0f} µs ({(with_monitor - without) / without:+.1%})")
+
+
+if __name__ == "__main__":
+    main()
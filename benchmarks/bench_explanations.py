@@ -0,0 +1,63 @@
+# Benchmark: latency of explaining a batch (pred_contrib, mapped to the raw inputs) against predicting it, for
+# batch sizes from one row to 10k, and the cost of a repeated row that the cache already explained.
+# Run from the project root after training:
+#   python -m benchmarks.bench_explanations --sizes 1 10 100 1000 10000
+import argparse
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from src.explanations import Explainer, explanation_records
+from src.feature_transform import RAW_FEATURES
+from config.paths_config import RAW_FILE_PATH, MODEL_OUTPUT_PATH, FEATURE_TRANSFORM_PATH
+
+
+def best_seconds(fn, repeats: int) -> float: # Fastest of several runs, so one-off noise does not count
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000], help="Rows per batch")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="LightGBM threads per call, default all cores")
+    parser.add_argument("--requests", type=int, default=500, help="/explain calls through the Flask test client")
+    args = parser.parse_args()
+
+    model, transform = joblib.load(MODEL_OUTPUT_PATH), joblib.load(FEATURE_TRANSFORM_PATH)
+    if args.threads:
+        model.set_params(n_jobs=args.threads)
+    explainer = Explainer(model, transform, threads=args.threads)
+    raw = pd.read_csv(RAW_FILE_PATH)[RAW_FEATURES]
+    X_all = raw.sample(n=max(args.sizes), replace=True, random_state=42).to_numpy(dtype=np.float64)
+
+    print(f"{'rows':>6} {'predict ms':>11} {'explain ms':>11} {'+ records ms':>13} {'explain µs/row':>15} {'ratio':>6}")
+    for size in args.sizes:
+        X = X_all[:size]
+        predict = best_seconds(lambda: model.predict_proba(transform.transform(X)), args.repeats)
+        explain = best_seconds(lambda: explainer.explain(X), args.repeats)
+        records = best_seconds(lambda: explanation_records(*explainer.explain(X)), args.repeats)
+        print(f"{size:>6} {predict * 1e3:>11.2f} {explain * 1e3:>11.2f} {records * 1e3:>13.2f} "
+              f"{explain / size * 1e6:>15.1f} {explain / predict:>5.1f}x")
+
+    import app # Loads the configured bundle; the endpoint numbers include parsing, caching and rendering
+    client = app.app.test_client()
+    form = dict(zip(RAW_FEATURES, X_all[0]))
+    for name, vary in (("/explain, new rows", True), ("/explain, cached row", False)):
+        timings = []
+        for i in range(args.requests):
+            if vary:
+                form["Glucose"] = 80 + i * 0.01 # A new row every time, so the cache never answers
+            start = time.perf_counter()
+            client.post("/explain", data=form)
+            timings.append(time.perf_counter() - start)
+        print(f"{name + ' median':<28} {np.median(timings) * 1e6:>8.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Benchmark: FeatureTransform against the previous DataPreprocessor.process steps
+# (pandas feature engineering, SimpleImputer, RobustScaler, pd.concat), for fitting and for serving-sized batches.
+# Run from the project root: python -m benchmarks.bench_feature_transform --rows 1000000
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import RobustScaler
+from src.feature_transform import FeatureTransform, MODEL_FEATURES, RAW_FEATURES
+from config.paths_config import RAW_FILE_PATH
+
+
+def pandas_process(df: pd.DataFrame) -> pd.DataFrame: # The fit path as it was before FeatureTransform
+    df = df.copy()
+    df['Glucose_x_BMI'] = df['Glucose'] * df['BMI']
+    df['Glucose_x_Age'] = df['Glucose'] * df['Age']
+    df['SkinThickness_x_Insulin'] = df['SkinThickness'] * df['Insulin']
+    X = df.drop(columns=['Outcome'])
+    y = df[['Outcome']]
+    X[MODEL_FEATURES] = SimpleImputer(strategy='mean').fit_transform(X[MODEL_FEATURES])
+    X[MODEL_FEATURES] = RobustScaler().fit_transform(X[MODEL_FEATURES])
+    return pd.concat([X, y], axis=1)
+
+
+def pandas_serve(df: pd.DataFrame, scaler) -> np.ndarray: # The per-request path as it was in app.py
+    df = df.copy()
+    df['Glucose_x_BMI'] = df['Glucose'] * df['BMI']
+    df['Glucose_x_Age'] = df['Glucose'] * df['Age']
+    df['SkinThickness_x_Insulin'] = df['SkinThickness'] * df['Insulin']
+    return scaler.transform(df)
+
+
+def timed(fn, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    raw = pd.read_csv(RAW_FILE_PATH)
+    df = raw.sample(n=args.rows, replace=True, random_state=42).reset_index(drop=True)
+    X_raw = df[RAW_FEATURES].to_numpy(dtype=np.float64)
+
+    old_fit = timed(lambda: pandas_process(df))
+    new_fit = timed(lambda: FeatureTransform().fit_transform(X_raw))
+    print(f"fit + transform {args.rows:,} rows: pandas/sklearn {old_fit:.3f}s ({args.rows / old_fit:,.0f} rows/s), "
+          f"FeatureTransform {new_fit:.3f}s ({args.rows / new_fit:,.0f} rows/s), {old_fit / new_fit:.1f}x")
+
+    transform = FeatureTransform().fit(X_raw)
+    scaler = transform.to_scaler()
+    one_df, one_row = df[RAW_FEATURES].head(1), X_raw[:1]
+    old_one = timed(lambda: pandas_serve(one_df, scaler), repeats=200)
+    new_one = timed(lambda: transform.transform(one_row), repeats=200)
+    print(f"single row: pandas/sklearn {old_one * 1e6:.1f}us, FeatureTransform {new_one * 1e6:.1f}us, {old_one / new_one:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
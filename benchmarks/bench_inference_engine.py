@@ -0,0 +1,43 @@
+# Benchmark: latency of the NumPy engine against FeatureTransform + predict_proba for batch sizes 1 to 100k.
+# Also checks parity on every batch. Run from the project root: python -m benchmarks.bench_inference_engine
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from src.batch_prediction import BatchPredictor
+from src.feature_transform import RAW_FEATURES
+from src.inference_engine import EnginePredictor, TreeEngine
+from config.paths_config import *
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+
+
+def best_time(fn, repeats: int) -> float: # Minimum wall-clock over several runs, in seconds
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    sklearn_predictor = BatchPredictor(joblib.load(MODEL_OUTPUT_PATH), joblib.load(FEATURE_TRANSFORM_PATH), chunk_size=100000)
+    engine_predictor = EnginePredictor(TreeEngine.load(ENGINE_OUTPUT_PATH), joblib.load(FEATURE_TRANSFORM_PATH), chunk_size=100000)
+    raw = pd.read_csv(RAW_FILE_PATH)[RAW_FEATURES].to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(42)
+
+    print(f"{'rows':>8} {'sklearn ms':>12} {'engine ms':>12} {'speedup':>8} {'max |diff|':>12}")
+    for batch_size in BATCH_SIZES:
+        X = raw[rng.integers(0, len(raw), size=batch_size)]
+        repeats = 50 if batch_size <= 1000 else 3
+        expected = sklearn_predictor.predict_proba(X)
+        actual = engine_predictor.predict_proba(X)
+        sklearn_s = best_time(lambda: sklearn_predictor.predict_proba(X), repeats)
+        engine_s = best_time(lambda: engine_predictor.predict_proba(X), repeats)
+        print(f"{batch_size:>8} {sklearn_s * 1e3:>12.3f} {engine_s * 1e3:>12.3f} {sklearn_s / engine_s:>7.1f}x "
+              f"{np.max(np.abs(actual - expected)):>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Benchmark: cost of one timing span (src/metrics.py) alone, with threads contending for the same histogram, and
+# next to a /predict request, which records six observations (parse, feature_engineering, scale, predict, render
+# and the whole request). Run from the project root:
+#   python -m benchmarks.bench_metrics --spans 200000 --threads 4
+import argparse
+import threading
+import time
+from src.metrics import Histogram, MetricsRegistry
+from src.feature_transform import RAW_FEATURES
+
+ROW = [2, 150, 70, 20, 80, 33, 0.5, 40]
+
+
+def ns_per_call(fn, n: int) -> float: # Best of three, minus the cost of the loop itself
+    def loop(body):
+        start = time.perf_counter()
+        for _ in range(n):
+            body()
+        return time.perf_counter() - start
+    empty = min(loop(lambda: None) for _ in range(3))
+    return (min(loop(fn) for _ in range(3)) - empty) / n * 1e9
+
+
+def contended_ns(child, n: int, threads: int) -> float: # Wall time per span with every thread timing into one child
+    def work():
+        for _ in range(n):
+            with child.time():
+                pass
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (n * threads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000, help="/predict calls through the Flask test client")
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram("bench_seconds", "Benchmark spans", ["stage"])
+    child = histogram.labels("parse")
+
+    def span():
+        with child.time():
+            pass
+
+    def labelled_span():
+        with histogram.time("parse"):
+            pass
+
+    print(f"{'span (child looked up once)':<34} {ns_per_call(span, args.spans):>8.0f} ns")
+    print(f"{'span (label lookup per call)':<34} {ns_per_call(labelled_span, args.spans):>8.0f} ns")
+    print(f"{'observe() only':<34} {ns_per_call(lambda: child.observe(0.001), args.spans):>8.0f} ns")
+    print(f"{f'span, {args.threads} threads, one child':<34} {contended_ns(child, args.spans // args.threads, args.threads):>8.0f} ns")
+    for i in range(50): # Enough series to look like a busy worker
+        histogram.labels(f"stage_{i}").observe(0.001)
+    start = time.perf_counter()
+    body = registry.render()
+    print(f"{'render, 51 series':<34} {(time.perf_counter() - start) * 1e3:>8.2f} ms ({len(body) // 1024} KB)")
+
+    import app # Loads the configured model; imported last so the numbers above do not include its threads
+    client = app.app.test_client()
+    form = dict(zip(RAW_FEATURES, ROW))
+    timings = []
+    for i in range(args.requests):
+        form["Glucose"] = 80 + i * 0.01 # A new row every time, so the prediction cache never answers
+        start = time.perf_counter()
+        client.post("/predict", data=form)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    median_us = timings[len(timings) // 2] * 1e6
+    overhead_us = 6 * ns_per_call(span, args.spans) / 1e3
+    print(f"{'/predict median':<34} {median_us:>8.0f} µs, spans {overhead_us:.1f} µs ({overhead_us / median_us:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Benchmark: throughput and p99 latency of concurrent single-row predictions, direct vs micro-batched.
+# Run from the project root: python -m benchmarks.bench_micro_batching --clients 32 --requests 200
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+from src.batch_prediction import BatchPredictor
+from src.feature_transform import RAW_FEATURES
+from src.request_batcher import MicroBatcher
+from config.paths_config import *
+
+
+def run_clients(predict_one, rows: np.ndarray, clients: int, requests: int):
+    def client(offset):
+        latencies = []
+        for i in range(requests):
+            start = time.perf_counter()
+            predict_one(rows[(offset + i) % len(rows)])
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = np.concatenate([np.asarray(l) for l in pool.map(client, range(clients))])
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, np.percentile(latencies, 50) * 1e3, np.percentile(latencies, 99) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    predictor = BatchPredictor(joblib.load(MODEL_OUTPUT_PATH), joblib.load(FEATURE_TRANSFORM_PATH))
+    rows = pd.read_csv(RAW_FILE_PATH)[RAW_FEATURES].to_numpy(dtype=np.float64)
+
+    direct = run_clients(lambda row: predictor.predict(row[None, :]), rows, args.clients, args.requests)
+    batcher = MicroBatcher(predictor, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    batched = run_clients(batcher.predict, rows, args.clients, args.requests)
+
+    print(f"{'mode':<10} {'req/sec':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, (rate, p50, p99) in [("direct", direct), ("batched", batched)]:
+        print(f"{name:<10} {rate:>10,.0f} {p50:>8.2f} {p99:>8.2f}")
+    stats = batcher.stats()
+    print(f"batcher: mean batch {stats['mean_batch_size']:.1f} rows, fill rate {stats['fill_rate']:.0%}, "
+          f"queue wait p99 {stats['queue_wait_ms_p99']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Benchmark: peak RSS and time of building the training Dataset and boosting 50 rounds, by row count.
+# "memory" is the DataFrame path (load_data + lgb.Dataset), "chunked" bins the file chunk by chunk
+# (src/chunked_dataset.py), "cached" loads the binary Dataset the chunked run saved.
+# Each run is a fresh interpreter so the RSS numbers do not leak into each other.
+# Run from the project root: python -m benchmarks.bench_out_of_core --rows 100000 1000000 4000000
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.bench_data_formats import make_frame
+from utils.common_functions import save_data
+
+MODES = ["memory", "chunked", "cached"]
+
+TRAINER = """
+import json, sys, time
+import lightgbm as lgb
+mode, path, cache_dir, chunk_size = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+params = {"max_bin": 255, "feature_pre_filter": False, "verbosity": -1}
+start = time.perf_counter()
+if mode == "memory":
+    from utils.common_functions import load_data
+    df = load_data(path)
+    dataset = lgb.Dataset(df.drop(columns=["Outcome"]), df["Outcome"], params=params).construct()
+else:
+    from src.chunked_dataset import build_dataset
+    dataset = build_dataset(path, "Outcome", chunk_size, params, cache_dir)
+built = time.perf_counter() - start
+lgb.train({"objective": "binary", "verbosity": -1}, dataset, num_boost_round=50)
+trained = time.perf_counter() - start
+peak_kb = next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmHWM"))
+print(json.dumps({"dataset_s": built, "total_s": trained, "max_rss_mb": peak_kb / 1024}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--format", choices=["csv", "parquet", "npy"], default="csv")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'mode':<8} {'Dataset s':>10} {'total s':>8} {'peak RSS MB':>12}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"processed_train.{args.format}")
+            save_data(make_frame(n_rows), path)
+            for mode in MODES: # "cached" relies on the file "chunked" just wrote
+                result = json.loads(subprocess.run(
+                    [sys.executable, "-c", TRAINER, mode, path, os.path.join(tmp, "lgb_dataset"), str(args.chunk_size)],
+                    check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+                print(f"{n_rows:>10,} {mode:<8} {result['dataset_s']:>10.2f} {result['total_s']:>8.2f} {result['max_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
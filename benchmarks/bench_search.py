@@ -0,0 +1,60 @@
+# Benchmark: RandomizedSearchCV (current search) against successive halving with early stopping.
+# Reports wall-clock, time until the best cross-validated score was reached, the best CV score and the test F1.
+# Run from the project root: python -m benchmarks.bench_search
+import argparse
+import time
+import numpy as np
+import lightgbm as lgb
+from sklearn.model_selection import RandomizedSearchCV
+from sklearn.metrics import f1_score
+from src.halving_search import SuccessiveHalvingSearch
+from src.model_training import ModelTraining
+from config.model_params import LIGHTGM_PARAMS, RANDOM_SEARCH_PARAMS, HALVING_SEARCH_PARAMS
+from config.paths_config import CONFIG_PATH
+
+
+def random_search(X_train, y_train, base_params):
+    search = RandomizedSearchCV(
+        lgb.LGBMClassifier(**base_params, verbosity=-1), param_distributions=LIGHTGM_PARAMS,
+        n_iter=RANDOM_SEARCH_PARAMS["n_iter"], cv=RANDOM_SEARCH_PARAMS["cv"], n_jobs=RANDOM_SEARCH_PARAMS["n_jobs"],
+        random_state=RANDOM_SEARCH_PARAMS["random_state"], scoring=RANDOM_SEARCH_PARAMS["scoring"],
+    )
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    elapsed = time.perf_counter() - start
+    # Candidates are evaluated in order; a candidate costs cv fits plus scoring, so the best is reached after
+    # the cumulative cost of every candidate up to and including it (scaled to the measured wall-clock)
+    cost = (search.cv_results_["mean_fit_time"] + search.cv_results_["mean_score_time"]) * RANDOM_SEARCH_PARAMS["cv"]
+    time_to_best = cost[:search.best_index_ + 1].sum() / cost.sum() * (elapsed - search.refit_time_)
+    return search, elapsed, time_to_best
+
+
+def halving_search(X_train, y_train, base_params):
+    search = SuccessiveHalvingSearch(LIGHTGM_PARAMS, base_params=base_params, **HALVING_SEARCH_PARAMS)
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    return search, time.perf_counter() - start, search.time_to_best_
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=1, help="Stack the training set this many times to simulate more data")
+    args = parser.parse_args()
+
+    X_train, y_train, X_test, y_test = ModelTraining(config_path=CONFIG_PATH).load_processed_data()
+    if args.repeat > 1:
+        X_train = X_train.loc[np.tile(X_train.index, args.repeat)].reset_index(drop=True)
+        y_train = y_train.loc[np.tile(y_train.index, args.repeat)].reset_index(drop=True)
+    base_params = {"random_state": 42, "scale_pos_weight": (y_train == 0).sum() / (y_train == 1).sum()}
+
+    print(f"{len(X_train):,} training rows")
+    print(f"{'search':<10} {'wall s':>8} {'to best s':>10} {'CV score':>9} {'test F1':>8} {'trees':>6}")
+    for name, run in [("random", random_search), ("halving", halving_search)]:
+        search, elapsed, time_to_best = run(X_train, y_train, base_params)
+        test_f1 = f1_score(y_test, search.best_estimator_.predict(X_test))
+        trees = search.best_estimator_.booster_.num_trees()
+        print(f"{name:<10} {elapsed:>8.1f} {time_to_best:>10.1f} {search.best_score_:>9.4f} {test_f1:>8.4f} {trees:>6}")
+
+
+if __name__ == "__main__":
+    main()
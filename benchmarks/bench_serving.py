@@ -0,0 +1,109 @@
+# Load test: QPS and latency of /predict under gunicorn for several worker counts, with the memory of every worker.
+# RSS counts the preloaded pages shared with the master in every worker; PSS splits shared pages between the
+# processes using them and "private" is what the worker alone holds, i.e. what one more worker costs.
+# Client processes keep one HTTP connection open each. Run from the project root:
+#   python -m benchmarks.bench_serving --workers 1 2 4 --clients 8 --duration 10
+import argparse
+import http.client
+import signal
+import subprocess
+import sys
+import time
+import urllib.parse
+from multiprocessing import Pool
+import numpy as np
+from src.feature_transform import RAW_FEATURES
+from utils.common_functions import load_data
+from config.paths_config import TEST_FILE_PATH
+
+
+def client(args): # One keep-alive connection posting rows until the deadline; returns the latencies
+    port, endpoint, bodies, deadline = args
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    content_type = "application/json" if endpoint == "/predict_batch" else "application/x-www-form-urlencoded"
+    latencies, i = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        connection.request("POST", endpoint, body=bodies[i % len(bodies)], headers={"Content-Type": content_type})
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{endpoint} returned {response.status}")
+        if response.getheader("Connection", "").lower() == "close": # The sync worker closes after every response
+            connection.close()
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    return latencies
+
+
+def memory_mb(pid: int) -> dict: # RSS, PSS and private memory of one process, from /proc/<pid>/smaps_rollup
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def worker_pids(master: int) -> list:
+    with open(f"/proc/{master}/task/{master}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def wait_ready(port: int, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/health") # 200 once the model is loaded and warmed up
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Server on port {port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=None, help="Threads per worker, defaults to serving.server.threads")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per worker count")
+    parser.add_argument("--endpoint", choices=["/predict", "/predict_batch"], default="/predict")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    rows = load_data(TEST_FILE_PATH)[RAW_FEATURES].to_numpy(dtype=np.float64)
+    if args.endpoint == "/predict":
+        bodies = [urllib.parse.urlencode(dict(zip(RAW_FEATURES, row))) for row in rows]
+    else:
+        bodies = ['{"instances": [%s]}' % ", ".join(str(list(row))) for row in rows]
+
+    print(f"{'workers':>7} {'QPS':>8} {'p50 ms':>7} {'p99 ms':>7} {'master RSS':>11} {'worker RSS':>11} {'worker PSS':>11} {'private':>8}")
+    for n_workers in args.workers:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app",
+                   "--workers", str(n_workers), "--bind", f"127.0.0.1:{args.port}", "--log-level", "warning"]
+        if args.threads:
+            command += ["--threads", str(args.threads)]
+        server = subprocess.Popen(command)
+        try:
+            wait_ready(args.port)
+            deadline = time.time() + args.duration
+            with Pool(args.clients) as pool:
+                latencies = np.concatenate(pool.map(client, [(args.port, args.endpoint, bodies[i::args.clients], deadline)
+                                                             for i in range(args.clients)]))
+            workers = [memory_mb(pid) for pid in worker_pids(server.pid)]
+            master = memory_mb(server.pid)
+            print(f"{n_workers:>7} {len(latencies) / args.duration:>8.0f} {np.percentile(latencies, 50) * 1e3:>7.2f} "
+                  f"{np.percentile(latencies, 99) * 1e3:>7.2f} {master['rss']:>9.0f}MB "
+                  f"{np.mean([w['rss'] for w in workers]):>9.0f}MB {np.mean([w['pss'] for w in workers]):>9.0f}MB "
+                  f"{np.mean([w['private'] for w in workers]):>6.0f}MB")
+        finally:
+            server.send_signal(signal.SIGTERM) # Graceful shutdown: workers finish their requests first
+            server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Cold start benchmark: how long a fresh server process takes until it answers its first prediction, where the
+# import time goes, and how long the command line entry points take to start.
+#   time to ready            spawn of gunicorn (1 worker) until /health returns 200
+#   time to first prediction spawn until the first POST /predict returns
+#   imports                  python -X importtime of app.py, the slowest top-level imports by cumulative time
+# Every start is a new interpreter; the OS page cache is warm after the first repeat, as on an autoscaled node
+# that already pulled the image. Run from the project root:
+#   python -m benchmarks.bench_startup --repeats 5 --check
+import argparse
+import http.client
+import signal
+import subprocess
+import sys
+import time
+import urllib.parse
+import numpy as np
+from utils.common_functions import read_yaml
+from config.paths_config import CONFIG_PATH
+
+ROW = {"Pregnancies": 2, "Glucose": 150, "BloodPressure": 70, "SkinThickness": 20, "Insulin": 80, "BMI": 33,
+       "DiabetesPedigreeFunction": 0.5, "Age": 40}
+
+CLI_COMMANDS = { # Entry points whose start-up time users wait for
+    "pipeline --help": [sys.executable, "-m", "pipeline.training_pipeline", "--help"],
+    "batch_prediction --help": [sys.executable, "-m", "src.batch_prediction", "--help"],
+}
+
+
+def request(port: int, method: str, path: str, body: str = None) -> int:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"} if body else {}
+    connection.request(method, path, body=body, headers=headers)
+    status = connection.getresponse().status
+    connection.close()
+    return status
+
+
+def cold_start(port: int, ready_path: str, timeout: float = 120.0) -> dict: # Seconds from spawn to ready and to the first prediction
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app", "--workers", "1",
+                               "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"Server on port {port} was not ready after {timeout}s")
+            try:
+                if request(port, "GET", ready_path) == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.01)
+        ready = time.perf_counter() - start
+        status = request(port, "POST", "/predict", urllib.parse.urlencode(ROW))
+        if status != 200:
+            raise RuntimeError(f"/predict returned {status}")
+        return {"ready": ready, "first_prediction": time.perf_counter() - start}
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def import_profile(module: str = "app", top: int = 10) -> tuple[float, list]:
+    # (total import seconds, [(cumulative seconds, module)] of the slowest imports made directly by the module)
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True).stderr
+    total, direct = 0.0, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        seconds = int(cumulative) / 1e6
+        if name.strip() == module:
+            total = seconds
+        elif name.startswith("   ") and not name.startswith("    "): # One level below the module: its own imports
+            direct.append((seconds, name.strip()))
+    return total, sorted(direct, reverse=True)[:top]
+
+
+def command_seconds(command: list, repeats: int) -> float: # Median wall time of a command
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5, help="Cold starts per measurement, the median is reported")
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--ready-path", default="/health", help="Endpoint polled until it returns 200")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 when the first prediction misses serving.startup.target_seconds")
+    args = parser.parse_args()
+    target = read_yaml(CONFIG_PATH).get("serving", {}).get("startup", {}).get("target_seconds")
+
+    total, slowest = import_profile()
+    print(f"import app: {total:.2f}s, slowest direct imports:")
+    for seconds, name in slowest:
+        print(f"  {seconds:>6.3f}s  {name}")
+
+    starts = [cold_start(args.port, args.ready_path) for _ in range(args.repeats)]
+    ready = float(np.median([s["ready"] for s in starts]))
+    first = float(np.median([s["first_prediction"] for s in starts]))
+    print(f"time to ready:            {ready:.2f}s (median of {args.repeats})")
+    print(f"time to first prediction: {first:.2f}s (target {target}s)")
+
+    for name, command in CLI_COMMANDS.items():
+        print(f"{name + ':':<26}{command_seconds(command, args.repeats):.2f}s")
+
+    if args.check and target and first > target:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Benchmark: streaming FeatureTransform fit (quantile sketches) against the exact in-memory fit.
+# Reports the rank error of the estimated quartiles and median per column against the configured bound,
+# for a single sequential fitter and for several fitters merged as parallel chunk workers would be.
+# Run from the project root: python -m benchmarks.bench_streaming_fit --rows 2000000 --rank-error 0.005
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.feature_transform import FeatureTransform, StreamingTransformFitter, add_interaction_features, RAW_FEATURES
+from config.paths_config import RAW_FILE_PATH
+
+
+def rank_errors(values: np.ndarray, estimates, quantiles) -> np.ndarray: # Distance between q and the rank range of each estimate
+    values = np.sort(values)
+    errors = []
+    for estimate, q in zip(estimates, quantiles):
+        low = np.searchsorted(values, estimate, side="left") / len(values) # Ties make the rank of a value a range
+        high = np.searchsorted(values, estimate, side="right") / len(values)
+        errors.append(0.0 if low <= q <= high else min(abs(low - q), abs(high - q)))
+    return np.asarray(errors)
+
+
+def streaming_fit(chunks, rank_error: float, workers: int) -> StreamingTransformFitter: # Round-robin chunks over workers, then merge
+    fitters = [StreamingTransformFitter(rank_error=rank_error, seed=i) for i in range(workers)]
+    for i, chunk in enumerate(chunks):
+        fitters[i % workers].partial_fit(chunk)
+    for other in fitters[1:]:
+        fitters[0].merge(other)
+    return fitters[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--rank-error", type=float, default=0.005)
+    parser.add_argument("--missing", type=float, default=0.05, help="Fraction of values replaced by NaN to exercise imputation")
+    parser.add_argument("--workers", type=int, default=4, help="Fitters merged in the parallel case")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    raw = pd.read_csv(RAW_FILE_PATH)[RAW_FEATURES].to_numpy(dtype=np.float64)
+    X_raw = raw[rng.integers(0, len(raw), args.rows)] * rng.uniform(0.95, 1.05, size=(args.rows, raw.shape[1])) # Jitter breaks ties
+    X_raw[rng.random(X_raw.shape) < args.missing] = np.nan
+    chunks = [X_raw[start:start + args.chunk_size] for start in range(0, args.rows, args.chunk_size)]
+
+    start = time.perf_counter()
+    exact = FeatureTransform().fit(X_raw)
+    exact_time = time.perf_counter() - start
+
+    features = add_interaction_features(X_raw)[:, exact.columns_]
+    quantiles = [exact.quantile_range[0] / 100, 0.5, exact.quantile_range[1] / 100]
+
+    print(f"{args.rows:,} rows, {len(chunks)} chunks, target rank error {args.rank_error}, exact fit {exact_time:.2f}s")
+    for workers in (1, args.workers):
+        start = time.perf_counter()
+        fitter = streaming_fit(chunks, args.rank_error, workers)
+        transform = fitter.finalize()
+        elapsed = time.perf_counter() - start
+        items = sum(level.size for sketch in fitter.sketches for level in sketch.levels)
+        # Ranks are measured on the column as the sketch saw it: missing values replaced by the streamed mean,
+        # which can differ from the exact mean in the last bit and would otherwise split the block of imputed ties
+        imputed = np.where(np.isnan(features), transform.mean_, features)
+        estimates = fitter.quantiles()
+        worst = max(rank_errors(imputed[:, i], estimates[:, i], quantiles).max() for i in range(features.shape[1]))
+        mean_diff = np.max(np.abs(transform.mean_ - exact.mean_) / np.abs(exact.mean_))
+        center_diff = np.max(np.abs(transform.center_ - exact.center_) / exact.scale_)
+        scale_diff = np.max(np.abs(transform.scale_ - exact.scale_) / exact.scale_)
+        print(f"{workers} fitter(s): {elapsed:.2f}s, {items:,} sketch items kept, worst rank error {worst:.4f} "
+              f"({'within' if worst <= args.rank_error else 'ABOVE'} bound), max relative diff mean {mean_diff:.1e}, "
+              f"center {center_diff:.1e} (in IQRs), scale {scale_diff:.1e}")
+
+
+if __name__ == "__main__":
+    main()
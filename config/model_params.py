@@ -15,11 +15,79 @@ LIGHTGM_PARAMS = {
 }
 
 # Parameters for RandomizedSearchCV, with more iterations
+# n_jobs is derived from CPU_BUDGET below rather than set here
 RANDOM_SEARCH_PARAMS = {
     "n_iter": 15, 
     "cv": 5,
-    "n_jobs": -1,
     "verbose": 1,
     "random_state": 42,
     "scoring": "f1" 
 }
+
+# Hyperparameter search strategy used by ModelTraining: "random" runs RandomizedSearchCV with RANDOM_SEARCH_PARAMS,
+# "halving" runs successive halving with early stopping (src/halving_search.py) with HALVING_SEARCH_PARAMS,
+# "trials" runs the RANDOM_SEARCH_PARAMS trials through the resumable trial store (src/trial_search.py)
+SEARCH_STRATEGY = "halving"
+
+# Parameters for successive halving; n_estimators in LIGHTGM_PARAMS caps the rounds of each candidate
+HALVING_SEARCH_PARAMS = {
+    "n_candidates": 27, # Candidates on the first rung
+    "eta": 3, # Keep the best third at every rung, with three times more boosting rounds
+    "min_rounds": 50, # Boosting rounds per fold on the first rung
+    "max_rounds": 1000, # Boosting rounds per fold on the last rung
+    "early_stopping_rounds": 50, # Stop a fold when its validation loss has not improved for this many rounds
+    "cv": 5,
+    "random_state": 42,
+    "scoring": "f1"
+}
+
+# Parameters for the "trials" strategy; the store itself is TRIAL_STORE_PATH in config/paths_config.py
+TRIAL_STORE_PARAMS = {
+    "stale_after_seconds": 900, # A running trial without a fold checkpoint for this long is taken over by another worker
+    "poll_seconds": 10 # Wait between checks while workers on other hosts finish their trials
+}
+
+# CPU budget for hyperparameter search, split between concurrent search workers and the threads of each
+# LightGBM model (src/cpu_budget.py) so that workers x threads never exceeds it
+CPU_BUDGET = None # Cores to use; None uses every core available to the process, -2 leaves one free
+PARALLEL_STRATEGY = "auto" # "wide": many single-threaded models, "deep": one model with every thread, "auto": threads from the row count
+
+# "full" runs the hyperparameter search on every training run, "incremental" continues boosting the saved
+# model (MODEL_OUTPUT_PATH) with the parameters of the last MLflow run and falls back to a full search when
+# the warm-started model scores below min_metrics on the test set
+TRAINING_MODE = "full"
+INCREMENTAL_PARAMS = {
+    "extra_rounds": 50, # Boosting rounds added on top of the previous model
+    "min_metrics": {"f1_score": 0.6, "recall": 0.6} # Metrics from evaluate_model; any value below its minimum triggers a full search
+}
+
+# Out-of-core training: the binned LightGBM Dataset is built from the processed training file chunk by chunk
+# (src/chunked_dataset.py) and cached under LGB_DATASET_DIR, so the training matrix is never loaded into pandas.
+# Needs the "halving" strategy and a full search; the test set is still loaded in memory for evaluation
+OUT_OF_CORE_PARAMS = {
+    "enabled": False,
+    "chunk_size": 100000, # Rows per chunk, the most floats held in Python at once
+    "sample_rows": 1000, # First rows of the file, only used to give the sklearn model its feature names and classes
+    "dataset_params": {"max_bin": 255, "feature_pre_filter": False, "verbosity": -1} # Binning; part of the cache key
+}
+
+# Latency-aware model selection (src/latency_selection.py): the top_k candidates of the search are refit on the
+# full training set and timed on the serving engine (serving.engine in config.yaml). The most accurate candidate
+# on the score/latency Pareto front whose latency_metric is within budget wins instead of the best CV score
+LATENCY_SELECTION = {
+    "enabled": False,
+    "top_k": 8, # Best candidates of the search that are refit and timed
+    "latency_metric": "p99_ms", # "p50_ms" / "p99_ms" of single-row calls, or "batch_us_per_row" of a batch_size batch
+    "budget": 2.0, # In the unit of latency_metric
+    "batch_size": 1000,
+    "single_row_repeats": 500, # Per candidate, interleaved with the other candidates
+    "batch_repeats": 5,
+    "threads": 1, # LightGBM threads while timing, so runs on different machines measure the same thing
+    "prune_min_gain_fraction": 0.0 # When > 0, drop the winner's last iterations holding at most this fraction of the split gain
+}
+
+# Global importance (src/explanations.py): mean absolute pred_contrib contribution of every feature, saved next to
+# the model as global_importance.json, logged to MLflow and served by /explain/global
+EXPLANATION_PARAMS = {
+    "importance_rows": 10000 # Training rows sampled for the summary, 0 for all of them
+}
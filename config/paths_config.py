@@ -2,15 +2,31 @@
 # It defines the paths for raw data, processed data, and configuration files.
 import os
 
+INTERMEDIATE_FORMAT = "csv" # Format of the files passed between stages: "csv", "parquet" (needs pyarrow) or "npy" (memory-mapped)
+
 RAW_DIR = "artifacts/raw" # Directory where raw data files are stored
 RAW_FILE_PATH = os.path.join(RAW_DIR, "raw_data.csv") # Path to the raw data file
-TRAIN_FILE_PATH = os.path.join(RAW_DIR, "train_data.csv") # Path to the training data file 
-TEST_FILE_PATH = os.path.join(RAW_DIR, "test_data.csv") # Path to the test data file
+TRAIN_FILE_PATH = os.path.join(RAW_DIR, f"train_data.{INTERMEDIATE_FORMAT}") # Path to the training data file 
+TEST_FILE_PATH = os.path.join(RAW_DIR, f"test_data.{INTERMEDIATE_FORMAT}") # Path to the test data file
+SHARDS_DIR = os.path.join(RAW_DIR, "shards") # Directory where downloaded shard objects are stored
+DOWNLOAD_MANIFEST_PATH = os.path.join(RAW_DIR, "download_manifest.json") # Remote version of every downloaded file
 CONFIG_PATH = "config/config.yaml" # Path to the configuration file
 
 
 PROCESSED_DIR = "artifacts/processed" # Directory where processed data files are stored
-PROCESSED_TRAIN_DATA_PATH = os.path.join(PROCESSED_DIR, "processed_train.csv") # Path to the processed training data file
-PROCESSED_TEST_DATA_PATH = os.path.join(PROCESSED_DIR, "processed_test.csv") # Path to the processed test data file
+PROCESSED_TRAIN_DATA_PATH = os.path.join(PROCESSED_DIR, f"processed_train.{INTERMEDIATE_FORMAT}") # Path to the processed training data file
+PROCESSED_TEST_DATA_PATH = os.path.join(PROCESSED_DIR, f"processed_test.{INTERMEDIATE_FORMAT}") # Path to the processed test data file
+SCALER_PATH = os.path.join(PROCESSED_DIR, "scaler.joblib") # Path to the fitted scaler
+FEATURE_TRANSFORM_PATH = os.path.join(PROCESSED_DIR, "feature_transform.joblib") # Feature engineering, imputation and scaling in one object
+DRIFT_FEATURES_PATH = os.path.join(PROCESSED_DIR, "drift_reference.json") # Binned training distribution of every raw and engineered feature
+LGB_DATASET_DIR = os.path.join(PROCESSED_DIR, "lgb_dataset") # Binned LightGBM training Datasets, keyed on the data hash
 
 MODEL_OUTPUT_PATH = "artifacts/models/lgmb_model.pkl" # Directory where model output files are store
+ENGINE_OUTPUT_PATH = "artifacts/models/lgbm_engine.npz" # Array-backed copy of the model and scaler for the NumPy engine
+GLOBAL_IMPORTANCE_PATH = "artifacts/models/global_importance.json" # Mean pred_contrib contribution of every feature on the training data
+DRIFT_REFERENCE_PATH = "artifacts/models/drift_reference.json" # Feature bins of preprocessing plus the predicted probabilities of the test set
+DRIFT_TRIGGER_PATH = "artifacts/drift/retrain_request.json" # Written by the server when live traffic drifted from the reference
+BUNDLES_DIR = "artifacts/bundles" # Versioned model bundles served by app.py; CURRENT names the one to serve
+TRIAL_STORE_PATH = "artifacts/trials/trials.db" # Hyperparameter trials and fold checkpoints, shared by all search workers; keep it off NFS
+PIPELINE_MANIFEST_PATH = "artifacts/pipeline_manifest.json" # Fingerprints of the last successful run of every pipeline stage
+PIPELINE_METRICS_PATH = "artifacts/pipeline_metrics.prom" # Stage and step durations of the last pipeline run, Prometheus text format
@@ -0,0 +1,42 @@
+# Gunicorn settings for serving app.py in production:
+#   gunicorn -c gunicorn.conf.py app:app
+# The master imports app.py once (preload_app), so the model, scaler and feature transform are loaded a single
+# time and the workers forked from it share those pages copy-on-write. CPython's cyclic GC writes to the header of
+# every object it scans, which would copy the shared pages into each worker; the collector is therefore off in
+# the master and the preloaded heap is moved to the permanent generation (gc.freeze) right before every fork.
+# Signals to the master:
+#   HUP   re-read this file and replace the workers gracefully (the preloaded model is kept)
+#   USR2  start a new master with fresh code and model next to the old one, then send the old master TERM
+#   TERM  graceful shutdown, workers finish in-flight requests for up to graceful_timeout seconds
+#   TTIN / TTOU  add or remove a worker
+import gc
+from src.cpu_budget import available_cpus
+from utils.common_functions import read_yaml
+from config.paths_config import CONFIG_PATH
+
+gc.disable() # Until the app is loaded and frozen; the master itself allocates little after that
+
+SERVER_CONFIG = read_yaml(CONFIG_PATH).get("serving", {}).get("server", {})
+
+bind = SERVER_CONFIG.get("bind", "0.0.0.0:5000")
+workers = SERVER_CONFIG.get("workers", 0) or available_cpus()
+threads = SERVER_CONFIG.get("threads", 4)
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = True # Load the model in the master, before forking
+timeout = SERVER_CONFIG.get("timeout", 30)
+graceful_timeout = SERVER_CONFIG.get("graceful_timeout", 30)
+max_requests = SERVER_CONFIG.get("max_requests", 0)
+max_requests_jitter = SERVER_CONFIG.get("max_requests_jitter", 100)
+
+
+def pre_fork(server, worker): # Runs in the master before every fork, including workers replaced later
+    gc.freeze()
+
+
+def post_fork(server, worker): # Runs in the new worker
+    gc.enable() # Frozen objects are never scanned, so collections only touch the worker's own objects
+    server.log.info(f"Worker {worker.pid} forked with {threads} thread(s)")
+
+
+def worker_exit(server, worker):
+    server.log.info(f"Worker {worker.pid} exited")
@@ -0,0 +1,138 @@
+# This code is part of the training pipeline for a machine learning project.
+# It lets the pipeline skip stages whose inputs did not change. Every stage declares its input files,
+# the config sections and source files it depends on, and the files it produces. The fingerprint of
+# all of these is stored in a manifest, and a stage is skipped when its fingerprint matches the last
+# successful run and all of its outputs are still on disk. The source files of a stage are found by following
+# the imports of its entry module (code_closure), so a change to any module the stage can run is noticed.
+import ast
+import os
+import json
+import time
+import hashlib
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.metrics import PIPELINE_STEP_SECONDS
+
+logger = get_logger(__name__)
+
+
+def code_closure(*paths) -> list: # The given files and every project file they import, at any depth, sorted
+    seen, pending = set(), list(paths)
+    while pending:
+        path = pending.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree): # Also finds the imports deferred into functions
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names] # from package import module
+            else:
+                continue
+            for module in modules:
+                candidate = module.replace(".", "/") + ".py"
+                if os.path.exists(candidate): # Third-party modules resolve outside the project and are skipped
+                    pending.append(candidate)
+    return sorted(seen)
+
+
+class Stage: # One pipeline step and everything its result depends on
+
+    def __init__(self, name, run, inputs=(), config_sections=(), code=(), outputs=(), always_run=False):
+        self.name = name # Name used in the manifest and for --from-stage
+        self.run = run # Callable doing the work
+        self.inputs = list(inputs) # Files read by the stage
+        self.config_sections = list(config_sections) # Top-level config.yaml sections read by the stage
+        self.code = list(code) # Source files whose content is part of the fingerprint
+        self.outputs = list(outputs) # Files written by the stage
+        self.always_run = always_run # For stages with inputs outside the project, e.g. a bucket
+
+
+class StageCache: # Fingerprints stages and records successful runs in a JSON manifest
+
+    def __init__(self, manifest_path: str, config: dict):
+        self.manifest_path = manifest_path
+        self.config = config # Parsed config.yaml
+        self.manifest = self._load()
+        self._file_hashes = self.manifest.setdefault("file_hashes", {}) # path -> [size, mtime_ns, sha256]
+
+    def fingerprint(self, stage: Stage) -> str:
+        digest = hashlib.sha256()
+        for kind, paths in (("code", stage.code), ("input", stage.inputs)):
+            for path in paths:
+                digest.update(f"{kind}:{path}:{self.file_hash(path)}\n".encode())
+        for section in stage.config_sections:
+            digest.update(f"config:{section}:{json.dumps(self.config.get(section), sort_keys=True)}\n".encode())
+        return digest.hexdigest()
+
+    def file_hash(self, path: str) -> str: # Content hash, reused while size and mtime are unchanged
+        if not os.path.exists(path):
+            return "missing"
+        stat = os.stat(path)
+        cached = self._file_hashes.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        self._file_hashes[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def is_fresh(self, stage: Stage) -> bool: # Same fingerprint as the last successful run and outputs still present
+        entry = self.manifest.get("stages", {}).get(stage.name)
+        if stage.always_run or entry is None:
+            return False
+        if not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        return entry["fingerprint"] == self.fingerprint(stage) and entry["outputs"] == {path: self.file_hash(path) for path in stage.outputs}
+
+    def record(self, stage: Stage, duration: float):
+        self.manifest.setdefault("stages", {})[stage.name] = {
+            "fingerprint": self.fingerprint(stage),
+            "outputs": {path: self.file_hash(path) for path in stage.outputs}, # Detects outputs edited or replaced by hand
+            "duration_seconds": round(duration, 3),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self._save()
+
+    def run_stages(self, stages, force: bool = False, from_stage: str = None): # Run stages in order, skipping fresh ones
+        if force and from_stage is not None:
+            raise ValueError("force reruns every stage; pass it or from_stage, not both")
+        names = [stage.name for stage in stages]
+        if from_stage is not None and from_stage not in names:
+            raise ValueError(f"Unknown stage '{from_stage}', expected one of {names}")
+        forced_from = names.index(from_stage) if from_stage is not None else (0 if force else len(names))
+
+        for index, stage in enumerate(stages):
+            if index < forced_from and self.is_fresh(stage):
+                logger.info(f"Stage '{stage.name}' is up to date, skipping it")
+                print(f"[skip] {stage.name}")
+                continue
+            logger.info(f"Running stage '{stage.name}'")
+            start = time.perf_counter()
+            try:
+                with PIPELINE_STEP_SECONDS.time(stage.name):
+                    stage.run()
+            except Exception as e:
+                logger.error(f"Stage '{stage.name}' failed: {e}")
+                raise CustomException(f"Pipeline stage '{stage.name}' failed", e)
+            duration = time.perf_counter() - start
+            self.record(stage, duration)
+            print(f"[run]  {stage.name} ({duration:.2f}s)")
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _save(self): # Write then rename so an interrupted run never leaves a broken manifest
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
@@ -1,16 +1,90 @@
 # This code is part of a training pipeline for a machine learning project.
 # It orchestrates the data ingestion, preprocessing, and model training steps.
-from src.data_ingestion import DataIngestion
-from src.data_preprocessing import DataPreprocessor
-from src.model_training import ModelTraining
+# Stages whose inputs, config and code did not change since their last successful run are skipped:
+#   python -m pipeline.training_pipeline                      # run what changed
+#   python -m pipeline.training_pipeline --force              # run everything
+#   python -m pipeline.training_pipeline --from-stage train   # rerun training and anything after it
+# Stage modules are imported when their stage runs, so a run that skips training never loads LightGBM or MLflow.
+# A failed download is not fatal when a raw data file is already on disk (e.g. a build without bucket credentials).
+import argparse
+import os
+from functools import lru_cache
+from pipeline.stage_cache import Stage, StageCache, code_closure
+from src.custom_exception import CustomException
+from src.logger import get_logger
+from src.metrics import METRICS
 from utils.common_functions import read_yaml
 from config.paths_config import *
 
+logger = get_logger(__name__)
+
+
+def build_stages(config: dict) -> list: # Declare what every stage reads and writes
+    @lru_cache(maxsize=None)
+    def data_ingestion(): # Shared by download and split, created on first use
+        from src.data_ingestion import DataIngestion
+        return DataIngestion(config)
+
+    def download(): # Falls back to the raw file already on disk, as DataIngestion.run() does
+        try:
+            data_ingestion().download_data()
+        except CustomException as e:
+            if not os.path.exists(RAW_FILE_PATH):
+                raise
+            logger.warning(f"Download failed, continuing with the existing {RAW_FILE_PATH}: {e}")
+            print(f"[warn] download failed, using the existing {RAW_FILE_PATH}")
+
+    def preprocess():
+        from src.data_preprocessing import DataPreprocessor
+        DataPreprocessor(config_path=CONFIG_PATH).process()
+
+    def train():
+        from src.model_training import ModelTraining
+        ModelTraining(config_path=CONFIG_PATH).run()
+
+    return [
+        Stage(
+            "download", download,
+            config_sections=["data_ingestion"],
+            code=code_closure("src/data_ingestion.py"),
+            outputs=[RAW_FILE_PATH],
+            always_run=True, # The bucket is not visible to the fingerprint; the downloader skips unchanged objects itself
+        ),
+        Stage(
+            "split", lambda: data_ingestion().split(),
+            inputs=[RAW_FILE_PATH],
+            config_sections=["data_ingestion"],
+            code=code_closure("src/data_ingestion.py"),
+            outputs=[TRAIN_FILE_PATH, TEST_FILE_PATH],
+        ),
+        Stage(
+            "preprocess", preprocess,
+            inputs=[TRAIN_FILE_PATH, TEST_FILE_PATH],
+            config_sections=["data_preprocessing"],
+            code=code_closure("src/data_preprocessing.py"),
+            outputs=[PROCESSED_TRAIN_DATA_PATH, PROCESSED_TEST_DATA_PATH, SCALER_PATH, FEATURE_TRANSFORM_PATH, DRIFT_FEATURES_PATH],
+        ),
+        Stage(
+            "train", train,
+            inputs=[PROCESSED_TRAIN_DATA_PATH, PROCESSED_TEST_DATA_PATH, SCALER_PATH, DRIFT_FEATURES_PATH],
+            config_sections=["data_preprocessing", "serving"], # serving.engine is timed by latency-aware selection
+            code=code_closure("src/model_training.py"), # Includes config/model_params.py
+            outputs=[MODEL_OUTPUT_PATH, ENGINE_OUTPUT_PATH, GLOBAL_IMPORTANCE_PATH, DRIFT_REFERENCE_PATH],
+        ),
+    ]
+
+
 if __name__ == "__main__":
-    # Initialize the data ingestion, preprocessing, and model training steps
-    data_ingestion = DataIngestion(read_yaml(CONFIG_PATH))
-    data_ingestion.run()  
-    preprocessor = DataPreprocessor(config_path=CONFIG_PATH)
-    preprocessor.process()
-    model_trainer = ModelTraining(config_path=CONFIG_PATH)
-    model_trainer.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the diabetes training pipeline, skipping unchanged stages.")
+    rerun = parser.add_mutually_exclusive_group() # --force is --from-stage download
+    rerun.add_argument("--force", action="store_true", help="Run every stage even if it is up to date")
+    rerun.add_argument("--from-stage", choices=["download", "split", "preprocess", "train"],
+                        help="Run this stage and every later stage even if they are up to date")
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    stages = build_stages(config)
+    try:
+        StageCache(PIPELINE_MANIFEST_PATH, config).run_stages(stages, force=args.force, from_stage=args.from_stage)
+    finally:
+        METRICS.write(PIPELINE_METRICS_PATH) # Durations of the stages that ran, for node_exporter's textfile collector
@@ -0,0 +1,118 @@
+# This code is part of the serving side of the diabetes prediction project.
+# It scores many rows at once: the fitted FeatureTransform and the model are called
+# once per chunk instead of once per row.
+# It can be used from app.py or as a command line tool:
+#   python -m src.batch_prediction --input cohort.csv --output scored.csv
+import argparse
+import time
+import joblib
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.feature_transform import FeatureTransform, MODEL_FEATURES, RAW_FEATURES, add_interaction_features
+from src.metrics import SERVING_STAGE_SECONDS
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+LABELS = {0: "Not Diabetic", 1: "Diabetic"} # Human readable class names
+
+DEFAULT_CHUNK_SIZE = 10000 # Rows scored per model call
+
+FEATURE_ENGINEERING_SPAN = SERVING_STAGE_SECONDS.labels("feature_engineering") # Looked up once, timed on every chunk
+SCALE_SPAN = SERVING_STAGE_SECONDS.labels("scale")
+PREDICT_SPAN = SERVING_STAGE_SECONDS.labels("predict")
+
+
+def records_to_array(records) -> np.ndarray: # Convert JSON rows (dicts or lists) to a raw feature matrix
+    if not records:
+        return np.empty((0, len(RAW_FEATURES)), dtype=np.float64)
+    if isinstance(records[0], dict):
+        return np.array([[float(record[name]) for name in RAW_FEATURES] for record in records], dtype=np.float64)
+    X_raw = np.asarray(records, dtype=np.float64)
+    if X_raw.ndim != 2 or X_raw.shape[1] != len(RAW_FEATURES):
+        raise ValueError(f"Each row must have {len(RAW_FEATURES)} values in the order {RAW_FEATURES}")
+    return X_raw
+
+
+class BatchPredictor: # Scores raw feature matrices with one transform/model call per chunk
+
+    def __init__(self, model, transform: FeatureTransform, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.model = model # Fitted LGBMClassifier
+        self.transform = transform # Fitted FeatureTransform (feature engineering, imputation and scaling)
+        self.chunk_size = max(1, int(chunk_size)) # Upper bound on rows per model call
+        self.positive_index = int(np.flatnonzero(model.classes_ == 1)[0]) # Column of the 'Diabetic' class in predict_proba
+
+    def predict_proba(self, X_raw: np.ndarray) -> np.ndarray: # Probability of the positive class for every row
+        X_raw = np.asarray(X_raw, dtype=np.float64)
+        if X_raw.shape[0] == 0:
+            return np.empty(0, dtype=np.float64)
+        parts = [self._score_chunk(X_raw[start:start + self.chunk_size]) for start in range(0, X_raw.shape[0], self.chunk_size)]
+        return np.concatenate(parts)
+
+    def predict(self, X_raw: np.ndarray) -> tuple[np.ndarray, np.ndarray]: # Labels and positive probabilities
+        proba = self.predict_proba(X_raw)
+        return self.labels_from_proba(proba), proba
+
+    def iter_predictions(self, chunks): # Lazily score an iterable of raw feature matrices
+        for X_raw in chunks:
+            proba = self.predict_proba(X_raw)
+            yield self.labels_from_proba(proba), proba
+
+    @staticmethod
+    def labels_from_proba(proba: np.ndarray) -> np.ndarray: # Same decision rule as LGBMClassifier.predict (argmax)
+        return (proba > 0.5).astype(np.int64)
+
+    def _transform_chunk(self, X_raw: np.ndarray) -> np.ndarray: # transform.transform(X_raw), with both steps timed
+        with FEATURE_ENGINEERING_SPAN.time():
+            features = add_interaction_features(X_raw)
+        with SCALE_SPAN.time():
+            return self.transform.scale(features)
+
+    def _score_chunk(self, X_raw: np.ndarray) -> np.ndarray:
+        import pandas as pd # Already loaded by the sklearn model; the NumPy engine never needs it
+        scaled = pd.DataFrame(self._transform_chunk(X_raw), columns=MODEL_FEATURES) # One frame per chunk keeps feature names for sklearn
+        with PREDICT_SPAN.time():
+            return self.model.predict_proba(scaled)[:, self.positive_index]
+
+
+def iter_csv_chunks(source, chunk_size: int = DEFAULT_CHUNK_SIZE): # Read only the raw feature columns, chunk by chunk
+    import pandas as pd
+    reader = pd.read_csv(source, usecols=RAW_FEATURES, chunksize=chunk_size) # Created eagerly so a bad header fails before streaming starts
+    return (chunk[RAW_FEATURES].to_numpy(dtype=np.float64) for chunk in reader)
+
+
+def score_csv(predictor: BatchPredictor, input_path: str, output_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    try:
+        import pandas as pd
+        logger.info(f"Batch scoring {input_path} into {output_path} with chunk size {chunk_size}")
+        n_rows = 0
+        start = time.perf_counter()
+        for i, (labels, proba) in enumerate(predictor.iter_predictions(iter_csv_chunks(input_path, chunk_size))):
+            out = pd.DataFrame({"prediction": labels, "probability": proba}) # One output row per input row, in input order
+            out.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            n_rows += len(out)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Scored {n_rows} rows in {elapsed:.3f}s ({n_rows / max(elapsed, 1e-9):.0f} rows/sec)")
+        return n_rows
+    except Exception as e:
+        logger.error(f"Error while batch scoring {input_path}: {e}")
+        raise CustomException("Failed to batch score data", e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV of patients with the trained diabetes model.")
+    parser.add_argument("--input", required=True, help="CSV file with the 8 raw feature columns")
+    parser.add_argument("--output", required=True, help="CSV file to write predictions to")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per transform/model call")
+    parser.add_argument("--model", default=MODEL_OUTPUT_PATH, help="Path to the trained model")
+    parser.add_argument("--transform", default=FEATURE_TRANSFORM_PATH, help="Path to the fitted feature transform")
+    args = parser.parse_args(argv)
+
+    predictor = BatchPredictor(joblib.load(args.model), joblib.load(args.transform), chunk_size=args.chunk_size)
+    n_rows = score_csv(predictor, args.input, args.output, chunk_size=args.chunk_size)
+    print(f"Wrote {n_rows} predictions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# This code is part of a machine learning project for diabetes classification.
+# It builds LightGBM's binned training Dataset from the processed training file without loading the file into
+# pandas: every chunk of utils.common_functions.iter_data_chunks becomes one lgb.Sequence, and LightGBM reads the
+# chunks twice, once to sample the bin boundaries and once to push the rows into its binned store. Only one chunk
+# of floats is in Python at any time. The constructed Dataset is written with save_binary under a name derived
+# from the content hash of the file, so later runs (and the CV folds, as subsets) load the bins directly.
+import glob
+import hashlib
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from utils.common_functions import iter_data_chunks, schema_path
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+DROP_COLUMNS = ["Unnamed: 0"] # Index column written by the CSV stages
+
+
+def sanitize_column(name: str) -> str: # LightGBM rejects JSON special characters in feature names
+    return re.sub(r'[^A-Za-z0-9_]+', '', name)
+
+
+def file_digest(path: str) -> str: # Content hash of a data file, including the schema sidecar of a .npy file
+    digest = hashlib.sha256()
+    for part in [path, schema_path(path)]:
+        if not os.path.exists(part):
+            continue
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkReader: # Sequential, restartable reader holding the feature matrix of one chunk
+
+    def __init__(self, path: str, chunk_size: int, feature_columns: list):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.feature_columns = feature_columns # Raw column names, in model order
+        self._chunks = None
+        self._position = -1 # Index of the chunk in self._current
+        self._current = None
+        self.passes = 0 # Times the file was opened, two for a Dataset built from scratch
+
+    def chunk(self, index: int) -> np.ndarray:
+        if index != self._position:
+            if index < self._position or self._chunks is None: # LightGBM went back to the first chunk: start a new pass
+                self._chunks = iter_data_chunks(self.path, self.chunk_size)
+                self._position = -1
+                self.passes += 1
+            while self._position < index:
+                frame = next(self._chunks)
+                self._position += 1
+            self._current = np.ascontiguousarray(frame[self.feature_columns].to_numpy(dtype=np.float64))
+        return self._current
+
+
+class ChunkSequence(lgb.Sequence): # One chunk of the file, as seen by LightGBM's Dataset construction
+
+    def __init__(self, reader: ChunkReader, index: int, length: int):
+        self.reader = reader
+        self.index = index
+        self.length = length
+        self.batch_size = length # Rows are pushed a whole chunk at a time
+
+    def __getitem__(self, idx):
+        return self.reader.chunk(self.index)[idx]
+
+    def __len__(self):
+        return self.length
+
+
+def scan_labels(path: str, chunk_size: int, target_column: str):
+    # (raw feature columns, rows per chunk, labels) from a first pass that keeps only the target column
+    feature_columns, lengths, labels = None, [], []
+    for frame in iter_data_chunks(path, chunk_size):
+        if feature_columns is None:
+            feature_columns = [col for col in frame.columns if col != target_column and col not in DROP_COLUMNS]
+        lengths.append(len(frame))
+        labels.append(frame[target_column].to_numpy(dtype=np.float32))
+    if feature_columns is None:
+        raise ValueError(f"No rows in {path}")
+    return feature_columns, lengths, np.concatenate(labels)
+
+
+def sample_frame(path: str, target_column: str, n_rows: int): # (X, y) of the first chunk, with sanitized column names
+    frame = next(iter_data_chunks(path, n_rows))
+    frame = frame.drop(columns=[col for col in DROP_COLUMNS if col in frame.columns])
+    frame = frame.rename(columns=sanitize_column)
+    target = sanitize_column(target_column)
+    return frame.drop(columns=[target]), frame[target]
+
+
+def build_dataset(path: str, target_column: str, chunk_size: int, params: dict, cache_dir: str) -> lgb.Dataset:
+    # Constructed Dataset of the file; loaded from cache_dir when the same file content was binned with the same params
+    key = hashlib.sha256(f"{file_digest(path)}:{target_column}:{json.dumps(params, sort_keys=True)}".encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f"{stem}_{key}.bin")
+    if os.path.exists(cache_path):
+        logger.info(f"Loading the binned training Dataset from {cache_path}")
+        return lgb.Dataset(cache_path, params=params).construct()
+
+    feature_columns, lengths, labels = scan_labels(path, chunk_size, target_column)
+    reader = ChunkReader(path, chunk_size, feature_columns)
+    sequences = [ChunkSequence(reader, index, length) for index, length in enumerate(lengths)]
+    dataset = lgb.Dataset(sequences, label=labels, feature_name=[sanitize_column(col) for col in feature_columns],
+                          params=params, free_raw_data=True).construct()
+    logger.info(f"Binned {len(labels):,} rows in {len(lengths)} chunk(s) with {reader.passes} pass(es) over {path}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(cache_dir, f"{stem}_*.bin")): # Bins of older versions of the file
+        os.remove(stale)
+    temp_path = cache_path + f".{os.getpid()}.tmp"
+    dataset.save_binary(temp_path)
+    os.replace(temp_path, cache_path)
+    logger.info(f"Binned training Dataset cached at {cache_path}")
+    return dataset
+
+
+def stop_before_new_rounds(env): # Early stop naming the init model's last round, so train() drops the rounds added after it
+    raise lgb.callback.EarlyStopException(env.begin_iteration - 1, [])
+
+
+def as_classifier(booster: lgb.Booster, params: dict, X_sample: pd.DataFrame, y_sample) -> lgb.LGBMClassifier:
+    # LGBMClassifier around a booster trained with lgb.train, for the code that expects the sklearn model
+    # (joblib artifact, MLflow, app, engine export). The classifier is fitted on a sample with the booster as
+    # init_model, so LightGBM itself sets every piece of fitted state (classes, feature names, objective); the one
+    # round that fit must add is cut off again by LightGBM's own early-stopping truncation.
+    if [sanitize_column(col) for col in X_sample.columns] != list(booster.feature_name()):
+        raise ValueError(f"Sample columns {list(X_sample.columns)} do not match the booster's {booster.feature_name()}")
+    model = lgb.LGBMClassifier(**{**params, "n_estimators": 1}, verbosity=-1)
+    model.fit(X_sample, y_sample, init_model=booster, callbacks=[stop_before_new_rounds])
+    model.set_params(n_estimators=model.booster_.current_iteration())
+    return model
@@ -0,0 +1,43 @@
+# This code is part of a machine learning project for diabetes classification.
+# It splits one CPU budget between concurrent search workers (candidates / CV folds trained side by side) and
+# the OpenMP threads of every LightGBM model, so that workers x threads never exceeds the cores we were given.
+# "wide" runs many single-threaded models, "deep" runs one model at a time with every thread, and "auto" gives
+# each model as many threads as its row count can keep busy and spends the rest on concurrent workers.
+import math
+import os
+from collections import namedtuple
+
+ParallelPlan = namedtuple("ParallelPlan", ["workers", "threads"]) # Concurrent models, and num_threads of each model
+
+STRATEGIES = ("wide", "deep", "auto")
+ROWS_PER_THREAD = 20000 # auto: below about this many rows per thread, another LightGBM thread costs more than it saves
+
+
+def available_cpus() -> int: # Cores this process may run on (respects taskset / container CPU sets)
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def resolve_cpu_budget(cpu_budget=None) -> int: # None or 0 -> every available core, negative -> like joblib (-1 all, -2 all but one)
+    cpus = available_cpus()
+    if not cpu_budget:
+        return cpus
+    if cpu_budget < 0:
+        return max(1, cpus + 1 + int(cpu_budget))
+    return int(cpu_budget)
+
+
+def plan_parallelism(cpu_budget=None, strategy: str = "auto", n_rows: int = 0, max_workers: int = None) -> ParallelPlan:
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown parallel strategy {strategy!r}, expected one of {STRATEGIES}")
+    budget = resolve_cpu_budget(cpu_budget)
+    max_workers = max(1, max_workers or budget) # More workers than independent tasks would sit idle
+    if strategy == "deep":
+        return ParallelPlan(workers=1, threads=budget)
+    if strategy == "wide":
+        workers = min(budget, max_workers)
+    else:
+        threads = min(budget, max(1, math.ceil(n_rows / ROWS_PER_THREAD)))
+        workers = max(1, min(budget // threads, max_workers))
+    return ParallelPlan(workers=workers, threads=max(1, budget // workers)) # Leftover cores go to the models' threads
@@ -2,13 +2,15 @@
 # It includes functions for downloading data from a Google Cloud Storage bucket, then splitting it into training and test sets.
 # The module is designed to work with a specific dataset related to diabetes.
 import os
+import shutil
+import numpy as np
 import pandas as pd
 from src.logger import get_logger
 from src.custom_exception import CustomException
-from google.cloud import storage
-from sklearn.model_selection import train_test_split
+from src.metrics import PIPELINE_STEP_SECONDS
+from src.storage import BlobDownloader, get_storage_backend
 from config.paths_config import *
-from utils.common_functions import read_yaml
+from utils.common_functions import read_yaml, save_data
 
 logger = get_logger(__name__)  # Initialize logger
 
@@ -17,7 +19,12 @@ class DataIngestion:
         self.config = config["data_ingestion"] # Load data ingestion configuration
         self.bucket_name = self.config["bucket_name"] # Name of the GCP bucket
         self.bucket_file_name = self.config["bucket_file_name"] # Name of the file in the bucket
+        self.bucket_prefix = self.config.get("bucket_prefix") or "" # Prefix of shard objects, empty for a single file
         self.train_test_ratio = self.config["train_ratio"] # Ratio of training data
+        self.split_mode = self.config.get("split_mode", "memory") # "memory" or "chunked"
+        self.chunk_size = self.config.get("chunk_size", 100000) # Rows per chunk in chunked mode
+        self.split_seed = self.config.get("split_seed", 42) # Seed for the hash-based split
+        self.split_key_columns = self.config.get("split_key_columns") or [] # Row key for the hash-based split
 
         os.makedirs(RAW_DIR, exist_ok=True)  # Create raw directory if it doesn't exist
 
@@ -25,36 +32,109 @@ class DataIngestion:
 
     def download_data(self):
         try:
-            client = storage.Client() # Initialize GCP storage client
-            bucket = client.bucket(self.bucket_name) # Picks a bucket (the folder in gcp where your files are stored) using its name
-            blob = bucket.blob(self.bucket_file_name) # Picks a file in the bucket using its name
+            backend = get_storage_backend(self.config) # GCS bucket or local directory
+            downloader = BlobDownloader(
+                backend,
+                DOWNLOAD_MANIFEST_PATH,
+                max_workers=self.config.get("download_workers", 8),
+                part_size=int(self.config.get("download_part_size_mb", 8) * 1024 * 1024),
+            )
+
+            if not self.bucket_prefix:
+                info = backend.stat(self.bucket_file_name) # Picks a file in the bucket using its name
+                with PIPELINE_STEP_SECONDS.time("download/sync"):
+                    downloader.sync([(info, RAW_FILE_PATH)]) # Downloads the file unless the local copy is already this version
+                logger.info(f"Data from bucket {self.bucket_name} is available at {RAW_FILE_PATH}")  # Log successful download
+                return
+
+            shards = backend.list_blobs(self.bucket_prefix) # Every shard object under the prefix
+            if not shards:
+                raise FileNotFoundError(f"No objects found under prefix {self.bucket_prefix}")
+            targets = [(info, os.path.join(SHARDS_DIR, info.name)) for info in shards]
+            with PIPELINE_STEP_SECONDS.time("download/sync"):
+                changed = downloader.sync(targets)
+            listing = [[info.name, info.checksum, info.generation] for info in shards]
+            if changed or not os.path.exists(RAW_FILE_PATH) or downloader.manifest.get(RAW_FILE_PATH, {}).get("shards") != listing:
+                with PIPELINE_STEP_SECONDS.time("download/combine_shards"):
+                    self.combine_shards([path for _, path in targets])
+                downloader.record(RAW_FILE_PATH, {"shards": listing})
+            logger.info(f"{len(shards)} shard(s) from bucket {self.bucket_name} are available at {RAW_FILE_PATH}")
 
-            blob.download_to_filename(RAW_FILE_PATH) # Downloads the file to the specified path
-            logger.info(f"Data downloaded from bucket {self.bucket_name} to {RAW_FILE_PATH}")  # Log successful download
-        
         except Exception as e:
             logger.error("Error while downloading data from GCP bucket")
             raise CustomException("Failed to download data from GCP bucket", e) 
+
+    def combine_shards(self, shard_paths): # Concatenate CSV shards, keeping only the first header
+        with open(RAW_FILE_PATH, "wb") as out:
+            for i, path in enumerate(shard_paths):
+                with open(path, "rb") as shard:
+                    header = shard.readline()
+                    if i == 0:
+                        out.write(header)
+                    shutil.copyfileobj(shard, out)
+        logger.info(f"Combined {len(shard_paths)} shard(s) into {RAW_FILE_PATH}")
     
     def split_data(self):
         try:
+            from sklearn.model_selection import train_test_split # Only the in-memory split needs sklearn; the download stage never loads it
             logger.info("Splitting data into train and test sets")  # Log start of data splitting
-            data = pd.read_csv(RAW_FILE_PATH)  # Read the raw data file
-            train_data, test_data = train_test_split(data, test_size=1-self.train_test_ratio, random_state=42)  # Split data into train and test sets
+            with PIPELINE_STEP_SECONDS.time("split/read"):
+                data = pd.read_csv(RAW_FILE_PATH)  # Read the raw data file
+            with PIPELINE_STEP_SECONDS.time("split/shuffle"):
+                train_data, test_data = train_test_split(data, test_size=1-self.train_test_ratio, random_state=42)  # Split data into train and test sets
 
-            train_data.to_csv(TRAIN_FILE_PATH) # Save training data to file
-            test_data.to_csv(TEST_FILE_PATH) # Save test data to file
+            with PIPELINE_STEP_SECONDS.time("split/save"):
+                save_data(train_data, TRAIN_FILE_PATH) # Save training data to file
+                save_data(test_data, TEST_FILE_PATH) # Save test data to file
             logger.info(f"Data split completed. Train data saved to {TRAIN_FILE_PATH} and test data saved to {TEST_FILE_PATH}")  # Log successful data splitting
 
         except Exception as e:
             logger.error("Error while splitting data into train and test sets")
             raise CustomException("Failed to split data into train and test sets", e)  # Raise custom exception with error message and original exception
     
+    def split_data_chunked(self):
+        try:
+            logger.info(f"Splitting data into train and test sets in chunks of {self.chunk_size} rows")
+            if not (TRAIN_FILE_PATH.endswith(".csv") and TEST_FILE_PATH.endswith(".csv")):
+                raise ValueError("Chunked splitting appends to the output files and needs INTERMEDIATE_FORMAT = 'csv'")
+            hash_key = f"{self.split_seed:016d}"[-16:] # pandas expects a 16 character hash key
+            n_train = n_test = 0
+            with open(TRAIN_FILE_PATH, "w", newline="") as train_file, open(TEST_FILE_PATH, "w", newline="") as test_file:
+                for i, chunk in enumerate(pd.read_csv(RAW_FILE_PATH, chunksize=self.chunk_size)): # Only one chunk is held in memory
+                    if self.split_key_columns:
+                        keys = chunk[self.split_key_columns]
+                        # A numeric column is read as int in a chunk without missing values and as float in one with them
+                        keys = keys.astype({c: "float64" for c in keys.columns if pd.api.types.is_numeric_dtype(keys[c])})
+                        hashes = pd.util.hash_pandas_object(keys, index=False, hash_key=hash_key).to_numpy()
+                    else:
+                        positions = pd.Series(np.arange(n_train + n_test, n_train + n_test + len(chunk)))
+                        hashes = pd.util.hash_pandas_object(positions, index=False, hash_key=hash_key).to_numpy()
+                    # hash_key only reaches string values, so the seed is mixed into the row hash here
+                    hashes = pd.util.hash_array(hashes ^ np.uint64(self.split_seed % 2**64))
+                    is_train = hashes / 2.0**64 < self.train_test_ratio # Same row, same seed -> same side, on any machine
+
+                    chunk[is_train].to_csv(train_file, header=(i == 0), index=False) # Append to the output files
+                    chunk[~is_train].to_csv(test_file, header=(i == 0), index=False)
+                    n_train += int(is_train.sum())
+                    n_test += int((~is_train).sum())
+
+            logger.info(f"Chunked split completed: {n_train} train rows saved to {TRAIN_FILE_PATH}, {n_test} test rows saved to {TEST_FILE_PATH}")
+
+        except Exception as e:
+            logger.error("Error while splitting data into train and test sets in chunks")
+            raise CustomException("Failed to split data into train and test sets", e)
+
+    def split(self): # Split with the configured mode
+        if self.split_mode == "chunked":
+            self.split_data_chunked() # Stream the raw file with a hash-based split
+        else:
+            self.split_data() # Shuffle the whole file in memory
+
     def run(self):
         try:
             logger.info("Starting data ingestion process")  # Log start of data ingestion process
             self.download_data() # Download data from GCP bucket
-            self.split_data() # Split data into train and test sets
+            self.split() # Split data into train and test sets
             logger.info("Data ingestion process completed successfully")  # Log successful completion of data ingestion process
         except CustomException as ce:
             logger.error(f"CustomException: {str(ce)}") # Log custom exception message
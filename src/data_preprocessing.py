@@ -1,24 +1,36 @@
 # This code is part of a data preprocessing module for a machine learning project.
 # It includes functions for loading data, feature engineering, handling missing values and scaling,
 # and saving processed data. The module is designed to work with a specific dataset related to diabetes.
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import joblib
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import RobustScaler
+from src.feature_transform import FeatureTransform, StreamingTransformFitter, INTERACTION_FEATURES, MODEL_FEATURES, RAW_FEATURES
 from src.logger import get_logger
 from src.custom_exception import CustomException
-from utils.common_functions import read_yaml, load_data
+from src.metrics import PIPELINE_STEP_SECONDS
+from src.drift_monitor import reference_from_data, reference_from_fitter
+from utils.common_functions import read_yaml, load_data, save_data, iter_data_chunks, save_data_chunks
 from config.paths_config import *
 
 logger = get_logger(__name__)
 
+def fit_chunk(numerical_columns, rank_error, seed, X_raw): # Worker task: summarize one chunk into a fresh fitter
+    return StreamingTransformFitter(numerical_columns, rank_error=rank_error, seed=seed).partial_fit(X_raw)
+
 class DataPreprocessor: # Class for data preprocessing
     def __init__(self, config_path):    # Initialize the DataPreprocessor with configuration
         self.config = read_yaml(config_path) # Read configuration from YAML file
         self.preprocessing_config = self.config['data_preprocessing'] # Load preprocessing configuration
         self.numerical_columns = self.preprocessing_config['numerical_columns'] # List of numerical columns to be processed
         self.target_column = self.preprocessing_config['target_column'] # Target column for prediction
+        self.fit_mode = self.preprocessing_config.get('fit_mode', 'memory') # "memory" or "streaming"
+        self.chunk_size = int(self.preprocessing_config.get('chunk_size', 100000)) # Rows per chunk in streaming mode
+        self.rank_error = float(self.preprocessing_config.get('sketch_rank_error', 0.005)) # Quantile sketch error bound
+        self.fit_workers = int(self.preprocessing_config.get('fit_workers', 1)) # Processes summarizing chunks in streaming mode
+        self.drift_bins = int(self.preprocessing_config.get('drift_bins', 10)) # Bins per feature of the drift reference
         
         self.train_path = TRAIN_FILE_PATH # Path to the training data file
         self.test_path = TEST_FILE_PATH # Path to the test data file
@@ -27,60 +39,50 @@ class DataPreprocessor: # Class for data preprocessing
         os.makedirs(self.processed_dir, exist_ok=True)
         logger.info("DataPreprocessor initialized.")
 
-    def create_features(self, df: pd.DataFrame) -> pd.DataFrame: # Function to create new features from existing ones
-
-        logger.info("Starting feature engineering.")  
-        # Create interaction features
-        df['Glucose_x_BMI'] = df['Glucose'] * df['BMI'] # Interaction between Glucose and BMI
-        df['Glucose_x_Age'] = df['Glucose'] * df['Age'] # Interaction between Glucose and Age
-        df['SkinThickness_x_Insulin'] = df['SkinThickness'] * df['Insulin'] # Interaction between SkinThickness and Insulin
-        logger.info(f"Created new features: {['Glucose_x_BMI', 'Glucose_x_Age', 'SkinThickness_x_Insulin']}")
+    def to_frame(self, features, target) -> pd.DataFrame: # Model-ready matrix plus target as a DataFrame
+        df = pd.DataFrame(features, columns=MODEL_FEATURES)
+        df[self.target_column] = target
         return df
 
     def process(self): # Main function to process the data
+        if self.fit_mode == "streaming":
+            return self.process_streaming() # One chunked pass with quantile sketches
 
         try:
             logger.info("Starting full data preprocessing pipeline.")
 
-            # 1. Load raw data
-            train_df = load_data(self.train_path) # Load training data
-            test_df = load_data(self.test_path) # Load test data
-            logger.info("Raw train and test data loaded successfully.")
-
-            # 2. <<< NEW STEP: Feature Engineering >>>
-            train_df = self.create_features(train_df) # Create new features for training data
-            test_df = self.create_features(test_df) # Create new features for test data
-
-            # 3. Separate features and target
-            X_train = train_df.drop(columns=[self.target_column]) # Features for training data
-            y_train = train_df[[self.target_column]] # Target for training data
-            X_test = test_df.drop(columns=[self.target_column]) # Features for test data 
-            y_test = test_df[[self.target_column]] # Target for test data
-
-            # 4. Handle Missing Values
-            logger.info("Starting missing value imputation.")
-            imputer = SimpleImputer(strategy='mean') # Initialize imputer to fill missing values with mean
-            X_train[self.numerical_columns] = imputer.fit_transform(X_train[self.numerical_columns]) # Fit and transform training data
-            X_test[self.numerical_columns] = imputer.transform(X_test[self.numerical_columns]) # Transform test data
-            logger.info("Missing values handled successfully.")
-
-            # 5. Scale Numerical Features
-            logger.info("Starting data scaling using RobustScaler.")
-            scaler = RobustScaler() # Initialize scaler to scale numerical features
-            X_train[self.numerical_columns] = scaler.fit_transform(X_train[self.numerical_columns]) # Fit and transform training data
-            X_test[self.numerical_columns] = scaler.transform(X_test[self.numerical_columns]) # Transform test data
-            logger.info("Data scaling completed.") 
-
-            # 6. Save the fitted scaler
-            scaler_path = os.path.join(self.processed_dir, 'scaler.joblib')
-            joblib.dump(scaler, scaler_path) # Save the fitted scaler to a file
-            logger.info(f"Fitted scaler saved to {scaler_path}")
-
-            # 7. Re-combine and save final data
-            processed_train_df = pd.concat([X_train, y_train], axis=1) # Combine features and target for training data
-            processed_test_df = pd.concat([X_test, y_test], axis=1) # Combine features and target for test data
-            self.save_data(processed_train_df, PROCESSED_TRAIN_DATA_PATH) # Save processed training data
-            self.save_data(processed_test_df, PROCESSED_TEST_DATA_PATH) # Save processed test data
+            with PIPELINE_STEP_SECONDS.time("preprocess/load"):
+                # 1. Load raw data
+                train_df = load_data(self.train_path) # Load training data
+                test_df = load_data(self.test_path) # Load test data
+                logger.info("Raw train and test data loaded successfully.")
+
+                # 2. Separate raw features and target
+                X_train_raw = train_df[RAW_FEATURES].to_numpy(dtype=np.float64) # Raw features for training data
+                y_train = train_df[self.target_column].to_numpy() # Target for training data
+                X_test_raw = test_df[RAW_FEATURES].to_numpy(dtype=np.float64) # Raw features for test data
+                y_test = test_df[self.target_column].to_numpy() # Target for test data
+
+            with PIPELINE_STEP_SECONDS.time("preprocess/fit_transform"):
+                # 3. Feature engineering, mean imputation and robust scaling in one vectorized pass
+                logger.info(f"Fitting FeatureTransform (interaction features {list(INTERACTION_FEATURES)}, mean imputation, RobustScaler).")
+                transform = FeatureTransform(numerical_columns=self.numerical_columns) # Same object is used by the prediction server
+                X_train = transform.fit_transform(X_train_raw) # Fit and transform training data
+                X_test = transform.transform(X_test_raw) # Transform test data
+                logger.info("Feature engineering, imputation and scaling completed.")
+
+            with PIPELINE_STEP_SECONDS.time("preprocess/save"):
+                # 4. Save the fitted transform, and the equivalent scaler for older consumers
+                joblib.dump(transform, FEATURE_TRANSFORM_PATH)
+                joblib.dump(transform.to_scaler(), SCALER_PATH)
+                logger.info(f"Fitted transform saved to {FEATURE_TRANSFORM_PATH} and scaler saved to {SCALER_PATH}")
+
+                # 5. Save final data
+                self.save_data(self.to_frame(X_train, y_train), PROCESSED_TRAIN_DATA_PATH) # Save processed training data
+                self.save_data(self.to_frame(X_test, y_test), PROCESSED_TEST_DATA_PATH) # Save processed test data
+
+                # 6. Training distribution of every raw and engineered feature, compared with live traffic by the server
+                self.save_drift_reference(reference_from_data(X_train_raw, self.drift_bins))
 
             logger.info("Data preprocessing pipeline completed successfully.")
 
@@ -88,10 +90,72 @@ class DataPreprocessor: # Class for data preprocessing
             logger.error(f"An unexpected error occurred in the preprocessing pipeline: {e}")
             raise CustomException("Unexpected error in preprocessing pipeline", e)
 
+    def raw_chunks(self, path): # (raw features, target) per chunk of an intermediate file
+        for chunk in iter_data_chunks(path, self.chunk_size):
+            yield chunk[RAW_FEATURES].to_numpy(dtype=np.float64), chunk[self.target_column].to_numpy()
+
+    def fit_streaming(self) -> StreamingTransformFitter: # One chunked pass over the training file; finalize() gives the transform
+        fitter = StreamingTransformFitter(self.numerical_columns, rank_error=self.rank_error)
+        if self.fit_workers <= 1:
+            for X_raw, _ in self.raw_chunks(self.train_path):
+                fitter.partial_fit(X_raw)
+            return fitter
+
+        # Chunks are summarized in worker processes and the sketches merged here; at most two chunks
+        # per worker are in flight, so memory stays bounded however large the file is
+        with ProcessPoolExecutor(max_workers=self.fit_workers) as pool:
+            pending = []
+            for seed, (X_raw, _) in enumerate(self.raw_chunks(self.train_path), start=1):
+                pending.append(pool.submit(fit_chunk, self.numerical_columns, self.rank_error, seed, X_raw))
+                if len(pending) >= 2 * self.fit_workers:
+                    fitter.merge(pending.pop(0).result())
+            for future in pending:
+                fitter.merge(future.result())
+        return fitter
+
+    def transform_file(self, transform: FeatureTransform, source: str, target: str): # Transform and write one file chunk by chunk
+        n_rows = len(load_data(source)) if target.endswith(".npy") else None # Memory-mapped, only the length is read
+        chunks = (self.to_frame(transform.transform(X_raw), y) for X_raw, y in self.raw_chunks(source))
+        save_data_chunks(chunks, target, n_rows=n_rows)
+
+    def process_streaming(self): # Same outputs as process(), without materializing the training set
+        try:
+            logger.info(f"Starting streaming data preprocessing (chunk size {self.chunk_size}, rank error {self.rank_error}, "
+                        f"{self.fit_workers} worker(s)).")
+
+            with PIPELINE_STEP_SECONDS.time("preprocess/streaming_fit"):
+                # 1. Fit means and quantile sketches in one pass over the training file
+                fitter = self.fit_streaming()
+                transform = fitter.finalize()
+                logger.info("Streaming fit of imputation means, medians and interquartile ranges completed.")
+
+            with PIPELINE_STEP_SECONDS.time("preprocess/transform_save"):
+                # 2. Save the fitted transform, and the equivalent scaler for older consumers
+                joblib.dump(transform, FEATURE_TRANSFORM_PATH)
+                joblib.dump(transform.to_scaler(), SCALER_PATH)
+                logger.info(f"Fitted transform saved to {FEATURE_TRANSFORM_PATH} and scaler saved to {SCALER_PATH}")
+
+                # 3. Second pass: transform and write train and test data chunk by chunk
+                self.transform_file(transform, self.train_path, PROCESSED_TRAIN_DATA_PATH)
+                self.transform_file(transform, self.test_path, PROCESSED_TEST_DATA_PATH)
+
+                # 4. Drift reference from the same sketches, without another pass
+                self.save_drift_reference(reference_from_fitter(fitter, self.drift_bins))
+
+            logger.info("Streaming data preprocessing completed successfully.")
+
+        except Exception as e:
+            logger.error(f"An unexpected error occurred in the streaming preprocessing pipeline: {e}")
+            raise CustomException("Unexpected error in streaming preprocessing pipeline", e)
+
+    def save_drift_reference(self, reference: dict): # Bin edges and shares of the training data, completed by ModelTraining
+        with open(DRIFT_FEATURES_PATH, "w") as f:
+            json.dump(reference, f, indent=2)
+        logger.info(f"Drift reference of {len(reference['features'])} features in {reference['bins']} bins saved to {DRIFT_FEATURES_PATH}")
+
     def save_data(self, df: pd.DataFrame, file_path: str): # Function to save processed data to a file
         try:
-            df.to_csv(file_path, index=False) # Save DataFrame to CSV file without index
-            logger.info(f"Data saved successfully to {file_path}")
+            save_data(df, file_path) # Save DataFrame in the format given by the file extension
         except Exception as e:
             logger.error(f"Error while saving data to {file_path}: {e}")
             raise CustomException("Failed to save processed data", e)
@@ -0,0 +1,252 @@
+# This code is part of the serving side of the diabetes prediction project.
+# It compares live traffic with the training data. Preprocessing bins every raw and engineered feature of the
+# training set into fixed bins (quantile edges, plus one bin for missing values) and training adds the predicted
+# probabilities of the test set; the reference is published in the model bundle. The server counts every scored row
+# into the same bins: each request thread owns its list of counts, so an update is a bisect and an increment per
+# feature with no lock. The counts of threads that have exited are folded into one array, so memory stays constant
+# however much traffic and however many short-lived request threads are seen. PSI and a binned KS statistic against
+# the reference are computed only when asked for (/drift) or by the optional retrain trigger.
+import bisect
+import fcntl
+import json
+import os
+import shlex
+import subprocess
+import threading
+import time
+import numpy as np
+from src.feature_transform import INTERACTION_FEATURES, MODEL_FEATURES, RAW_FEATURES, add_interaction_features
+from src.logger import get_logger
+from src.metrics import SERVING_STAGE_SECONDS
+
+logger = get_logger(__name__)
+
+PROBABILITY = "probability" # Name of the predicted probability in a reference, next to the feature names
+PAIRS = [(RAW_FEATURES.index(left), RAW_FEATURES.index(right)) for left, right in INTERACTION_FEATURES.values()]
+DEFAULT_BINS = 10
+MIN_FRACTION = 1e-4 # Floor of a bin's share in PSI, so empty bins do not divide by zero
+DRIFT_SPAN = SERVING_STAGE_SECONDS.labels("drift")
+
+
+def quantile_edges(values: np.ndarray, bins: int = DEFAULT_BINS) -> np.ndarray: # Inner bin edges, deduplicated for discrete features
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return np.empty(0)
+    return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+
+
+def bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    # len(edges) + 2 counts: bin i holds edges[i - 1] <= value < edges[i], the last one the missing values
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    index = np.searchsorted(edges, values[~missing], side="right")
+    counts = np.bincount(index, minlength=len(edges) + 1)
+    return np.append(counts, missing.sum())
+
+
+def feature_reference(edges: np.ndarray, counts: np.ndarray) -> dict:
+    counts = np.asarray(counts, dtype=np.float64)
+    return {"edges": [float(edge) for edge in edges],
+            "expected": [round(float(share), 8) for share in counts / max(counts.sum(), 1.0)]}
+
+
+def reference_from_data(X_raw: np.ndarray, bins: int = DEFAULT_BINS) -> dict: # Exact reference of an in-memory training set
+    features = add_interaction_features(X_raw)
+    reference = {"bins": int(bins), "rows": int(features.shape[0]), "features": {}}
+    for j, name in enumerate(MODEL_FEATURES):
+        edges = quantile_edges(features[:, j], bins)
+        reference["features"][name] = feature_reference(edges, bin_counts(features[:, j], edges))
+    return reference
+
+
+def reference_from_fitter(fitter, bins: int = DEFAULT_BINS) -> dict:
+    # Streaming preprocessing: edges and bin shares from the quantile sketches the fitter already keeps, no extra pass.
+    # Shares are within the sketch's rank error of the exact ones
+    reference = {"bins": int(bins), "rows": int(fitter.n_rows), "features": {}}
+    for name, sketch, missing in zip(fitter.numerical_columns, fitter.sketches, fitter.missing):
+        edges = np.unique(sketch.quantile(np.linspace(0, 1, bins + 1)[1:-1])) if sketch.count else np.empty(0)
+        below = np.array([0.0] + [sketch.rank(edge) for edge in edges] + [1.0]) * sketch.count # Weight below each edge
+        counts = np.append(np.diff(below), missing)
+        reference["features"][name] = feature_reference(edges, counts)
+    return reference
+
+
+def add_probability_reference(reference: dict, proba: np.ndarray, bins: int = DEFAULT_BINS) -> dict:
+    edges = quantile_edges(proba, bins)
+    reference["features"][PROBABILITY] = feature_reference(edges, bin_counts(proba, edges))
+    return reference
+
+
+def load_reference(path: str): # None when the run did not save one
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float: # Population stability index over all bins, missing included
+    expected = np.maximum(expected, MIN_FRACTION)
+    actual = np.maximum(actual, MIN_FRACTION)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def binned_ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    # Largest gap between the two CDFs of the present values, read at the bin edges; a lower bound of the exact KS statistic
+    expected, actual = expected[:-1], actual[:-1]
+    if expected.sum() <= 0 or actual.sum() <= 0:
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(actual) / actual.sum() - np.cumsum(expected) / expected.sum())))
+
+
+class DriftMonitor: # Constant-memory counts of live traffic in the reference bins, one list of counts per thread
+
+    def __init__(self, reference: dict, window_seconds: float = 3600, min_rows: int = 500,
+                 psi_threshold: float = 0.2, ks_threshold: float = 0.1):
+        self.reference = reference
+        self.window_seconds = float(window_seconds) # Rows since the window started are compared; 0 keeps one window forever
+        self.min_rows = int(min_rows) # Smaller windows are reported as insufficient_data
+        self.psi_threshold = float(psi_threshold)
+        self.ks_threshold = float(ks_threshold)
+        self.names = [name for name in MODEL_FEATURES if name in reference["features"]]
+        self.columns = np.array([MODEL_FEATURES.index(name) for name in self.names], dtype=np.intp)
+        self.has_probability = PROBABILITY in reference["features"]
+        self.all_names = names = self.names + ([PROBABILITY] if self.has_probability else []) # Distributions counted, in order
+        self.edges = edges = [np.asarray(reference["features"][name]["edges"], dtype=np.float64) for name in names]
+        self.width = max(len(e) for e in edges) + 2 # Bins per feature in the counts; the last one counts missing values
+        self.n_bins = np.array([len(e) + 1 for e in edges]) # Bins for present values, per feature
+        self.offsets = np.arange(len(names)) * self.width # Start of every feature in the flat counts
+        self.expected = [np.asarray(reference["features"][name]["expected"]) for name in names]
+        positions = [MODEL_FEATURES.index(name) for name in self.names] + ([len(MODEL_FEATURES)] if self.has_probability else [])
+        self._plan = [(position, int(offset), e.tolist()) for position, offset, e in zip(positions, self.offsets, edges)] # For observe_row
+        self._local = threading.local()
+        self._shards = [] # (thread, counts) of the threads that are counting, summed by the reader
+        self._finished = np.zeros(len(names) * self.width, dtype=np.int64) # Folded counts of threads that have exited
+        self._lock = threading.Lock() # Taken when a thread registers its list and by readers, never by observe()
+        self._baseline = np.zeros(len(names) * self.width, dtype=np.int64) # Counts when the current window started
+        self._window_start = time.time()
+
+    def observe_row(self, row, proba: float = None): # Count one scored row (8 raw floats); plain Python, numpy costs more for one row
+        # Not timed: a span would cost half as much as the update itself (benchmarks/bench_drift.py measures it)
+        values = [*row, *[row[a] * row[b] for a, b in PAIRS], proba] # Raw, interactions, probability
+        counts = self._counts()
+        missing = self.width - 1
+        for position, offset, edges in self._plan:
+            value = values[position]
+            counts[offset + (bisect.bisect_right(edges, value) if value == value else missing)] += 1 # NaN != NaN
+
+    def observe(self, X_raw: np.ndarray, proba: np.ndarray = None): # Count scored rows: raw inputs (n, 8) and their probabilities
+        X_raw = np.asarray(X_raw, dtype=np.float64)
+        if X_raw.shape[0] <= 1:
+            if X_raw.shape[0] == 1:
+                self.observe_row(X_raw[0].tolist(), float(np.asarray(proba)[0]) if self.has_probability else None)
+            return
+        with DRIFT_SPAN.time():
+            features = add_interaction_features(X_raw)
+            columns = [features[:, j] for j in self.columns] + ([np.asarray(proba, dtype=np.float64)] if self.has_probability else [])
+            counts = self._counts()
+            for values, edges, offset in zip(columns, self.edges, self.offsets.tolist()):
+                index = np.searchsorted(edges, values, side="right")
+                index[np.isnan(values)] = self.width - 1
+                added = np.bincount(index, minlength=self.width)
+                for i in np.flatnonzero(added).tolist(): # At most one update per bin, however many rows
+                    counts[offset + i] += int(added[i])
+
+    def _counts(self) -> list: # This thread's counts; only this thread writes to them
+        counts = getattr(self._local, "counts", None)
+        if counts is None:
+            counts = [0] * (len(self.all_names) * self.width)
+            with self._lock:
+                self._fold_finished()
+                self._shards.append((threading.current_thread(), counts))
+            self._local.counts = counts
+        return counts
+
+    def _fold_finished(self): # With the lock held: move the counts of exited threads into one array
+        running = []
+        for thread, counts in self._shards:
+            if thread.is_alive():
+                running.append((thread, counts))
+            else: # Nothing writes to it any more
+                self._finished += np.array(counts, dtype=np.int64)
+        self._shards = running
+
+    def totals(self) -> np.ndarray: # Counts since the monitor was created, over all threads
+        with self._lock:
+            self._fold_finished()
+            return sum((np.array(counts, dtype=np.int64) for _, counts in self._shards), self._finished.copy())
+
+    def check(self) -> dict: # PSI and KS of the current window against the reference; starts a new window once it is old enough
+        now = time.time()
+        totals = self.totals()
+        with self._lock:
+            window = (totals - self._baseline).reshape(len(self.all_names), self.width)
+            started = self._window_start
+            if self.window_seconds > 0 and now - started >= self.window_seconds:
+                self._baseline, self._window_start = totals, now
+        rows = int(window[0].sum()) # Every row is counted once per feature
+        report = {"rows": rows, "window_seconds": round(now - started, 1), "min_rows": self.min_rows,
+                  "reference_rows": self.reference.get("rows"), "features": {}, "drifted": []}
+        for i, name in enumerate(self.all_names):
+            counts = np.append(window[i, :self.n_bins[i]], window[i, -1]) # Present-value bins, then missing
+            actual = counts / max(rows, 1)
+            feature = {"psi": round(psi(self.expected[i], actual), 6), "ks": round(binned_ks(self.expected[i], actual), 6),
+                       "missing_rate": round(float(actual[-1]), 6), "expected_missing_rate": round(float(self.expected[i][-1]), 6)}
+            report["features"][name] = feature
+            if rows >= self.min_rows and (feature["psi"] >= self.psi_threshold or feature["ks"] >= self.ks_threshold):
+                report["drifted"].append(name)
+        report["max_psi"] = max((f["psi"] for f in report["features"].values()), default=0.0)
+        report["status"] = "insufficient_data" if rows < self.min_rows else ("drift" if report["drifted"] else "ok")
+        return report
+
+
+class RetrainTrigger: # Asks for a retrain when a check finds drift: writes a request file and optionally runs a command
+
+    def __init__(self, path: str, check_seconds: float = 300, cooldown_seconds: float = 86400, command: str = ""):
+        self.path = path # Request file with the drift report, for schedulers; training removes it once a new bundle is out
+        self.check_seconds = float(check_seconds) # How often each server process checks, 0 for checks through /drift only
+        self.cooldown_seconds = float(cooldown_seconds) # No new request while the last one is younger than this
+        self.command = command # e.g. "python -m pipeline.training_pipeline", started detached; empty only writes the file
+        self._watcher = None
+        self._lock = threading.Lock()
+
+    def maybe_fire(self, report: dict, version: str = None) -> bool:
+        if report.get("status") != "drift":
+            return False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            # The request file is shared by all server processes, so they honour one cooldown: the lock makes the
+            # age check and the write one step, or two processes that both see an old file would both fire
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if time.time() - os.path.getmtime(self.path) < self.cooldown_seconds:
+                    return False
+            except FileNotFoundError:
+                pass
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"requested": time.strftime("%Y-%m-%dT%H:%M:%S"), "model_version": version, "report": report}, f, indent=2)
+            os.replace(temp_path, self.path)
+        logger.warning(f"Drift in {report['drifted']} (max PSI {report['max_psi']}) of bundle {version}; retrain requested in {self.path}")
+        if self.command:
+            subprocess.Popen(shlex.split(self.command), start_new_session=True,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) # Outlives the request and the worker
+        return True
+
+    def ensure_watcher(self, active_bundle): # Started lazily so every forked server worker gets its own thread
+        if self.check_seconds <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, args=(active_bundle,), name="drift-watcher", daemon=True)
+                self._watcher.start()
+
+    def _watch(self, active_bundle): # active_bundle() -> the served bundle, whose monitor is checked
+        while True:
+            time.sleep(self.check_seconds)
+            bundle = active_bundle()
+            try:
+                if bundle is not None and bundle.drift is not None:
+                    self.maybe_fire(bundle.drift.check(), bundle.version)
+            except Exception as e:
+                logger.error(f"Drift check failed: {e}")
@@ -0,0 +1,142 @@
+# This code is part of the serving side of the diabetes prediction project.
+# It explains predictions with LightGBM's native TreeSHAP (predict(pred_contrib=True)): one vectorized call per chunk
+# gives every row's additive contribution of each model feature to the log-odds, plus the base value they start from.
+# Contributions of the interaction features (Glucose_x_BMI, ...) are split evenly between their two raw inputs, so
+# clinicians see the 8 values they entered; the split keeps the sum, so base value + contributions is still the
+# log-odds of the predicted probability. The same code computes the global importance summary at training time.
+#   python -m src.explanations --input cohort.csv --output explained.csv
+import argparse
+import time
+import joblib
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.batch_prediction import DEFAULT_CHUNK_SIZE, LABELS, iter_csv_chunks
+from src.feature_transform import FeatureTransform, INTERACTION_FEATURES, MODEL_FEATURES, RAW_FEATURES
+from src.metrics import SERVING_STAGE_SECONDS
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+EXPLAIN_SPAN = SERVING_STAGE_SECONDS.labels("explain")
+
+
+def raw_mapping() -> np.ndarray: # (11, 8) matrix: engineered contributions @ mapping -> raw contributions
+    mapping = np.zeros((len(MODEL_FEATURES), len(RAW_FEATURES)))
+    mapping[:len(RAW_FEATURES)] = np.eye(len(RAW_FEATURES)) # Raw inputs keep their own contribution
+    for offset, (left, right) in enumerate(INTERACTION_FEATURES.values()):
+        row = len(RAW_FEATURES) + offset
+        mapping[row, RAW_FEATURES.index(left)] += 0.5 # Half of the product's contribution to each factor
+        mapping[row, RAW_FEATURES.index(right)] += 0.5
+    return mapping
+
+
+RAW_MAPPING = raw_mapping()
+
+
+class Explainer: # Per-row contributions of the raw inputs, for chunks of raw feature matrices
+
+    def __init__(self, model, transform: FeatureTransform, chunk_size: int = DEFAULT_CHUNK_SIZE, threads: int = None):
+        self.booster = getattr(model, "booster_", model) # LGBMClassifier or Booster
+        self.transform = transform # Fitted FeatureTransform
+        self.chunk_size = max(1, int(chunk_size))
+        self.threads = threads # LightGBM threads per call, None for the model's default
+        if self.booster.num_feature() != len(MODEL_FEATURES):
+            raise ValueError(f"The model has {self.booster.num_feature()} features, expected {len(MODEL_FEATURES)}")
+
+    def engineered_contributions(self, X_scaled: np.ndarray) -> np.ndarray: # (n, 11 + 1): contributions, then the base value
+        params = {} if self.threads is None else {"num_threads": self.threads}
+        return self.booster.predict(np.asarray(X_scaled, dtype=np.float64), pred_contrib=True, **params)
+
+    def explain(self, X_raw: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (raw contributions (n, 8), base values (n,), positive probabilities (n,)), all in one pass per chunk
+        X_raw = np.asarray(X_raw, dtype=np.float64)
+        if X_raw.shape[0] == 0:
+            return np.empty((0, len(RAW_FEATURES))), np.empty(0), np.empty(0)
+        parts = [self._explain_chunk(X_raw[start:start + self.chunk_size]) for start in range(0, X_raw.shape[0], self.chunk_size)]
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+    def _explain_chunk(self, X_raw: np.ndarray) -> tuple:
+        with EXPLAIN_SPAN.time():
+            contributions = self.engineered_contributions(self.transform.transform(X_raw))
+        base = contributions[:, -1]
+        raw = contributions[:, :-1] @ RAW_MAPPING
+        proba = 1.0 / (1.0 + np.exp(-(contributions.sum(axis=1)))) # Same as predict_proba: the contributions add up to the log-odds
+        return raw, base, proba
+
+
+def explanation_records(raw: np.ndarray, base: np.ndarray, proba: np.ndarray, top_k: int = 3) -> list:
+    # One JSON-ready dict per row: prediction, probability, base value, contribution of every raw input and the
+    # top_k inputs by absolute contribution (positive pushes towards 'Diabetic')
+    order = np.argsort(-np.abs(raw), axis=1)[:, :top_k]
+    records = []
+    for i in range(raw.shape[0]):
+        label = int(proba[i] > 0.5)
+        records.append({
+            "prediction": label,
+            "label": LABELS[label],
+            "probability": round(float(proba[i]), 6),
+            "base_value": round(float(base[i]), 6), # Log-odds before any input is known
+            "contributions": {name: round(float(value), 6) for name, value in zip(RAW_FEATURES, raw[i])},
+            "top_features": [RAW_FEATURES[j] for j in order[i]],
+        })
+    return records
+
+
+def global_importance(explainer: Explainer, X_scaled: np.ndarray) -> dict:
+    # Mean absolute and mean signed contribution per engineered and per raw feature over already scaled rows
+    contributions = np.concatenate([explainer.engineered_contributions(X_scaled[start:start + explainer.chunk_size])
+                                    for start in range(0, len(X_scaled), explainer.chunk_size)])
+    engineered = contributions[:, :-1]
+    return {
+        "rows": int(len(X_scaled)),
+        "base_value": round(float(contributions[:, -1].mean()), 6),
+        "raw": _importance_summary(engineered @ RAW_MAPPING, RAW_FEATURES), # Most important first
+        "engineered": _importance_summary(engineered, MODEL_FEATURES),
+    }
+
+
+def _importance_summary(values: np.ndarray, names: list) -> dict:
+    mean_abs, mean = np.abs(values).mean(axis=0), values.mean(axis=0)
+    return {names[j]: {"mean_abs": round(float(mean_abs[j]), 6), "mean": round(float(mean[j]), 6)} for j in np.argsort(-mean_abs)}
+
+
+def explain_csv(explainer: Explainer, input_path: str, output_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    # Batch mode: prediction, probability, base value and one contribution column per raw input for every row
+    try:
+        import pandas as pd
+        logger.info(f"Explaining {input_path} into {output_path} with chunk size {chunk_size}")
+        n_rows = 0
+        start = time.perf_counter()
+        for i, X_raw in enumerate(iter_csv_chunks(input_path, chunk_size)):
+            raw, base, proba = explainer.explain(X_raw)
+            out = pd.DataFrame(raw, columns=[f"contribution_{name}" for name in RAW_FEATURES])
+            out.insert(0, "base_value", base)
+            out.insert(0, "probability", proba)
+            out.insert(0, "prediction", (proba > 0.5).astype(np.int64))
+            out.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            n_rows += len(out)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Explained {n_rows} rows in {elapsed:.3f}s ({n_rows / max(elapsed, 1e-9):.0f} rows/sec)")
+        return n_rows
+    except Exception as e:
+        logger.error(f"Error while explaining {input_path}: {e}")
+        raise CustomException("Failed to explain data", e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Explain the diabetes model's predictions for a CSV of patients.")
+    parser.add_argument("--input", required=True, help="CSV file with the 8 raw feature columns")
+    parser.add_argument("--output", required=True, help="CSV file to write predictions and contributions to")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per pred_contrib call")
+    parser.add_argument("--model", default=MODEL_OUTPUT_PATH, help="Path to the trained model")
+    parser.add_argument("--transform", default=FEATURE_TRANSFORM_PATH, help="Path to the fitted feature transform")
+    args = parser.parse_args(argv)
+
+    explainer = Explainer(joblib.load(args.model), joblib.load(args.transform), chunk_size=args.chunk_size)
+    n_rows = explain_csv(explainer, args.input, args.output, chunk_size=args.chunk_size)
+    print(f"Wrote {n_rows} explanations to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# This code is part of a data preprocessing module for a machine learning project.
+# It combines feature engineering, mean imputation and robust scaling into one fitted object that
+# works on NumPy arrays in a single vectorized pass. The same object is saved next to scaler.joblib
+# and loaded by the prediction server, so training and serving share one implementation.
+# StreamingTransformFitter fits the same object in one chunked pass, using quantile sketches instead of
+# exact percentiles, for training files that do not fit in memory.
+import copy
+import numpy as np
+from src.quantile_sketch import KLLSketch, k_for_rank_error
+
+RAW_FEATURES = [
+    'Pregnancies', 'Glucose', 'BloodPressure', 'SkinThickness',
+    'Insulin', 'BMI', 'DiabetesPedigreeFunction', 'Age'
+] # Raw inputs expected from the client, in training order
+INTERACTION_FEATURES = {
+    'Glucose_x_BMI': ('Glucose', 'BMI'),
+    'Glucose_x_Age': ('Glucose', 'Age'),
+    'SkinThickness_x_Insulin': ('SkinThickness', 'Insulin'),
+} # Interaction features built from pairs of raw inputs
+MODEL_FEATURES = RAW_FEATURES + list(INTERACTION_FEATURES) # Column order seen by the scaler and the model
+
+
+def add_interaction_features(X_raw: np.ndarray) -> np.ndarray: # Raw matrix -> raw matrix followed by the interaction columns
+    X_raw = np.asarray(X_raw, dtype=np.float64)
+    features = np.empty((X_raw.shape[0], len(MODEL_FEATURES)), dtype=np.float64)
+    features[:, :len(RAW_FEATURES)] = X_raw
+    for offset, (left, right) in enumerate(INTERACTION_FEATURES.values()):
+        column = len(RAW_FEATURES) + offset
+        np.multiply(X_raw[:, RAW_FEATURES.index(left)], X_raw[:, RAW_FEATURES.index(right)], out=features[:, column])
+    return features
+
+
+class FeatureTransform: # Feature engineering + SimpleImputer(strategy='mean') + RobustScaler in one object
+
+    def __init__(self, numerical_columns=None, quantile_range=(25.0, 75.0)):
+        self.numerical_columns = list(numerical_columns or MODEL_FEATURES) # Columns that are imputed and scaled
+        self.quantile_range = tuple(quantile_range) # Same meaning as RobustScaler(quantile_range=...)
+        unknown = set(self.numerical_columns) - set(MODEL_FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown numerical columns {sorted(unknown)}, expected a subset of {MODEL_FEATURES}")
+        self.columns_ = np.array([MODEL_FEATURES.index(col) for col in self.numerical_columns]) # Positions in MODEL_FEATURES
+        self.mean_ = None # Imputation value per numerical column, None disables imputation
+        self.center_ = None # Median per numerical column
+        self.scale_ = None # Interquartile range per numerical column
+
+    def fit(self, X_raw: np.ndarray):
+        features = add_interaction_features(X_raw)[:, self.columns_]
+        missing = np.isnan(features)
+        has_missing = missing.any()
+        mean = np.nanmean(features, axis=0) if has_missing else features.mean(axis=0) if features.shape[0] else np.zeros(features.shape[1])
+        self.mean_ = np.where(np.isnan(mean), 0.0, mean) # Columns without any value are imputed with 0
+        if has_missing:
+            features[missing] = np.broadcast_to(self.mean_, features.shape)[missing]
+        q_min, median, q_max = np.percentile(features, [self.quantile_range[0], 50.0, self.quantile_range[1]], axis=0) # One partition per column
+        self.center_ = median
+        self.set_scale(q_max - q_min)
+        return self
+
+    def set_scale(self, scale: np.ndarray): # Constant columns keep a scale of 1, as in RobustScaler
+        scale = np.asarray(scale, dtype=np.float64)
+        self.scale_ = np.where(scale < 10 * np.finfo(np.float64).eps, 1.0, scale)
+
+    def transform(self, X_raw: np.ndarray) -> np.ndarray: # Raw matrix (n, 8) -> model-ready matrix (n, 11)
+        return self.scale(add_interaction_features(X_raw))
+
+    def scale(self, features: np.ndarray) -> np.ndarray: # Engineered matrix (n, 11) -> imputed and scaled, in place
+        block = features[:, self.columns_]
+        if self.mean_ is not None:
+            missing = np.isnan(block)
+            if missing.any():
+                block = np.where(missing, self.mean_, block)
+        block -= self.center_
+        block /= self.scale_
+        features[:, self.columns_] = block
+        return features
+
+    def fit_transform(self, X_raw: np.ndarray) -> np.ndarray:
+        return self.fit(X_raw).transform(X_raw)
+
+    def to_scaler(self): # Equivalent fitted RobustScaler, kept for scaler.joblib consumers
+        from sklearn.preprocessing import RobustScaler
+        scaler = RobustScaler(quantile_range=self.quantile_range)
+        scaler.center_ = self.center_.copy()
+        scaler.scale_ = self.scale_.copy()
+        scaler.n_features_in_ = len(self.numerical_columns)
+        scaler.feature_names_in_ = np.array(self.numerical_columns, dtype=object)
+        return scaler
+
+    @classmethod
+    def from_scaler(cls, scaler, mean=None): # Wrap a fitted RobustScaler from an older run (no imputation unless mean is given)
+        columns = list(getattr(scaler, 'feature_names_in_', MODEL_FEATURES))
+        transform = cls(numerical_columns=columns, quantile_range=scaler.quantile_range)
+        transform.mean_ = None if mean is None else np.asarray(mean, dtype=np.float64)
+        transform.center_ = np.zeros(len(columns)) if scaler.center_ is None else np.asarray(scaler.center_, dtype=np.float64)
+        transform.scale_ = np.ones(len(columns)) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+        return transform
+
+
+class StreamingTransformFitter: # Fits a FeatureTransform in one chunked pass with bounded memory
+
+    def __init__(self, numerical_columns=None, quantile_range=(25.0, 75.0), rank_error: float = 0.005, seed: int = 0):
+        self.numerical_columns = list(numerical_columns or MODEL_FEATURES)
+        self.quantile_range = tuple(quantile_range)
+        self.rank_error = float(rank_error) # Target rank error of the median and quartiles, e.g. 0.005 = half a percentile
+        self.columns_ = FeatureTransform(self.numerical_columns).columns_ # Validates the column names
+        k = k_for_rank_error(self.rank_error)
+        self.sketches = [KLLSketch(k=k, seed=seed + i) for i in range(len(self.numerical_columns))] # One sketch per column
+        self.sums = np.zeros(len(self.numerical_columns)) # Running sum of the observed values per column
+        self.counts = np.zeros(len(self.numerical_columns), dtype=np.int64) # Observed (non-missing) values per column
+        self.missing = np.zeros(len(self.numerical_columns), dtype=np.int64) # Missing values per column, imputed at finalize()
+        self.n_rows = 0
+
+    def partial_fit(self, X_raw: np.ndarray): # Summarize one chunk of raw rows
+        features = add_interaction_features(X_raw)[:, self.columns_]
+        missing = np.isnan(features)
+        self.sums += np.where(missing, 0.0, features).sum(axis=0)
+        self.missing += missing.sum(axis=0)
+        self.counts += features.shape[0] - missing.sum(axis=0)
+        self.n_rows += features.shape[0]
+        for i, sketch in enumerate(self.sketches):
+            sketch.update(features[:, i]) # NaNs are dropped by the sketch
+        return self
+
+    def merge(self, other: "StreamingTransformFitter"): # Combine the summary of another worker
+        if other.numerical_columns != self.numerical_columns or other.quantile_range != self.quantile_range:
+            raise ValueError("Cannot merge fitters with different columns or quantile ranges")
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        self.sums += other.sums
+        self.counts += other.counts
+        self.missing += other.missing
+        self.n_rows += other.n_rows
+        return self
+
+    def imputation_mean(self) -> np.ndarray: # Mean of the observed values, 0 for columns without any value
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sums / self.counts
+        return np.where(self.counts > 0, mean, 0.0)
+
+    def quantiles(self) -> np.ndarray: # (3, n_columns) array: lower quantile, median, upper quantile after imputation
+        mean = self.imputation_mean()
+        levels = np.array([self.quantile_range[0], 50.0, self.quantile_range[1]]) / 100.0
+        result = np.zeros((3, len(self.sketches)))
+        for i, sketch in enumerate(self.sketches):
+            # Imputed rows take the mean before the quantiles are computed, exactly as in FeatureTransform.fit;
+            # a weighted update on a copy does this without changing the running summary
+            sketch = copy.deepcopy(sketch)
+            sketch.update(mean[i:i + 1], weight=int(self.missing[i]))
+            if sketch.count:
+                result[:, i] = sketch.quantile(levels)
+        return result
+
+    def finalize(self) -> FeatureTransform: # Fitted FeatureTransform with approximate median and IQR
+        transform = FeatureTransform(numerical_columns=self.numerical_columns, quantile_range=self.quantile_range)
+        transform.mean_ = self.imputation_mean()
+        q_min, median, q_max = self.quantiles()
+        transform.center_ = median
+        transform.set_scale(q_max - q_min)
+        return transform
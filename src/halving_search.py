@@ -0,0 +1,164 @@
+# This code is part of a machine learning project for diabetes classification.
+# It implements a successive-halving hyperparameter search for LightGBM: every candidate starts with a small
+# number of boosting rounds, only the best 1/eta of them move on to a rung with eta times more rounds, and every
+# fold is trained with LightGBM's early-stopping callback on its validation split. The binned lgb.Dataset of each
+# fold is constructed once and shared by all candidates and rungs. fit_dataset() runs the same search on an
+# already binned Dataset (src/chunked_dataset.py), with the folds as subsets of it.
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import lightgbm as lgb
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from src.chunked_dataset import as_classifier
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+SCORERS = {
+    "f1": lambda y, proba: f1_score(y, proba > 0.5),
+    "accuracy": lambda y, proba: accuracy_score(y, proba > 0.5),
+    "precision": lambda y, proba: precision_score(y, proba > 0.5, zero_division=0),
+    "recall": lambda y, proba: recall_score(y, proba > 0.5),
+    "roc_auc": roc_auc_score,
+} # Validation scores on positive-class probabilities, higher is better
+
+
+class SuccessiveHalvingSearch: # Drop-in for RandomizedSearchCV that spends boosting rounds on promising candidates only
+
+    def __init__(self, param_distributions: dict, base_params: dict = None, n_candidates: int = 27, eta: int = 3,
+                 min_rounds: int = 50, max_rounds: int = 1000, early_stopping_rounds: int = 50, cv: int = 5,
+                 scoring: str = "f1", random_state: int = 42, n_jobs: int = 1, num_threads: int = 0):
+        if scoring not in SCORERS:
+            raise ValueError(f"Unsupported scoring {scoring!r}, expected one of {sorted(SCORERS)}")
+        self.param_distributions = param_distributions # Same format as RandomizedSearchCV(param_distributions=...)
+        self.base_params = dict(base_params or {}) # Fixed LGBMClassifier parameters, e.g. scale_pos_weight
+        self.n_candidates = n_candidates # Candidates sampled for the first rung
+        self.eta = eta # Keep the best 1/eta candidates and give them eta times more rounds at every rung
+        self.min_rounds = min_rounds # Rounds per fold on the first rung
+        self.max_rounds = max_rounds # Rounds per fold on the last rung; a candidate's own n_estimators caps it further
+        self.early_stopping_rounds = early_stopping_rounds # Patience of the early-stopping callback on each fold
+        self.cv = cv
+        self.scoring = scoring
+        self.random_state = random_state
+        self.n_jobs = max(1, n_jobs) # Candidates trained concurrently; LightGBM releases the GIL, so threads suffice
+        self.num_threads = num_threads # OpenMP threads per model, 0 lets LightGBM use every core
+        self.best_params_ = None
+        self.best_score_ = None
+        self.best_estimator_ = None
+        self.history_ = [] # One entry per (candidate, rung): rounds, best iteration, score and elapsed seconds
+        self.time_to_best_ = None # Seconds from the start of fit() until best_score_ was first reached
+        self.candidates_ = [] # (params with the early-stopped n_estimators, score) of every candidate, best first
+
+    def rungs(self) -> list: # Round budgets: min_rounds, min_rounds * eta, ... up to max_rounds
+        budgets = [self.min_rounds]
+        while budgets[-1] < self.max_rounds:
+            budgets.append(min(budgets[-1] * self.eta, self.max_rounds))
+        return budgets
+
+    def booster_params(self, candidate: dict) -> dict: # LGBMClassifier keyword arguments -> lgb.train parameters
+        params = {"objective": "binary", "metric": "binary_logloss", "verbosity": -1, "num_threads": self.num_threads}
+        params.update({k: v for k, v in self.base_params.items() if k != "n_estimators"})
+        params.update({k: v for k, v in candidate.items() if k != "n_estimators"})
+        if "random_state" in params: # lgb.train spells it seed
+            params["seed"] = params.pop("random_state")
+        return params
+
+    def build_folds(self, X: np.ndarray, y: np.ndarray) -> list: # Bin every fold once; candidates only differ in booster params
+        folds = []
+        splitter = StratifiedKFold(n_splits=self.cv, shuffle=True, random_state=self.random_state)
+        for train_idx, valid_idx in splitter.split(X, y):
+            train_set = lgb.Dataset(X[train_idx], y[train_idx], params={"verbosity": -1}, free_raw_data=False).construct()
+            valid_set = lgb.Dataset(X[valid_idx], y[valid_idx], reference=train_set).construct()
+            folds.append((train_set, valid_set, X[valid_idx], y[valid_idx]))
+        return folds
+
+    def build_dataset_folds(self, dataset: lgb.Dataset) -> list: # Folds as subsets sharing the bins of one constructed Dataset
+        y = dataset.get_label()
+        splitter = StratifiedKFold(n_splits=self.cv, shuffle=True, random_state=self.random_state)
+        return [(dataset.subset(train_idx).construct(), dataset.subset(valid_idx).construct(), None, None)
+                for train_idx, valid_idx in splitter.split(np.zeros(len(y)), y)]
+
+    def feval(self, preds: np.ndarray, data: lgb.Dataset): # The scorer as an extra validation metric, for folds without raw rows
+        return self.scoring, SCORERS[self.scoring](data.get_label(), preds), True
+
+    def evaluate(self, candidate: dict, folds: list, budget: int) -> dict: # Train every fold up to budget rounds with early stopping
+        params = self.booster_params(candidate)
+        rounds = min(budget, candidate.get("n_estimators", budget))
+        scores, best_iterations, stopped = [], [], True
+        for train_set, valid_set, X_valid, y_valid in folds:
+            evals = {}
+            booster = lgb.train(
+                params, train_set, num_boost_round=rounds, valid_sets=[valid_set], valid_names=["valid"],
+                feval=self.feval if X_valid is None else None, # Binned rows predict exactly like the raw ones
+                callbacks=[lgb.early_stopping(self.early_stopping_rounds, first_metric_only=True, verbose=False),
+                           lgb.record_evaluation(evals)],
+            )
+            best_iteration = booster.best_iteration or rounds
+            if X_valid is None:
+                scores.append(evals["valid"][self.scoring][best_iteration - 1])
+            else:
+                scores.append(SCORERS[self.scoring](y_valid, booster.predict(X_valid, num_iteration=best_iteration)))
+            best_iterations.append(best_iteration)
+            stopped &= best_iteration + self.early_stopping_rounds <= rounds # Early stopping fired before the budget ran out
+        return {
+            "score": float(np.mean(scores)),
+            "rounds": rounds,
+            "best_iteration": int(np.mean(best_iterations)),
+            "converged": stopped or rounds >= candidate.get("n_estimators", rounds), # More rounds would not change the result
+        }
+
+    def fit(self, X, y):
+        start = time.perf_counter()
+        X_input, y_input = X, y # The refit keeps the DataFrame so the model remembers the feature names
+        folds = self.build_folds(np.asarray(X, dtype=np.float64), np.asarray(y))
+        final_params = self.search(folds, start)
+        self.best_estimator_ = lgb.LGBMClassifier(**final_params, verbosity=-1, n_jobs=self.n_jobs * self.num_threads or None)
+        self.best_estimator_.fit(X_input, y_input) # The refit is the only model training now, so it gets the whole budget
+        logger.info(f"Successive halving finished in {time.perf_counter() - start:.1f}s, best {self.scoring} {self.best_score_:.4f} "
+                    f"reached after {self.time_to_best_:.1f}s")
+        return self
+
+    def fit_dataset(self, dataset: lgb.Dataset, X_sample, y_sample):
+        # Same search on a constructed Dataset; X_sample / y_sample (a few rows with every class) only give the
+        # returned LGBMClassifier its feature names and classes
+        start = time.perf_counter()
+        final_params = self.search(self.build_dataset_folds(dataset), start)
+        params = {**self.booster_params(final_params), "num_threads": self.n_jobs * self.num_threads}
+        booster = lgb.train(params, dataset, num_boost_round=final_params["n_estimators"])
+        self.best_estimator_ = as_classifier(booster, {**final_params, "n_jobs": params["num_threads"] or None}, X_sample, y_sample)
+        logger.info(f"Successive halving finished in {time.perf_counter() - start:.1f}s, best {self.scoring} {self.best_score_:.4f} "
+                    f"reached after {self.time_to_best_:.1f}s")
+        return self
+
+    def search(self, folds: list, start: float) -> dict: # Run the rungs; returns the LGBMClassifier parameters of the winner
+        candidates = list(ParameterSampler(self.param_distributions, n_iter=self.n_candidates, random_state=self.random_state))
+        results = {} # Candidate index -> latest evaluation
+        survivors = list(range(len(candidates)))
+
+        for rung, budget in enumerate(self.rungs()):
+            # Candidates that early stopping already ended below the old budget are not retrained; it would change nothing
+            pending = [index for index in survivors if index not in results or not results[index]["converged"]]
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as pool: # The fold Datasets are shared read-only between workers
+                for index, result in zip(pending, pool.map(lambda i: self.evaluate(candidates[i], folds, budget), pending)):
+                    results[index] = result
+                    self.history_.append({"candidate": index, "rung": rung, "elapsed": time.perf_counter() - start, **result})
+            logger.info(f"Rung {rung}: {len(survivors)} candidate(s) at up to {budget} rounds, "
+                        f"best {self.scoring} {max(results[i]['score'] for i in survivors):.4f}")
+            keep = max(1, len(survivors) // self.eta)
+            survivors = sorted(survivors, key=lambda i: results[i]["score"], reverse=True)[:keep]
+            if len(survivors) == 1 and results[survivors[0]]["converged"]:
+                break
+
+        # The winner is the best candidate of the last rung, refit on the full training set with the number
+        # of rounds early stopping chose on the folds
+        best_index = survivors[0]
+        best_score = results[best_index]["score"]
+        self.time_to_best_ = next(entry["elapsed"] for entry in self.history_ if entry["score"] >= best_score)
+        self.best_params_ = dict(candidates[best_index])
+        self.best_score_ = best_score
+        self.best_params_["n_estimators"] = max(1, results[best_index]["best_iteration"])
+        ranked = [best_index] + sorted((i for i in results if i != best_index), key=lambda i: results[i]["score"], reverse=True)
+        self.candidates_ = [({**candidates[i], "n_estimators": max(1, results[i]["best_iteration"])}, results[i]["score"])
+                            for i in ranked] # Scores of candidates dropped early come from fewer rounds
+        return {**self.base_params, **self.best_params_}
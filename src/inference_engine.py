@@ -0,0 +1,177 @@
+# This code is part of the serving side of the diabetes prediction project.
+# It flattens the fitted RobustScaler and the LightGBM booster into plain NumPy arrays
+# (one row per tree node) and scores batches by walking all trees level by level.
+# Exporting from the current artifacts:
+#   python -m src.inference_engine
+import os
+import joblib
+import numpy as np
+from src.logger import get_logger
+from src.custom_exception import CustomException
+from src.batch_prediction import BatchPredictor, DEFAULT_CHUNK_SIZE, PREDICT_SPAN
+from src.feature_transform import FeatureTransform
+from config.paths_config import *
+
+logger = get_logger(__name__)
+
+MISSING_TYPES = {"None": 0, "Zero": 1, "NaN": 2} # LightGBM missing value handling per split
+ZERO_THRESHOLD = 1e-35 # Values this close to zero count as zero for missing_type 'Zero' (kZeroThreshold in LightGBM)
+MAX_NODES_PER_BLOCK = 1 << 21 # Rows x trees walked at once, bounds the temporary arrays to a few MB
+
+
+class TreeEngine: # Array-backed copy of a binary LightGBM model plus its scaler
+
+    ARRAYS = ("center", "scale", "feature", "threshold", "left", "right", "value",
+              "default_left", "missing_type", "roots") # Arrays stored in the .npz file
+
+    def __init__(self, center, scale, feature, threshold, left, right, value, default_left,
+                 missing_type, roots, max_depth, sigmoid, feature_names):
+        self.center = center # RobustScaler.center_ (zeros when centering was disabled)
+        self.scale = scale # RobustScaler.scale_ (ones when scaling was disabled)
+        self.feature = feature # Split feature per node; leaves use 0 and point to themselves
+        self.threshold = threshold # Split threshold per node, go left when x <= threshold
+        self.left = left # Index of the left child per node
+        self.right = right # Index of the right child per node
+        self.value = value # Leaf value per node, 0 for internal nodes
+        self.default_left = default_left # Direction taken by missing values
+        self.missing_type = missing_type # See MISSING_TYPES
+        self.roots = roots # Root node of every tree
+        self.max_depth = int(max_depth) # Number of levels to walk
+        self.sigmoid = float(sigmoid) # Sigmoid parameter of the binary objective
+        self.feature_names = list(feature_names) # Expected input column order
+        self.block_rows = max(1, MAX_NODES_PER_BLOCK // max(1, len(roots)))
+        self.step = (right - left).astype(np.int32) # Offset from the left to the right child, 0 for leaves
+        self.has_zero_missing = bool((missing_type == 1).any()) # Zero-as-missing splits need the slow path even without NaNs
+
+    @classmethod
+    def from_model(cls, model, scaler): # Build the tables from a fitted LGBMClassifier and RobustScaler
+        dump = model.booster_.dump_model()
+        if dump["num_tree_per_iteration"] != 1 or not dump["objective"].startswith("binary"):
+            raise ValueError(f"Only binary models are supported, got objective '{dump['objective']}'")
+
+        nodes = {name: [] for name in ("feature", "threshold", "left", "right", "value", "default_left", "missing_type")}
+        roots = []
+        max_depth = 0
+
+        def add_node(): # Append an empty node and return its index
+            for name, column in nodes.items():
+                column.append(0)
+            return len(nodes["feature"]) - 1
+
+        for tree in dump["tree_info"]:
+            stack = [(tree["tree_structure"], add_node(), 0)]
+            roots.append(stack[0][1])
+            while stack:
+                node, index, depth = stack.pop()
+                max_depth = max(max_depth, depth)
+                if "leaf_value" in node or "split_feature" not in node:
+                    nodes["value"][index] = node.get("leaf_value", 0.0)
+                    nodes["left"][index] = nodes["right"][index] = index # Leaves loop onto themselves
+                    continue
+                if node["decision_type"] != "<=":
+                    raise ValueError(f"Unsupported split type '{node['decision_type']}'")
+                left, right = add_node(), add_node()
+                nodes["feature"][index] = node["split_feature"]
+                nodes["threshold"][index] = node["threshold"]
+                nodes["left"][index], nodes["right"][index] = left, right
+                nodes["default_left"][index] = node["default_left"]
+                nodes["missing_type"][index] = MISSING_TYPES[node["missing_type"]]
+                stack.append((node["left_child"], left, depth + 1))
+                stack.append((node["right_child"], right, depth + 1))
+
+        n_features = len(dump["feature_names"])
+        center = np.zeros(n_features) if scaler.center_ is None else np.asarray(scaler.center_, dtype=np.float64)
+        scale = np.ones(n_features) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+        sigmoid = float(dump["objective"].split("sigmoid:")[1].split()[0]) if "sigmoid:" in dump["objective"] else 1.0
+        return cls(
+            center=center, scale=scale,
+            feature=np.asarray(nodes["feature"], dtype=np.int32),
+            threshold=np.asarray(nodes["threshold"], dtype=np.float64),
+            left=np.asarray(nodes["left"], dtype=np.int32),
+            right=np.asarray(nodes["right"], dtype=np.int32),
+            value=np.asarray(nodes["value"], dtype=np.float64),
+            default_left=np.asarray(nodes["default_left"], dtype=bool),
+            missing_type=np.asarray(nodes["missing_type"], dtype=np.int8),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth, sigmoid=sigmoid, feature_names=dump["feature_names"],
+        )
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, max_depth=self.max_depth, sigmoid=self.sigmoid, feature_names=np.asarray(self.feature_names),
+                 **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in cls.ARRAYS}
+            return cls(max_depth=int(data["max_depth"]), sigmoid=float(data["sigmoid"]),
+                       feature_names=data["feature_names"].tolist(), **arrays)
+
+    def raw_score(self, X_scaled: np.ndarray) -> np.ndarray: # Sum of leaf values over all trees for scaled features
+        X_scaled = np.asarray(X_scaled, dtype=np.float64)
+        out = np.empty(X_scaled.shape[0], dtype=np.float64)
+        for start in range(0, X_scaled.shape[0], self.block_rows):
+            block = X_scaled[start:start + self.block_rows]
+            out[start:start + len(block)] = self._walk(block)
+        return out
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray: # Positive class probability for unscaled model features
+        X_scaled = (np.asarray(X, dtype=np.float64) - self.center) / self.scale
+        return self.proba_from_scaled(X_scaled)
+
+    def proba_from_scaled(self, X_scaled: np.ndarray) -> np.ndarray: # Positive class probability for already scaled features
+        return 1.0 / (1.0 + np.exp(-self.sigmoid * self.raw_score(X_scaled)))
+
+    def _walk(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        flat = np.ascontiguousarray(X).ravel()
+        offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None] # Start of every row in the flattened matrix
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        for _ in range(self.max_depth): # Every tree moves down one level per step; finished trees stay on their leaf
+            x = flat.take(offsets + self.feature.take(node))
+            threshold = self.threshold.take(node)
+            go_right = ~(x <= threshold)
+            missing = np.isnan(x)
+            if self.has_zero_missing or missing.any():
+                missing_type = self.missing_type.take(node)
+                go_left = np.where(missing & (missing_type == 0), 0.0 <= threshold, ~go_right) # NaN is read as 0
+                use_default = (missing & (missing_type != 0)) | ((missing_type == 1) & (np.abs(x) <= ZERO_THRESHOLD))
+                go_right = ~np.where(use_default, self.default_left.take(node), go_left)
+            node = self.left.take(node) + go_right * self.step.take(node)
+        return self.value.take(node).sum(axis=1)
+
+
+class EnginePredictor(BatchPredictor): # BatchPredictor backed by a TreeEngine instead of the joblib pickles
+
+    def __init__(self, engine: TreeEngine, transform: FeatureTransform, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.engine = engine
+        self.transform = transform # Feature engineering, imputation and scaling
+        self.chunk_size = max(1, int(chunk_size))
+
+    def _score_chunk(self, X_raw: np.ndarray) -> np.ndarray:
+        scaled = self._transform_chunk(X_raw)
+        with PREDICT_SPAN.time():
+            return self.engine.proba_from_scaled(scaled)
+
+
+def export_engine(model, scaler, path: str = ENGINE_OUTPUT_PATH) -> TreeEngine:
+    try:
+        engine = TreeEngine.from_model(model, scaler)
+        engine.save(path)
+        logger.info(f"Exported NumPy engine with {len(engine.roots)} trees and {len(engine.feature)} nodes to {path}")
+        return engine
+    except Exception as e:
+        logger.error(f"Error while exporting the NumPy engine: {e}")
+        raise CustomException("Failed to export inference engine", e)
+
+
+def parity_error(engine: TreeEngine, model, X_scaled) -> float: # Largest probability gap between the engine and predict_proba
+    positive_index = int(np.flatnonzero(model.classes_ == 1)[0])
+    expected = model.predict_proba(X_scaled)[:, positive_index]
+    return float(np.max(np.abs(engine.proba_from_scaled(np.asarray(X_scaled, dtype=np.float64)) - expected), initial=0.0))
+
+
+if __name__ == "__main__":
+    export_engine(joblib.load(MODEL_OUTPUT_PATH), joblib.load(SCALER_PATH), ENGINE_OUTPUT_PATH)
+    print(f"Engine written to {ENGINE_OUTPUT_PATH}")
@@ -0,0 +1,115 @@
+# This code is part of a machine learning project for diabetes classification.
+# It makes inference cost part of model selection: every candidate of the search is timed on the serving path
+# (single-row p50/p99 and per-row cost of a large batch), candidates that are both less accurate and slower than
+# another one are dropped, and the most accurate candidate left on the Pareto front within the latency budget
+# wins. The winner can also lose its trailing boosting iterations when their split gain is negligible.
+import platform
+import time
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from src.chunked_dataset import stop_before_new_rounds
+from src.cpu_budget import available_cpus
+from src.inference_engine import TreeEngine
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def hardware_profile(threads: int) -> dict: # Logged with the latencies; numbers from different machines do not compare
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    return {"latency_cpu": cpu, "latency_cpus_available": available_cpus(), "latency_threads": threads}
+
+
+def serving_predict(model: lgb.LGBMClassifier, engine: str, scaler=None, threads: int = 1):
+    # Positive-class probability function for already scaled rows, as the configured serving engine computes it
+    if engine == "numpy":
+        tree_engine = TreeEngine.from_model(model, scaler)
+        return lambda X: tree_engine.proba_from_scaled(np.asarray(X, dtype=np.float64))
+    positive_index = int(np.flatnonzero(model.classes_ == 1)[0])
+    return lambda X: model.predict_proba(X, num_threads=threads)[:, positive_index] # BatchPredictor passes a DataFrame too
+
+
+def measure_latency(predicts: list, X: pd.DataFrame, batch_size: int = 1000, single_row_repeats: int = 500,
+                    batch_repeats: int = 5) -> list:
+    # Single-row latency percentiles and the best per-row cost of a batch_size batch (ms / µs) for every predict
+    # function. The calls are interleaved across the candidates, so machine noise and CPU frequency drift hit all
+    # of them alike instead of whichever candidate happened to be timed at that moment.
+    rows = [X.iloc[i % len(X):i % len(X) + 1] for i in range(single_row_repeats)] # Sliced up front, slicing is not serving cost
+    batch = X.iloc[np.arange(batch_size) % len(X)]
+    single = [[] for _ in predicts]
+    batch_seconds = [[] for _ in predicts]
+    for predict in predicts:
+        predict(rows[0]) # Warm-up, the first call allocates
+    for i, row in enumerate(rows):
+        for j in np.roll(np.arange(len(predicts)), i): # Rotate who goes first
+            start = time.perf_counter()
+            predicts[j](row)
+            single[j].append(time.perf_counter() - start)
+    for _ in range(batch_repeats):
+        for j, predict in enumerate(predicts):
+            start = time.perf_counter()
+            predict(batch)
+            batch_seconds[j].append(time.perf_counter() - start)
+    return [{
+        "p50_ms": float(np.percentile(single[j], 50) * 1e3),
+        "p99_ms": float(np.percentile(single[j], 99) * 1e3),
+        "batch_us_per_row": float(min(batch_seconds[j]) / batch_size * 1e6), # Minimum: the least disturbed repeat
+    } for j in range(len(predicts))]
+
+
+def pareto_front(results: list, latency_key: str = "p99_ms") -> list:
+    # Indices of the results no other result beats on both score (higher) and latency (lower), fastest first
+    order = sorted(range(len(results)), key=lambda i: (results[i][latency_key], -results[i]["score"]))
+    front, best_score = [], float("-inf")
+    for i in order:
+        if results[i]["score"] > best_score:
+            front.append(i)
+            best_score = results[i]["score"]
+    return front
+
+
+def select_within_budget(results: list, budget: float, latency_key: str = "p99_ms") -> tuple[int, list]:
+    # (index of the most accurate Pareto candidate within the budget, front); the fastest one if none fits
+    front = pareto_front(results, latency_key)
+    within = [i for i in front if results[i][latency_key] <= budget]
+    if not within:
+        logger.warning(f"No candidate meets the {latency_key} budget of {budget}; taking the fastest one")
+        return front[0], front
+    return max(within, key=lambda i: results[i]["score"]), front
+
+
+def iteration_gains(booster: lgb.Booster) -> np.ndarray: # Total split gain of every boosting iteration (one tree each for binary)
+    gains = []
+    for tree in booster.dump_model()["tree_info"]:
+        total, stack = 0.0, [tree["tree_structure"]]
+        while stack:
+            node = stack.pop()
+            if "split_gain" in node:
+                total += node["split_gain"]
+                stack.extend([node["left_child"], node["right_child"]])
+        gains.append(total)
+    return np.array(gains)
+
+
+def prune_trailing_iterations(model: lgb.LGBMClassifier, min_gain_fraction: float, X_sample, y_sample) -> lgb.LGBMClassifier:
+    # The model without its last iterations while together they hold at most min_gain_fraction of the total split
+    # gain (the model itself if nothing is dropped). The pruned classifier is fitted on a sample with the first trees
+    # as init_model, as chunked_dataset.as_classifier wraps a booster, so it predicts like predict(num_iteration=keep).
+    gains = iteration_gains(model.booster_)
+    if len(gains) < 2 or gains.sum() <= 0:
+        return model
+    tail = np.cumsum(gains[::-1])[::-1] # tail[k]: gain of iterations k..end
+    keep = max(1, int(np.argmax(np.append(tail, 0.0) <= min_gain_fraction * gains.sum())))
+    if keep == len(gains):
+        return model
+    first_trees = lgb.Booster(model_str=model.booster_.model_to_string(num_iteration=keep))
+    pruned = lgb.LGBMClassifier(**{**model.get_params(), "n_estimators": 1})
+    pruned.fit(X_sample, y_sample, init_model=first_trees, callbacks=[stop_before_new_rounds])
+    pruned.set_params(n_estimators=pruned.booster_.current_iteration())
+    return pruned
@@ -1,13 +1,24 @@
 import logging
 import os
-from datetime import datetime 
+from datetime import datetime
 
 LOGS_DIR = "logs" # Directory to store logs
-os.makedirs(LOGS_DIR, exist_ok=True)
 
 LOG_FILE = os.path.join(LOGS_DIR, f'log_{datetime.now().strftime("%Y-%m-%d")}.log') # Log file with date in name
+
+
+class LazyFileHandler(logging.FileHandler): # Creates the logs directory and opens the file on the first record, not on import
+
+    def __init__(self, filename):
+        super().__init__(filename, delay=True) # delay: the file is opened by the first emit
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
 logging.basicConfig(
-    filename = LOG_FILE, # Log file path
+    handlers = [LazyFileHandler(LOG_FILE)], # Log file path, touched only once something is logged
     format = '%(asctime)s - %(levelname)s - %(message)s', # Log format with timestamp, level, and message
     level = logging.INFO # Set logging level to INFO, which captures all messages at this level and above
 )
@@ -17,4 +28,4 @@ def get_logger(name):
     logger.setLevel(logging.INFO) # Set the logger level to INFO
     return logger # Return the configured logger
 
-# This code sets up a logging system that writes logs to a file with a date in the filename, ensuring that logs are organized by day.
\ No newline at end of file
+# This code sets up a logging system that writes logs to a file with a date in the filename, ensuring that logs are organized by day.
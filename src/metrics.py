@@ -0,0 +1,204 @@
+# This code is part of the diabetes prediction project.
+# It times the steps of serving a request and of running the pipeline with fixed-bucket histograms, and renders
+# them in the Prometheus text format for the /metrics endpoint. A span is a perf_counter() pair and one bucket
+# increment, so it can wrap every step of every request (benchmarks/bench_metrics.py measures the cost).
+# Each gunicorn worker keeps its own numbers; every sample carries a worker label so scrapes of different
+# workers stay separate series, and sum() over worker gives the totals.
+import bisect
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = ( # Seconds; from tens of microseconds (one transform call) to a slow request
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+PIPELINE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0) # Seconds, for pipeline steps
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Span: # Context manager timing one step into a histogram; failed steps are recorded too
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class HistogramChild: # Bucket counts, sum and count of one label combination
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets # Upper bounds, ascending; the last bucket (+Inf) is implicit
+        self.counts = [0] * (len(buckets) + 1) # Per bucket, not cumulative
+        self.sum = 0.0
+        self.count = 0
+        self.last = None # Most recent observation, e.g. the duration of the last pipeline run of a step
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value) # Bucket with the smallest upper bound >= value
+        self._lock.acquire() # Cheaper than a with block, and nothing in between can raise
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.last = value
+        self._lock.release()
+
+    def time(self) -> Span:
+        return Span(self)
+
+    def snapshot(self) -> tuple: # (counts, sum, count) read together
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class CounterChild:
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _Family: # A metric name with one child per combination of label values
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values): # Hot paths look their child up once and keep it
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def children(self) -> list:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class Histogram(_Family):
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def time(self, *values) -> Span:
+        return self.labels(*values).time()
+
+    def lines(self, extra: str) -> list:
+        lines = []
+        for values, child in self.children():
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames + ("le",), values + (_format_value(bound),), extra)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, values, extra)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter(_Family):
+
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, *values, amount: float = 1.0):
+        self.labels(*values).inc(amount)
+
+    def lines(self, extra: str) -> list:
+        return [f"{self.name}_total{_format_labels(self.labelnames, values, extra)} {_format_value(child.value)}"
+                for values, child in self.children()]
+
+
+class MetricsRegistry: # Every metric of the process, rendered together
+
+    def __init__(self, prefix: str = "diabetes_"):
+        self.prefix = prefix
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(self.prefix + name, documentation, labelnames))
+
+    def _register(self, family): # Registering a name twice returns the first family, so modules can be reloaded
+        with self._lock:
+            return self._families.setdefault(family.name, family)
+
+    def render(self, worker_label: bool = True) -> str: # Prometheus text exposition format 0.0.4
+        extra = f'worker="{os.getpid()}"' if worker_label else "" # Read at render time: the pid of the forked worker, not of the master
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(family.lines(extra))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str): # For batch jobs: node_exporter's textfile collector picks the file up
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.render(worker_label=False)) # One process per run; a pid label would start new series every run
+        os.replace(temp_path, path)
+
+
+METRICS = MetricsRegistry() # Process-wide registry
+
+SERVING_STAGE_SECONDS = METRICS.histogram(
+    "serving_stage_seconds", "Time spent in each step of scoring: parse, feature_engineering, scale, predict, explain, drift, render.", ["stage"])
+REQUEST_SECONDS = METRICS.histogram(
+    "http_request_seconds", "Time from the start to the end of a request, by endpoint and status code.", ["endpoint", "status"])
+PREDICTIONS = METRICS.counter(
+    "predictions", "Rows answered with a prediction, by endpoint; its rate is the serving throughput.", ["endpoint"])
+PIPELINE_STEP_SECONDS = METRICS.histogram(
+    "pipeline_step_seconds", "Duration of each pipeline stage and of its sub-steps (stage/step).", ["step"], PIPELINE_BUCKETS)
+
+
+def step_durations(prefix: str = "seconds/") -> dict: # Last duration of every pipeline step, as MLflow metric names
+    return {prefix + values[0]: child.last for values, child in PIPELINE_STEP_SECONDS.children() if child.last is not None}
@@ -0,0 +1,261 @@
+# This code is part of the serving side of the diabetes prediction project.
+# It versions everything a prediction depends on as one bundle: the model, the NumPy engine, the feature transform
+# and the scaler of one training run are copied into artifacts/bundles/<version>/ together with a manifest holding
+# their hashes, the feature list and the MLflow run id. A pointer file (CURRENT) names the version to serve; it is
+# replaced atomically by training, by the admin endpoint and by rollbacks. Every server process watches the pointer,
+# loads and warms a new bundle on a background thread and swaps it in with a single reference assignment, so
+# requests never wait for a load and never see a model paired with another run's transform.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+import joblib
+import numpy as np
+from src.batch_prediction import BatchPredictor, DEFAULT_CHUNK_SIZE
+from src.explanations import Explainer
+from src.feature_transform import FeatureTransform, MODEL_FEATURES, RAW_FEATURES
+from src.inference_engine import EnginePredictor, TreeEngine
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+BUNDLE_FILES = { # Role -> file name inside a bundle directory
+    "model": "model.pkl",
+    "engine": "engine.npz",
+    "transform": "feature_transform.joblib",
+    "scaler": "scaler.joblib",
+    "importance": "global_importance.json", # Optional, bundles of older runs do not have it
+    "drift": "drift_reference.json", # Optional, as above
+}
+POINTER_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+WARM_UP_ROWS = 16 # Rows scored before a bundle is swapped in
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_atomic(path: str, text: str): # Readers see the old or the new content, never a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def current_version(bundles_dir: str): # Version named by the pointer file, None before the first bundle
+    try:
+        with open(os.path.join(bundles_dir, POINTER_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_current(bundles_dir: str, version: str):
+    if not os.path.exists(os.path.join(bundles_dir, version, MANIFEST_FILE)):
+        raise FileNotFoundError(f"No bundle {version!r} in {bundles_dir}")
+    write_atomic(os.path.join(bundles_dir, POINTER_FILE), version + "\n")
+
+
+def is_staging(name: str) -> bool: # Bundle still being written by publish_bundle, possibly in another process
+    return name.startswith(".") and name.endswith(".tmp")
+
+
+def list_versions(bundles_dir: str) -> list: # Complete bundles, oldest first
+    if not os.path.isdir(bundles_dir):
+        return []
+    return sorted(name for name in os.listdir(bundles_dir)
+                  if not is_staging(name) and os.path.exists(os.path.join(bundles_dir, name, MANIFEST_FILE)))
+
+
+def publish_bundle(bundles_dir: str, files: dict, run_id: str = None, features=None, keep: int = 5, activate: bool = True) -> str:
+    # Copy the artifacts (role -> source path) into a new bundle and point CURRENT at it; returns the version
+    hashes = {role: sha256_file(path) for role, path in files.items()}
+    content = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()[:8]
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{content}" # Sorts by creation time
+    os.makedirs(bundles_dir, exist_ok=True)
+    staging = os.path.join(bundles_dir, f".{version}.{os.getpid()}.tmp")
+    os.makedirs(staging)
+    for role, path in files.items():
+        shutil.copy2(path, os.path.join(staging, BUNDLE_FILES[role]))
+    manifest = {
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mlflow_run_id": run_id,
+        "features": list(features or MODEL_FEATURES), # Model input columns, in order
+        "raw_features": list(RAW_FEATURES), # Request fields
+        "files": {BUNDLE_FILES[role]: digest for role, digest in hashes.items()},
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(staging, os.path.join(bundles_dir, version)) # The bundle appears complete or not at all
+    if activate:
+        set_current(bundles_dir, version)
+
+    current = current_version(bundles_dir)
+    for old in list_versions(bundles_dir)[:-max(1, keep)]: # Oldest first; the served bundle is never removed
+        if old != current:
+            shutil.rmtree(os.path.join(bundles_dir, old), ignore_errors=True)
+    logger.info(f"Published model bundle {version} (run {run_id}) in {bundles_dir}")
+    return version
+
+
+class ModelBundle: # Predictor and manifest of one loaded bundle
+
+    def __init__(self, version: str, predictor: BatchPredictor, manifest: dict = None, files: dict = None, model_threads: int = None):
+        self.version = version
+        self.predictor = predictor
+        self.manifest = manifest or {"version": version}
+        self.files = files or {} # Role -> path of the bundle's files, for what is loaded on first use
+        self.model_threads = model_threads
+        self.batcher = None # Optional MicroBatcher bound to this bundle's predictor, set by the server
+        self.drift = None # Optional DriftMonitor against this bundle's training reference, set by the server
+        self.loaded_at = time.time()
+        self._explainer = None
+        self._importance = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, bundles_dir: str, version: str, engine: str = "sklearn", chunk_size: int = DEFAULT_CHUNK_SIZE,
+             model_threads: int = None):
+        path = os.path.join(bundles_dir, version)
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        for name, digest in manifest["files"].items(): # A half-copied or edited bundle is refused
+            if sha256_file(os.path.join(path, name)) != digest:
+                raise ValueError(f"{name} of bundle {version} does not match its manifest")
+        if manifest["features"] != MODEL_FEATURES:
+            raise ValueError(f"Bundle {version} expects features {manifest['features']}, this server builds {MODEL_FEATURES}")
+        transform = joblib.load(os.path.join(path, BUNDLE_FILES["transform"]))
+        files = {role: os.path.join(path, name) for role, name in BUNDLE_FILES.items() if name in manifest["files"]}
+        return cls(version, build_predictor(engine, transform, files["model"], files["engine"], chunk_size, model_threads),
+                   manifest, files, model_threads)
+
+    def warm_up(self): # First calls allocate and load lazily; pay for that before the bundle takes traffic
+        labels, proba = self.predictor.predict(np.zeros((WARM_UP_ROWS, len(RAW_FEATURES))))
+        if len(proba) != WARM_UP_ROWS or not np.all(np.isfinite(proba)):
+            raise ValueError(f"Bundle {self.version} returned invalid warm-up predictions")
+        return self
+
+    def explainer(self) -> Explainer: # Built on the first explanation request, so startup does not pay for it
+        if self._explainer is None:
+            with self._lock:
+                if self._explainer is None:
+                    model = getattr(self.predictor, "model", None) # The NumPy engine keeps no LightGBM model; load the bundle's
+                    if model is None:
+                        model = joblib.load(self.files["model"])
+                    self._explainer = Explainer(model, self.predictor.transform, self.predictor.chunk_size, self.model_threads)
+        return self._explainer
+
+    def global_importance(self): # Summary computed at training time, None when the run did not save one
+        path = self.files.get("importance")
+        if self._importance is None and path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._importance = json.load(f)
+        return self._importance
+
+
+def build_predictor(engine: str, transform: FeatureTransform, model_path: str, engine_path: str,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, model_threads: int = None) -> BatchPredictor:
+    if engine == "numpy":
+        return EnginePredictor(TreeEngine.load(engine_path), transform, chunk_size=chunk_size)
+    model = joblib.load(model_path)
+    if model_threads:
+        model.set_params(n_jobs=model_threads)
+    return BatchPredictor(model, transform, chunk_size=chunk_size)
+
+
+class BundleManager: # Serves one bundle at a time and swaps in the one CURRENT points to
+
+    def __init__(self, bundles_dir: str, loader, poll_seconds: float = 5.0, keep_loaded: int = 1, on_swap=None):
+        self.bundles_dir = bundles_dir
+        self.loader = loader # version -> ModelBundle
+        self.poll_seconds = poll_seconds # 0 disables the watcher; reloads then only come from the admin endpoint
+        self.on_swap = on_swap # Called with (new, old) after a swap, e.g. to stop the old bundle's batcher
+        self._active = None
+        self._previous = deque(maxlen=max(0, keep_loaded)) # Recently replaced bundles, kept in memory for instant rollback
+        self._lock = threading.Lock() # One load or swap at a time
+        self._watcher = None
+        self._failed = None # Version the watcher could not load; retried only once CURRENT changes
+
+    @property
+    def active(self) -> ModelBundle: # Read once per request; the request keeps using that bundle even if a swap happens
+        return self._active
+
+    def start(self, bundle: ModelBundle = None): # Load (or adopt) the first bundle in the current process
+        self._active = bundle if bundle is not None else self.loader(current_version(self.bundles_dir)).warm_up()
+        return self._active
+
+    def ensure_watcher(self): # Started lazily so every forked server worker gets its own thread
+        if self.poll_seconds <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name="bundle-watcher", daemon=True)
+                self._watcher.start()
+
+    def reload(self, version: str = None) -> ModelBundle: # Load, warm and swap in the given or CURRENT version
+        with self._lock:
+            version = version or current_version(self.bundles_dir)
+            if version is None or (self._active is not None and version == self._active.version):
+                return self._active
+            bundle = next((b for b in self._previous if b.version == version), None) # Rollback without a load
+            if bundle is None:
+                start = time.perf_counter()
+                bundle = self.loader(version).warm_up()
+                logger.info(f"Loaded bundle {version} in {time.perf_counter() - start:.2f}s")
+            else:
+                self._previous.remove(bundle)
+            old, self._active = self._active, bundle # The swap: one reference assignment
+            if old is not None and self._previous.maxlen:
+                self._previous.appendleft(old)
+            logger.info(f"Serving bundle {version}, replaced {old.version if old else None}")
+        if self.on_swap is not None:
+            self.on_swap(bundle, old)
+        return bundle
+
+    def activate(self, version: str) -> ModelBundle: # Point CURRENT at a version, so the other processes follow
+        bundle = self.reload(version) # Loaded and warmed before the pointer moves
+        set_current(self.bundles_dir, version)
+        return bundle
+
+    def rollback(self) -> ModelBundle: # Back to the bundle served before the active one
+        if self._previous:
+            version = self._previous[0].version
+        else:
+            older = [v for v in list_versions(self.bundles_dir) if self._active is None or v < self._active.version]
+            if not older:
+                raise LookupError("No earlier bundle to roll back to")
+            version = older[-1]
+        return self.activate(version)
+
+    def status(self) -> dict:
+        active = self._active
+        return {
+            "version": active.version if active else None,
+            "mlflow_run_id": active.manifest.get("mlflow_run_id") if active else None,
+            "loaded_at": active.loaded_at if active else None,
+            "current_pointer": current_version(self.bundles_dir),
+            "in_memory": [b.version for b in self._previous],
+            "on_disk": list_versions(self.bundles_dir),
+        }
+
+    def _watch(self):
+        while True: # Checks first: a worker forked from an old master catches up right away
+            version = current_version(self.bundles_dir)
+            if version != self._failed:
+                try:
+                    self.reload(version)
+                except Exception as e: # A broken bundle is logged and skipped; the active one keeps serving
+                    logger.error(f"Could not load bundle {version}: {e}")
+                    self._failed = version
+            time.sleep(self.poll_seconds)
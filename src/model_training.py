@@ -1,8 +1,11 @@
 # This code is part of a machine learning project for diabetes classification.
-# It includes a class for training a LightGBM model with hyperparameter tuning using RandomizedSearchCV.
+# It includes a class for training a LightGBM model with hyperparameter tuning using RandomizedSearchCV
+# or successive halving with early stopping (SEARCH_STRATEGY in config/model_params.py), either on DataFrames
+# or out of core on a LightGBM Dataset binned chunk by chunk (OUT_OF_CORE_PARAMS).
 # The module is designed to work with a specific dataset related to diabetes.
+import json
 import os
-import re 
+import time
 import numpy as np 
 import pandas as pd
 import joblib
@@ -17,6 +20,18 @@ from src.custom_exception import CustomException
 from config.paths_config import *
 from config.model_params import *
 from utils.common_functions import load_data, read_yaml
+from src.inference_engine import TreeEngine, export_engine, parity_error
+from src.halving_search import SuccessiveHalvingSearch
+from src.cpu_budget import plan_parallelism
+from src.trial_search import StoredTrialSearch
+from src.warm_start import last_run_params, rescale_booster
+from src.chunked_dataset import as_classifier, build_dataset, sample_frame, sanitize_column
+from src.model_bundle import publish_bundle
+from src.explanations import Explainer, global_importance
+from src.drift_monitor import add_probability_reference, load_reference
+from src.metrics import PIPELINE_STEP_SECONDS, step_durations
+from src.latency_selection import (hardware_profile, measure_latency, prune_trailing_iterations,
+                                   select_within_budget, serving_predict)
 
 # Initialize logger
 logger = get_logger(__name__)
@@ -34,35 +49,22 @@ class ModelTraining: # Class for model training
         self.target_column = self.config['data_preprocessing']['target_column'] # Target column for prediction
         self.param_dist = LIGHTGM_PARAMS # Hyperparameter distribution for RandomizedSearchCV
         self.random_search_params = RANDOM_SEARCH_PARAMS # Parameters for RandomizedSearchCV
+        self.search_strategy = SEARCH_STRATEGY # "random", "halving" or "trials"
+        self.halving_search_params = HALVING_SEARCH_PARAMS # Parameters for successive halving
+        self.training_mode = TRAINING_MODE # "full" or "incremental"
+        self.incremental_params = INCREMENTAL_PARAMS # Extra rounds and minimum metrics for warm starts
+        self.cpu_budget = CPU_BUDGET # Cores shared by search workers and LightGBM threads
+        self.parallel_strategy = PARALLEL_STRATEGY # "wide", "deep" or "auto"
+        self.out_of_core_params = OUT_OF_CORE_PARAMS # Chunked Dataset construction instead of loading the training file
+        self.latency_params = LATENCY_SELECTION # Latency budget and timing settings for model selection
+        self.explanation_params = EXPLANATION_PARAMS # Rows used for the global importance summary
         logger.info("ModelTraining class initialized successfully.")
 
     def load_processed_data(self) -> tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]:
 
         try:
-            logger.info(f"Loading processed training data from: {self.train_path}") 
-            train_df = load_data(self.train_path) # Load processed training data
-            logger.info(f"Loading processed test data from: {self.test_path}")
-            test_df = load_data(self.test_path) # Load processed test data
-
-            for df in [train_df, test_df]:
-                if 'Unnamed: 0' in df.columns: 
-                    df.drop(columns=['Unnamed: 0'], inplace=True)
-                    logger.info("Dropped 'Unnamed: 0' column.")
-
-            logger.info("Sanitizing column names for LightGBM compatibility.")
-            sanitized_columns = {col: re.sub(r'[^A-Za-z0-9_]+', '', col) for col in train_df.columns}
-            train_df = train_df.rename(columns=sanitized_columns)
-            test_df = test_df.rename(columns=sanitized_columns)
-            
-            sanitized_target_column = re.sub(r'[^A-Za-z0-9_]+', '', self.target_column)
-            logger.info("Column names sanitized.")
-
-            logger.info("Separating features (X) and target (y).")
-            X_train = train_df.drop(columns=[sanitized_target_column]) # Features for training data
-            y_train = train_df[sanitized_target_column] # Target for training data
-            X_test = test_df.drop(columns=[sanitized_target_column]) # Features for test data
-            y_test = test_df[sanitized_target_column] # Target for test data
-
+            X_train, y_train = self.load_split(self.train_path, "training") # Features and target for training data
+            X_test, y_test = self.load_split(self.test_path, "test") # Features and target for test data
             logger.info("Processed data loaded and split successfully.")
             return X_train, y_train, X_test, y_test # Return features and target for both train and test sets
 
@@ -70,51 +72,279 @@ class ModelTraining: # Class for model training
             logger.error(f"An unexpected error occurred while loading processed data: {e}")
             raise CustomException("Failed to load processed data", e)
 
-    def train_model(self, X_train: pd.DataFrame, y_train: pd.Series) -> lgb.LGBMClassifier:
+    def load_split(self, path: str, name: str) -> tuple[pd.DataFrame, pd.Series]: # (X, y) of one processed file
+        logger.info(f"Loading processed {name} data from: {path}")
+        df = load_data(path)
+        if 'Unnamed: 0' in df.columns:
+            df.drop(columns=['Unnamed: 0'], inplace=True)
+            logger.info("Dropped 'Unnamed: 0' column.")
+
+        df = df.rename(columns=sanitize_column) # LightGBM compatible column names
+        sanitized_target_column = sanitize_column(self.target_column)
+        return df.drop(columns=[sanitized_target_column]), df[sanitized_target_column]
+
+    def load_training_dataset(self) -> tuple[lgb.Dataset, pd.DataFrame, pd.Series]:
+        # Out of core: the binned training Dataset, plus the first rows of the file as a sample for the sklearn model
+
+        try:
+            params = self.out_of_core_params
+            logger.info(f"Building the binned training Dataset from {self.train_path} in chunks of {params['chunk_size']:,} rows")
+            dataset = build_dataset(self.train_path, self.target_column, params["chunk_size"], params["dataset_params"], LGB_DATASET_DIR)
+            X_sample, y_sample = sample_frame(self.train_path, self.target_column, params["sample_rows"])
+            logger.info(f"Training Dataset ready: {dataset.num_data():,} rows, {dataset.num_feature()} features")
+            return dataset, X_sample, y_sample
+
+        except Exception as e:
+            logger.error(f"Error while building the training Dataset: {e}")
+            raise CustomException("Failed to build the training Dataset", e)
+
+    def train_model(self, X_train: pd.DataFrame, y_train: pd.Series, dataset: lgb.Dataset = None) -> lgb.LGBMClassifier:
+        # With a dataset, the search runs on it and X_train / y_train are only the sample from load_training_dataset
 
         try:
-            logger.info("Starting model training with LightGBM and RandomizedSearchCV.")
+            logger.info(f"Starting model training with LightGBM and the {self.search_strategy!r} search strategy.")
 
             # Initialize LightGBM model with default parameters
-            neg_count = y_train.value_counts()[0] # Count of negative class
-            pos_count = y_train.value_counts()[1] # Count of positive class
+            labels = y_train if dataset is None else pd.Series(dataset.get_label(), dtype=int)
+            neg_count = labels.value_counts()[0] # Count of negative class
+            pos_count = labels.value_counts()[1] # Count of positive class
             scale_pos_weight = neg_count / pos_count # Calculate scale_pos_weight for handling class imbalance
             logger.info(f"Calculated scale_pos_weight for class imbalance: {scale_pos_weight:.2f}")
 
-            # Pass the parameter to the model
-            lgbm_model = lgb.LGBMClassifier( # Initialize LightGBM model
-                random_state=self.random_search_params.get("random_state", 42), 
-                scale_pos_weight=scale_pos_weight # Handle class imbalance
+            # Split the CPU budget between concurrent workers and LightGBM threads, instead of letting every
+            # CV worker start one OpenMP thread per core
+            plan = self.parallel_plan(len(labels))
+            logger.info(f"Parallel plan ({self.parallel_strategy}): {plan.workers} worker(s) x {plan.threads} LightGBM thread(s)")
+            mlflow.log_params({"parallel_strategy": self.parallel_strategy, "search_workers": plan.workers, "lgbm_threads": plan.threads})
+
+            search = self.build_search(scale_pos_weight, plan)
+            logger.info(f"Fitting {type(search).__name__} to the training data...")
+            start = time.perf_counter()
+            if dataset is None:
+                search.fit(X_train, y_train) # Fit the model using the configured search
+            else:
+                search.fit_dataset(dataset, X_train, y_train) # Folds are subsets of the binned Dataset
+            mlflow.log_metric("search_seconds", time.perf_counter() - start)
+            mlflow.log_metric("cv_best_score", search.best_score_)
+            if self.search_strategy == "halving":
+                mlflow.log_metric("search_time_to_best_seconds", search.time_to_best_)
+            if self.search_strategy == "trials":
+                mlflow.log_param("trial_study_id", search.study_id_) # Look the trials up in TRIAL_STORE_PATH
+                mlflow.log_metric("trial_folds_resumed", search.resumed_folds_)
+
+            best_params, best_model = search.best_params_, search.best_estimator_
+            if self.latency_params["enabled"]: # Serving cost decides between the accurate candidates
+                best_params, best_model = self.select_for_latency(search, X_train, y_train, dataset, scale_pos_weight, plan)
+            return self.log_search_result(best_params, best_model, scale_pos_weight)
+
+        except Exception as e:
+            logger.error(f"Error during model training: {e}")
+            raise CustomException("Model training failed", e)
+
+    def parallel_plan(self, n_rows: int): # Workers x threads for this search, within CPU_BUDGET
+        if self.search_strategy == "halving":
+            max_workers = self.halving_search_params.get("n_candidates", 27) # Candidates of the first rung
+        elif self.search_strategy == "trials":
+            max_workers = self.random_search_params["n_iter"] # Workers claim whole trials
+        else:
+            max_workers = self.random_search_params["n_iter"] * self.random_search_params["cv"] # Independent CV fits
+        return plan_parallelism(self.cpu_budget, self.parallel_strategy, n_rows=n_rows, max_workers=max_workers)
+
+    def build_search(self, scale_pos_weight: float, plan):
+        if self.search_strategy == "halving":
+            return SuccessiveHalvingSearch( # Adaptive boosting rounds with early stopping on every fold
+                param_distributions=self.param_dist,
+                base_params={"random_state": self.halving_search_params.get("random_state", 42), "scale_pos_weight": scale_pos_weight},
+                n_jobs=plan.workers, num_threads=plan.threads,
+                **self.halving_search_params
             )
 
-            random_search = RandomizedSearchCV( # Initialize RandomizedSearchCV
-                estimator=lgbm_model,
+        if self.search_strategy == "trials":
+            return StoredTrialSearch( # Checkpointed trials that survive restarts and can be shared with other hosts
                 param_distributions=self.param_dist,
+                store_path=TRIAL_STORE_PATH,
+                base_params={"random_state": self.random_search_params.get("random_state", 42), "scale_pos_weight": scale_pos_weight},
                 n_iter=self.random_search_params["n_iter"],
                 cv=self.random_search_params["cv"],
-                n_jobs=self.random_search_params.get("n_jobs", -1),
-                verbose=self.random_search_params.get("verbose", 1),
+                scoring=self.random_search_params["scoring"],
                 random_state=self.random_search_params.get("random_state", 42),
-                scoring=self.random_search_params["scoring"]
+                n_jobs=plan.workers, num_threads=plan.threads,
+                stale_after=TRIAL_STORE_PARAMS["stale_after_seconds"],
+                poll_seconds=TRIAL_STORE_PARAMS["poll_seconds"]
             )
 
-            logger.info("Fitting RandomizedSearchCV to the training data...")
-            random_search.fit(X_train, y_train) # Fit the model using RandomizedSearchCV
-            
-            best_params = random_search.best_params_ # Get the best hyperparameters from the search
-            best_lgbm_model = random_search.best_estimator_ # Get the best model from the search
+        # Pass the parameter to the model
+        lgbm_model = lgb.LGBMClassifier( # Initialize LightGBM model
+            random_state=self.random_search_params.get("random_state", 42), 
+            scale_pos_weight=scale_pos_weight, # Handle class imbalance
+            n_jobs=plan.threads # Threads per model, from the CPU budget
+        )
+
+        return RandomizedSearchCV( # Initialize RandomizedSearchCV
+            estimator=lgbm_model,
+            param_distributions=self.param_dist,
+            n_iter=self.random_search_params["n_iter"],
+            cv=self.random_search_params["cv"],
+            n_jobs=plan.workers, # Concurrent fits, from the CPU budget
+            verbose=self.random_search_params.get("verbose", 1),
+            random_state=self.random_search_params.get("random_state", 42),
+            scoring=self.random_search_params["scoring"]
+        )
+
+    def search_candidates(self, search) -> list: # (params, CV score) of every candidate of the search, best first
+        if hasattr(search, "candidates_"):
+            return list(search.candidates_)
+        results = search.cv_results_ # RandomizedSearchCV
+        order = np.argsort(results["rank_test_score"], kind="stable")
+        return [(results["params"][i], float(results["mean_test_score"][i])) for i in order]
+
+    def fit_candidate(self, params: dict, X_train, y_train, dataset, search, scale_pos_weight: float, plan) -> lgb.LGBMClassifier:
+        threads = plan.workers * plan.threads # One model at a time, so it gets the whole budget
+        if dataset is not None: # Out of core, as SuccessiveHalvingSearch.fit_dataset refits its winner
+            booster = lgb.train({**search.booster_params(params), "num_threads": threads}, dataset, num_boost_round=params["n_estimators"])
+            return as_classifier(booster, {**search.base_params, **params}, X_train, y_train)
+        model = lgb.LGBMClassifier(random_state=self.random_search_params.get("random_state", 42), scale_pos_weight=scale_pos_weight,
+                                   n_jobs=threads or None, verbosity=-1, **params)
+        return model.fit(X_train, y_train)
+
+    def select_for_latency(self, search, X_train, y_train, dataset, scale_pos_weight: float, plan) -> tuple[dict, lgb.LGBMClassifier]:
+        # Refit and time the best candidates on the serving engine, and keep the most accurate one within the budget
+
+        try:
+            params = self.latency_params
+            metric, budget = params["latency_metric"], params["budget"]
+            engine = self.config.get("serving", {}).get("engine", "sklearn")
+            scaler = joblib.load(SCALER_PATH) if engine == "numpy" else None
+            X_probe = X_train.iloc[:params["batch_size"]] # Scaled training rows; the feature transform costs the same for every candidate
+            mlflow.log_params({**hardware_profile(params["threads"]), "latency_engine": engine,
+                               "latency_metric": metric, "latency_budget": budget})
+
+            def timed(models): # Latencies on the serving path with the configured thread count
+                return measure_latency([serving_predict(model, engine, scaler, params["threads"]) for model in models], X_probe,
+                                       params["batch_size"], params["single_row_repeats"], params["batch_repeats"])
 
-            logger.info(f"Model training completed. Best hyperparameters found: {best_params}")
-            mlflow.log_params(best_params) # Log the best hyperparameters to MLflow
-            # Log our calculated scale_pos_weight as well for traceability
-            mlflow.log_param("scale_pos_weight", scale_pos_weight) # Log scale_pos_weight to MLflow
-            return best_lgbm_model # Return the best trained model
+            candidates = self.search_candidates(search)[:params["top_k"]]
+            models = [search.best_estimator_ if candidate == search.best_params_ else
+                      self.fit_candidate(candidate, X_train, y_train, dataset, search, scale_pos_weight, plan)
+                      for candidate, _ in candidates]
+            results = [{"score": score, "trees": model.booster_.num_trees(), **latency}
+                       for (_, score), model, latency in zip(candidates, models, timed(models))]
+            for step, result in enumerate(results):
+                logger.info(f"Candidate {step}: CV score {result['score']:.4f}, {result['trees']} trees, p50 {result['p50_ms']:.3f} ms, "
+                            f"p99 {result['p99_ms']:.3f} ms, batch {result['batch_us_per_row']:.2f} us/row")
+                mlflow.log_metrics({f"candidate_{name}": value for name, value in result.items()}, step=step)
+
+            selected, front = select_within_budget(results, budget, metric)
+            mlflow.log_dict({"latency_metric": metric, "budget": budget, "selected": selected, "pareto_front": front,
+                             "candidates": [{"params": {k: v.item() if hasattr(v, "item") else v for k, v in candidate.items()}, **result}
+                                            for (candidate, _), result in zip(candidates, results)]},
+                            "latency_selection.json")
+            best_params, best_model = dict(candidates[selected][0]), models[selected]
+            logger.info(f"Selected candidate {selected} of the Pareto front {front}: {metric} {results[selected][metric]:.3f} "
+                        f"(budget {budget}), score {results[selected]['score']:.4f}")
+            mlflow.log_metrics({"latency_selected_rank": selected, "pareto_front_size": len(front),
+                                "latency_p50_ms": results[selected]["p50_ms"], "latency_p99_ms": results[selected]["p99_ms"],
+                                "latency_batch_us_per_row": results[selected]["batch_us_per_row"]})
+
+            if params["prune_min_gain_fraction"] > 0: # Trailing iterations that barely change the scores cost as much as the others
+                trees, unpruned = best_model.booster_.num_trees(), best_model
+                best_model = prune_trailing_iterations(unpruned, params["prune_min_gain_fraction"], X_train, y_train)
+                best_params["n_estimators"] = best_model.booster_.num_trees()
+                logger.info(f"Pruned {trees - best_params['n_estimators']} trailing iteration(s) of {trees}")
+                mlflow.log_metric("pruned_iterations", trees - best_params["n_estimators"])
+                if best_params["n_estimators"] < trees: # Pruning is checked against the budget again, timed side by side
+                    before, pruned = timed([unpruned, best_model])
+                    logger.info(f"Pruned model: {metric} {pruned[metric]:.3f}, before pruning {before[metric]:.3f} (budget {budget})")
+                    mlflow.log_metrics({"pruned_p50_ms": pruned["p50_ms"], "pruned_p99_ms": pruned["p99_ms"],
+                                        "pruned_batch_us_per_row": pruned["batch_us_per_row"]})
+                    if pruned[metric] > budget:
+                        logger.warning(f"The pruned model is still over the latency budget: {metric} {pruned[metric]:.3f} > {budget}")
+            return best_params, best_model
 
         except Exception as e:
-            logger.error(f"Error during model training: {e}")
-            raise CustomException("Model training failed", e)
+            logger.error(f"Error during latency-aware model selection: {e}")
+            raise CustomException("Latency-aware model selection failed", e)
+
+    def log_search_result(self, best_params: dict, best_lgbm_model: lgb.LGBMClassifier, scale_pos_weight: float) -> lgb.LGBMClassifier: # Shared by all search strategies
+        best_lgbm_model.set_params(n_jobs=None) # The search's thread count is not meant for serving; keep LightGBM's default
+
+        logger.info(f"Model training completed. Best hyperparameters found: {best_params}")
+        mlflow.log_param("search_strategy", self.search_strategy)
+        mlflow.log_params(best_params) # Log the best hyperparameters to MLflow
+        # Log our calculated scale_pos_weight as well for traceability
+        mlflow.log_param("scale_pos_weight", scale_pos_weight) # Log scale_pos_weight to MLflow
+        return best_lgbm_model # Return the best trained model
+
+    def warm_start_model(self, X_train: pd.DataFrame, y_train: pd.Series):
+        # Continue boosting the saved model; returns (model, params to log if it is kept), or (None, None) if not possible
 
-    def evaluate_model(self, model: lgb.LGBMClassifier, X_test: pd.DataFrame, y_test: pd.Series):
+        try:
+            if not os.path.exists(self.model_output_path) or not os.path.exists(ENGINE_OUTPUT_PATH):
+                logger.info("No previous model and engine to warm start from.")
+                return None, None
+            previous = joblib.load(self.model_output_path)
+            if list(previous.booster_.feature_name()) != list(X_train.columns):
+                logger.info("The feature set changed since the previous model; warm start is not possible.")
+                return None, None
+
+            # Hyperparameters of the last training run; the previous model's own parameters if MLflow has none
+            last_run = last_run_params([name for name in self.param_dist if name != "n_estimators"])
+            if last_run is None or not last_run[1]:
+                run_id, params = None, {name: previous.get_params()[name] for name in self.param_dist if name != "n_estimators"}
+            else:
+                run_id, params = last_run
+            logger.info(f"Warm starting from {self.model_output_path} ({previous.booster_.num_trees()} trees), params of run {run_id}: {params}")
+
+            # The previous trees split on features scaled by the scaler saved with the engine; move them to the new scaler
+            old_scaling = TreeEngine.load(ENGINE_OUTPUT_PATH)
+            scaler = joblib.load(SCALER_PATH)
+            booster = rescale_booster(previous.booster_, old_scaling.center, old_scaling.scale, scaler.center_, scaler.scale_)
+
+            scale_pos_weight = (y_train == 0).sum() / (y_train == 1).sum() # Class balance of the current data
+            model = lgb.LGBMClassifier(
+                **params,
+                n_estimators=self.incremental_params["extra_rounds"], # Trees added on top of the previous ones
+                random_state=self.random_search_params.get("random_state", 42),
+                scale_pos_weight=scale_pos_weight
+            )
+            model.fit(X_train, y_train, init_model=booster) # Boosting continues from the previous model's scores
+
+            logger.info(f"Warm start added {self.incremental_params['extra_rounds']} rounds, {model.booster_.num_trees()} trees in total.")
+            # The params are logged again so the next warm start finds them on this run; MLflow params cannot change
+            # within a run, so they are only logged once the model is kept
+            return model, {**params, "warm_start_run_id": run_id, "warm_start_trees": previous.booster_.num_trees(),
+                           "extra_rounds": self.incremental_params["extra_rounds"], "scale_pos_weight": scale_pos_weight}
+
+        except Exception as e:
+            logger.error(f"Error during warm start: {e}")
+            raise CustomException("Warm start failed", e)
+
+    def warm_start_or_search(self, X_train: pd.DataFrame, y_train: pd.Series, X_test: pd.DataFrame, y_test: pd.Series,
+                             dataset: lgb.Dataset = None) -> lgb.LGBMClassifier:
+        # Incremental mode keeps the warm-started model unless a metric is below min_metrics; otherwise a full search runs
+        if self.training_mode == "incremental": # Cheap path: a few more rounds on top of the saved model
+            with PIPELINE_STEP_SECONDS.time("train/warm_start"):
+                model, warm_start_params = self.warm_start_model(X_train, y_train)
+            if model is not None:
+                metrics = self.evaluate_model(model, X_test, y_test, prefix="warm_start_")
+                below = {name: value for name, value in metrics.items()
+                         if value < self.incremental_params["min_metrics"].get(name, float("-inf"))}
+                if not below:
+                    mlflow.set_tag("TrainingMode", "incremental")
+                    mlflow.log_params(warm_start_params)
+                    mlflow.log_metrics(metrics)
+                    return model
+                logger.warning(f"Warm-started model is below the configured minimum {below}; running a full search.")
+                mlflow.set_tag("WarmStartRejected", str(below))
+
+        mlflow.set_tag("TrainingMode", "full")
+        with PIPELINE_STEP_SECONDS.time("train/fit"): # Search, final fit and latency-aware selection
+            model = self.train_model(X_train, y_train, dataset) # Train the model
+        with PIPELINE_STEP_SECONDS.time("train/evaluate"):
+            self.evaluate_model(model, X_test, y_test) # Evaluate the trained model
+        return model
+
+    def evaluate_model(self, model: lgb.LGBMClassifier, X_test: pd.DataFrame, y_test: pd.Series, prefix: str = "") -> dict:
 
         try:
             logger.info("Evaluating the trained model on the test data.")
@@ -126,11 +356,92 @@ class ModelTraining: # Class for model training
                 "f1_score": f1_score(y_test, y_pred)
             }
             logger.info(f"Evaluation Metrics: {metrics}")
-            mlflow.log_metrics(metrics)
+            mlflow.log_metrics({prefix + name: value for name, value in metrics.items()})
+            return metrics
         except Exception as e:
             logger.error(f"Error while evaluating model: {e}")
             raise CustomException("Failed to evaluate model", e)
 
+    def export_inference_engine(self, model: lgb.LGBMClassifier, X_test: pd.DataFrame):
+
+        try:
+            logger.info("Exporting the NumPy inference engine.")
+            engine = export_engine(model, joblib.load(SCALER_PATH), ENGINE_OUTPUT_PATH)
+            max_diff = parity_error(engine, model, X_test) # The engine must reproduce predict_proba on the test set
+            logger.info(f"NumPy engine parity on test data: max abs probability difference {max_diff:.3e}")
+            mlflow.log_metric("engine_max_abs_diff", max_diff)
+            if max_diff > 1e-9:
+                raise ValueError(f"NumPy engine differs from predict_proba by {max_diff:.3e}")
+        except Exception as e:
+            logger.error(f"Error while exporting the inference engine: {e}")
+            raise CustomException("Failed to export inference engine", e)
+
+    def save_global_importance(self, model: lgb.LGBMClassifier, X_train: pd.DataFrame) -> dict:
+        # Mean absolute pred_contrib contribution per raw and engineered feature; out of core, X_train is the sample
+
+        try:
+            rows = self.explanation_params["importance_rows"]
+            if rows and len(X_train) > rows:
+                X_train = X_train.sample(n=rows, random_state=42)
+            importance = global_importance(Explainer(model, transform=None), X_train.to_numpy(dtype=np.float64))
+            os.makedirs(os.path.dirname(GLOBAL_IMPORTANCE_PATH), exist_ok=True)
+            with open(GLOBAL_IMPORTANCE_PATH, "w") as f:
+                json.dump(importance, f, indent=2)
+            mlflow.log_dict(importance, "global_importance.json")
+            mlflow.log_metrics({f"importance/{name}": values["mean_abs"] for name, values in importance["raw"].items()})
+            logger.info(f"Global importance on {importance['rows']} rows saved to {GLOBAL_IMPORTANCE_PATH}, "
+                        f"most important inputs {list(importance['raw'])[:3]}")
+            return importance
+        except Exception as e:
+            logger.error(f"Error while computing the global importance: {e}")
+            raise CustomException("Failed to compute global importance", e)
+
+    def save_drift_reference(self, model: lgb.LGBMClassifier, X_test: pd.DataFrame):
+        # Preprocessing's feature bins plus the predicted probabilities of the held-out test set, which the model
+        # did not fit and so are spread like live predictions; served with the bundle and compared with live traffic
+
+        try:
+            reference = load_reference(DRIFT_FEATURES_PATH)
+            if reference is None: # Processed by an older run
+                logger.warning(f"No drift reference in {DRIFT_FEATURES_PATH}; the bundle is served without drift monitoring")
+                if os.path.exists(DRIFT_REFERENCE_PATH): # Left by an earlier run, it does not describe this model
+                    os.remove(DRIFT_REFERENCE_PATH)
+                return None
+            positive = int(np.flatnonzero(model.classes_ == 1)[0])
+            add_probability_reference(reference, model.predict_proba(X_test)[:, positive], reference["bins"])
+            os.makedirs(os.path.dirname(DRIFT_REFERENCE_PATH), exist_ok=True)
+            with open(DRIFT_REFERENCE_PATH, "w") as f:
+                json.dump(reference, f, indent=2)
+            mlflow.log_dict(reference, "drift_reference.json")
+            logger.info(f"Drift reference of {len(reference['features'])} distributions saved to {DRIFT_REFERENCE_PATH}")
+            return reference
+        except Exception as e:
+            logger.error(f"Error while saving the drift reference: {e}")
+            raise CustomException("Failed to save drift reference", e)
+
+    def publish_model_bundle(self, model: lgb.LGBMClassifier) -> str:
+        # Model, engine, transform and scaler of this run as one versioned bundle; the server swaps it in on its own
+
+        try:
+            files = {"model": self.model_output_path, "engine": ENGINE_OUTPUT_PATH, "transform": FEATURE_TRANSFORM_PATH, "scaler": SCALER_PATH,
+                     "importance": GLOBAL_IMPORTANCE_PATH}
+            if os.path.exists(DRIFT_REFERENCE_PATH):
+                files["drift"] = DRIFT_REFERENCE_PATH
+            version = publish_bundle(
+                BUNDLES_DIR,
+                files,
+                run_id=mlflow.active_run().info.run_id,
+                features=list(model.feature_name_),
+                keep=self.config.get("serving", {}).get("bundles", {}).get("keep", 5)
+            )
+            mlflow.set_tag("ModelBundle", version) # Matches the X-Model-Version header of the predictions
+            if os.path.exists(DRIFT_TRIGGER_PATH): # The retrain a drift check asked for has happened
+                os.remove(DRIFT_TRIGGER_PATH)
+            return version
+        except Exception as e:
+            logger.error(f"Error while publishing the model bundle: {e}")
+            raise CustomException("Failed to publish model bundle", e)
+
     def run(self):
 
         logger.info("Starting the model training pipeline run.")
@@ -139,25 +450,47 @@ class ModelTraining: # Class for model training
                 mlflow.set_tag("PipelineStep", "ModelTraining") # Set a tag for the MLflow run
                 logger.info(f"MLflow run started. Run ID: {mlflow.active_run().info.run_id}")
 
-                X_train, y_train, X_test, y_test = self.load_processed_data() # Load processed data
+                dataset = None
+                with PIPELINE_STEP_SECONDS.time("train/load_data"):
+                    if self.out_of_core_params["enabled"]: # The training file is only streamed into LightGBM's bins
+                        if self.search_strategy != "halving" or self.training_mode != "full":
+                            logger.warning("Out-of-core training runs a full successive-halving search.")
+                            self.search_strategy, self.training_mode = "halving", "full"
+                        dataset, X_train, y_train = self.load_training_dataset()
+                        X_test, y_test = self.load_split(self.test_path, "test")
+                    else:
+                        X_train, y_train, X_test, y_test = self.load_processed_data() # Load processed data
                 mlflow.log_param("training_data_path", self.train_path) # Log training data path
                 mlflow.log_param("test_data_path", self.test_path) # Log test data path
+                mlflow.log_param("out_of_core", dataset is not None)
 
-                best_lgbm_model = self.train_model(X_train, y_train) # Train the model
-                self.evaluate_model(best_lgbm_model, X_test, y_test) # Evaluate the trained model
+                best_lgbm_model = self.warm_start_or_search(X_train, y_train, X_test, y_test, dataset)
 
                 logger.info("Logging model to MLflow Model Registry.")
-                mlflow.sklearn.log_model( # Log the trained model to MLflow
-                    sk_model=best_lgbm_model, # Use the best model from RandomizedSearchCV
-                    artifact_path="model", # Path in MLflow where the model will be stored
-                    registered_model_name="LightGBM_Diabetes_Classifier" # Name of the registered model in MLflow
-                )
+                with PIPELINE_STEP_SECONDS.time("train/log_model"):
+                    mlflow.sklearn.log_model( # Log the trained model to MLflow
+                        sk_model=best_lgbm_model, # Use the best model from RandomizedSearchCV
+                        artifact_path="model", # Path in MLflow where the model will be stored
+                        registered_model_name="LightGBM_Diabetes_Classifier", # Name of the registered model in MLflow
+                        serialization_format="cloudpickle" # Newer MLflow defaults to skops, which rejects LightGBM types
+                    )
                 logger.info("Model successfully logged to MLflow.")
                 
                 os.makedirs(os.path.dirname(self.model_output_path), exist_ok=True)
                 joblib.dump(best_lgbm_model, self.model_output_path)
                 logger.info(f"Model artifact also saved locally to {self.model_output_path}")
 
+                with PIPELINE_STEP_SECONDS.time("train/export_engine"):
+                    self.export_inference_engine(best_lgbm_model, X_test) # Array-backed copy of the model for low latency serving
+                with PIPELINE_STEP_SECONDS.time("train/global_importance"):
+                    self.save_global_importance(best_lgbm_model, X_train) # Served by /explain/global
+                with PIPELINE_STEP_SECONDS.time("train/drift_reference"):
+                    self.save_drift_reference(best_lgbm_model, X_test) # Compared with live traffic by the server
+                with PIPELINE_STEP_SECONDS.time("train/publish_bundle"):
+                    self.publish_model_bundle(best_lgbm_model) # Served without a restart once CURRENT points at it
+
+                mlflow.log_metrics(step_durations()) # seconds/<stage>/<step>, including the stages run before in this process
+
                 logger.info("Model training pipeline run completed successfully.")
         except Exception as e:
             logger.error(f"An unexpected error occurred during the pipeline run: {e}")
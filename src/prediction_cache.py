@@ -0,0 +1,109 @@
+# This code is part of the serving side of the diabetes prediction project.
+# It provides a bounded, thread-safe LRU cache with a time-to-live for predictions. Keys are the
+# raw input features rounded to a configurable number of decimals (rows with NaN are not cached), and
+# the whole cache is dropped when the model or scaler files on disk change.
+import os
+import threading
+import time
+from collections import OrderedDict
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def artifact_fingerprint(paths) -> tuple: # Changes whenever one of the files is replaced or rewritten
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+
+class PredictionCache: # LRU + TTL cache keyed on the canonicalized raw feature vector
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 600, decimals: int = 4,
+                 artifact_paths=(), check_interval: float = 1.0):
+        self.max_size = max(1, int(max_size)) # Entries kept at most; the least recently used one is evicted first
+        self.ttl = float(ttl_seconds) # Seconds an entry stays valid
+        self.decimals = int(decimals) # Inputs are rounded to this many decimals before building the key
+        self.artifact_paths = tuple(artifact_paths) # Files whose change invalidates every entry
+        self.check_interval = float(check_interval) # Seconds between two stat() calls on the artifacts
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._fingerprint = artifact_fingerprint(self.artifact_paths)
+        self._next_check = time.monotonic() + self.check_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0 # Entries dropped because the cache was full
+        self.expirations = 0 # Entries dropped because their TTL passed
+        self.invalidations = 0 # Full clears caused by an artifact change
+        self.skipped = 0 # Rows with NaN, never looked up nor stored
+
+    def make_key(self, row): # None for a row with NaN: NaN != NaN, so its entry would never match and only take a slot
+        key = tuple(round(float(value), self.decimals) + 0.0 for value in row) # + 0.0 folds -0.0 into 0.0
+        if any(value != value for value in key):
+            with self._lock:
+                self.skipped += 1
+            return None
+        return key
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._check_artifacts(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "decimals": self.decimals,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "skipped": self.skipped,
+            }
+
+    def _check_artifacts(self, now: float): # Called with the lock held; stat() runs at most once per check_interval
+        if not self.artifact_paths or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        fingerprint = artifact_fingerprint(self.artifact_paths)
+        if fingerprint != self._fingerprint:
+            logger.info(f"Model artifacts changed, dropping {len(self._entries)} cached predictions")
+            self._fingerprint = fingerprint
+            self._entries.clear()
+            self.invalidations += 1
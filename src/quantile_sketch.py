@@ -0,0 +1,91 @@
+# This code is part of a data preprocessing module for a machine learning project.
+# It implements a KLL-style quantile sketch: a stack of sorted buffers ("compactors") where an item
+# on level h stands for 2**h original values. When a level is full, it is sorted and every other item
+# is promoted to the next level. The sketch uses O(k log(n/k)) memory, accepts weighted values and
+# can be merged, so chunks can be summarized by parallel workers and combined afterwards.
+import math
+import numpy as np
+
+RANK_ERROR_CONSTANT = 1.7 # Normalized rank error is roughly RANK_ERROR_CONSTANT / k (empirical, as in Apache DataSketches)
+
+
+def k_for_rank_error(rank_error: float) -> int: # Smallest k whose expected rank error is below rank_error
+    return max(8, int(math.ceil(RANK_ERROR_CONSTANT / rank_error)))
+
+
+class KLLSketch: # Mergeable quantile sketch over float values
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = int(k) # Capacity of the top level; larger k means smaller rank error
+        self.levels = [np.empty(0, dtype=np.float64)] # levels[h] holds items of weight 2**h
+        self.count = 0 # Total weight seen
+        self._rng = np.random.default_rng(seed) # Coin used to choose which half of a level is promoted
+
+    @property
+    def rank_error(self) -> float: # Expected normalized rank error of quantile()
+        return RANK_ERROR_CONSTANT / self.k
+
+    def update(self, values: np.ndarray, weight: int = 1): # Add many values at once; weight applies to each of them
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        weight = int(weight)
+        if values.size == 0 or weight <= 0:
+            return
+        self.count += int(values.size) * weight
+        level = 0
+        while weight: # A weight of w is stored as one item on every level whose bit is set in w
+            if weight & 1:
+                self._grow(level)
+                self.levels[level] = np.concatenate([self.levels[level], values])
+            weight >>= 1
+            level += 1
+        self._compress()
+
+    def merge(self, other: "KLLSketch"): # Fold another sketch into this one
+        self._grow(len(other.levels) - 1)
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q) -> np.ndarray: # Value at quantile q (scalar or array, in [0, 1])
+        values, weights = self._weighted_items()
+        if values.size == 0:
+            return np.full(np.shape(q), np.nan)
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        ranks = np.asarray(q, dtype=np.float64) * (cumulative[-1] - 1) # 0-based rank, same convention as np.percentile
+        return values[np.minimum(np.searchsorted(cumulative, ranks, side="right"), values.size - 1)]
+
+    def rank(self, value: float) -> float: # Fraction of the weight strictly below value
+        values, weights = self._weighted_items()
+        return float(weights[values < value].sum() / max(self.count, 1))
+
+    def capacity(self, level: int) -> int: # Lower levels get geometrically smaller buffers
+        depth = len(self.levels) - 1 - level
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _weighted_items(self):
+        weights = [np.full(items.size, 1 << h, dtype=np.float64) for h, items in enumerate(self.levels)]
+        return np.concatenate(self.levels), np.concatenate(weights)
+
+    def _grow(self, level: int):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0, dtype=np.float64))
+
+    def _compress(self):
+        while sum(items.size for items in self.levels) > sum(self.capacity(h) for h in range(len(self.levels))):
+            for level, items in enumerate(self.levels):
+                if items.size >= self.capacity(level):
+                    self._compact(level)
+                    break
+
+    def _compact(self, level: int): # Sort the level and promote every other item, keeping one back if the size is odd
+        items = np.sort(self.levels[level])
+        keep = items[:1] if items.size % 2 else items[:0]
+        items = items[keep.size:]
+        self._grow(level + 1)
+        offset = int(self._rng.integers(0, 2))
+        self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+        self.levels[level] = keep
@@ -0,0 +1,131 @@
+# This code is part of the serving side of the diabetes prediction project.
+# It coalesces concurrent single-row requests into micro-batches: requests wait in a queue for at
+# most a few milliseconds (or until the batch is full), are scored with one model call, and the
+# results are handed back to the waiting request threads. A closed batcher scores rows on the calling thread,
+# so a request that picked up a replaced bundle never waits on a stopped worker. Every worker reads its own
+# queue, so a reopened batcher never queues rows behind the stop sentinel of a worker that is still finishing.
+import threading
+import queue
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class MicroBatcher: # Queues single rows and scores them in batches on a background thread
+
+    def __init__(self, predictor, max_batch_size: int = 64, max_wait_ms: float = 2.0, latency_window: int = 4096):
+        self.predictor = predictor # Any object with predict(X_raw) -> (labels, proba), e.g. BatchPredictor
+        self.max_batch_size = max(1, int(max_batch_size)) # Rows per model call at most
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0 # Longest time the first request of a batch may wait
+        self._queue = queue.SimpleQueue() # Queue of the current worker; replaced by reopen()
+        self._lock = threading.Lock() # Guards the worker start and the metrics
+        self._state = threading.Lock() # Orders enqueues against close(), so the stop sentinel is always the last item
+        self._closed = False
+        self._worker = None
+        self._batches = 0 # Model calls made
+        self._rows = 0 # Rows scored
+        self._queue_waits = deque(maxlen=latency_window) # Recent time spent in the queue, in seconds
+
+    def submit(self, row) -> Future: # Enqueue one raw feature row, returns a Future of (label, probability)
+        future = Future()
+        row = np.asarray(row, dtype=np.float64)
+        with self._state:
+            if not self._closed:
+                self._ensure_worker()
+                self._queue.put((row, time.perf_counter(), future))
+                return future
+        try: # Closed: score alone, right away
+            labels, proba = self.predictor.predict(row[np.newaxis])
+            future.set_result((int(labels[0]), float(proba[0])))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def predict(self, row, timeout: float = 5.0): # Blocking helper for request handlers
+        return self.submit(row).result(timeout=timeout)
+
+    def stats(self) -> dict: # Batch fill rate and queueing latency over the recent window
+        with self._lock:
+            waits = np.asarray(self._queue_waits) * 1000.0
+            batches, rows = self._batches, self._rows
+        return {
+            "batches": batches,
+            "rows": rows,
+            "mean_batch_size": rows / batches if batches else 0.0,
+            "fill_rate": rows / (batches * self.max_batch_size) if batches else 0.0,
+            "queue_wait_ms_mean": float(waits.mean()) if waits.size else 0.0,
+            "queue_wait_ms_p50": float(np.percentile(waits, 50)) if waits.size else 0.0,
+            "queue_wait_ms_p99": float(np.percentile(waits, 99)) if waits.size else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+    def _ensure_worker(self): # Started lazily so forked server workers each get their own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, args=(self._queue,), name="micro-batcher", daemon=True)
+                self._worker.start()
+                logger.info(f"Micro-batcher started (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:.1f})")
+
+    def close(self): # Stop the worker thread once the rows already queued are scored; later rows are scored directly
+        with self._state:
+            if self._closed:
+                return
+            self._closed = True
+            if self._worker is not None and self._worker.is_alive(): # A worker that never started has nothing to stop
+                self._queue.put(None)
+
+    def reopen(self): # Batch again, e.g. when a rollback brings the bundle back
+        with self._state:
+            if not self._closed:
+                return
+            # The old worker may still be scoring a slow batch; it drains its own queue up to the sentinel and exits,
+            # while the next submit() starts a new worker on a fresh queue
+            self._queue = queue.SimpleQueue()
+            self._worker = None
+            self._closed = False
+
+    def _collect(self, jobs) -> list: # Block for the first request, then fill the batch until it is full or the window closes
+        first = jobs.get()
+        if first is None: # close() was called
+            return []
+        batch = [first]
+        deadline = batch[0][1] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = jobs.get(timeout=remaining) if remaining > 0 else jobs.get_nowait()
+            except queue.Empty:
+                break
+            if item is None: # Score what was collected, then stop at the next _collect
+                jobs.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self, jobs):
+        while True:
+            batch = self._collect(jobs)
+            if not batch:
+                return
+            started = time.perf_counter()
+            futures = [future for _, _, future in batch]
+            try:
+                labels, proba = self.predictor.predict(np.vstack([row for row, _, _ in batch]))
+                for future, label, p in zip(futures, labels, proba):
+                    future.set_result((int(label), float(p)))
+            except Exception as e: # One bad batch must not kill the worker; every waiting request sees the error
+                logger.error(f"Micro-batch of {len(batch)} rows failed: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            with self._lock:
+                self._batches += 1
+                self._rows += len(batch)
+                self._queue_waits.extend(started - enqueued for _, enqueued, _ in batch)
@@ -0,0 +1,217 @@
+# This code is part of a data ingestion module for a machine learning project.
+# It defines a small storage abstraction (Google Cloud Storage or a local directory) and a
+# downloader that fetches many objects and byte ranges in parallel, resumes partial files and
+# skips objects whose checksum/generation already matches the local manifest.
+import os
+import json
+import base64
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from src.logger import get_logger
+from src.custom_exception import CustomException
+
+logger = get_logger(__name__)
+
+BlobInfo = namedtuple("BlobInfo", ["name", "size", "checksum", "generation"]) # Remote object metadata used for change detection
+
+
+class StorageBackend(ABC): # Interface shared by the GCS and local implementations
+
+    @abstractmethod
+    def list_blobs(self, prefix: str) -> list: # All objects whose name starts with prefix
+        ...
+
+    @abstractmethod
+    def stat(self, name: str) -> BlobInfo: # Metadata of a single object
+        ...
+
+    @abstractmethod
+    def read_range(self, name: str, start: int, end: int, generation=None) -> bytes: # Bytes [start, end) of an object
+        ...
+
+
+@lru_cache(maxsize=None)
+def get_gcs_client(): # One client per process so HTTP connections are pooled across downloads and runs
+    from google.cloud import storage
+    return storage.Client()
+
+
+class GCSStorage(StorageBackend):
+
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self.bucket = get_gcs_client().bucket(bucket_name)
+
+    @staticmethod
+    def _info(blob) -> BlobInfo:
+        checksum = f"md5:{blob.md5_hash}" if blob.md5_hash else f"crc32c:{blob.crc32c}" # Composite objects only have a crc32c
+        return BlobInfo(blob.name, blob.size, checksum, str(blob.generation))
+
+    def list_blobs(self, prefix: str) -> list:
+        blobs = get_gcs_client().list_blobs(self.bucket_name, prefix=prefix)
+        return [self._info(blob) for blob in blobs if not blob.name.endswith("/")]
+
+    def stat(self, name: str) -> BlobInfo:
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            raise FileNotFoundError(f"gs://{self.bucket_name}/{name} does not exist")
+        return self._info(blob)
+
+    def read_range(self, name: str, start: int, end: int, generation=None) -> bytes:
+        blob = self.bucket.blob(name, generation=int(generation) if generation else None) # Pinning the generation avoids mixing two versions
+        return blob.download_as_bytes(start=start, end=end - 1) # GCS ranges are inclusive
+
+
+class LocalStorage(StorageBackend): # A directory that stands in for a bucket, e.g. for offline runs and tests
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _info(self, name: str) -> BlobInfo:
+        stat = os.stat(os.path.join(self.root, name))
+        return BlobInfo(name, stat.st_size, f"stat:{stat.st_size}:{stat.st_mtime_ns}", str(stat.st_mtime_ns))
+
+    def list_blobs(self, prefix: str) -> list:
+        infos = []
+        for directory, _, files in os.walk(self.root):
+            for file_name in files:
+                name = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    infos.append(self._info(name))
+        return sorted(infos)
+
+    def stat(self, name: str) -> BlobInfo:
+        return self._info(name)
+
+    def read_range(self, name: str, start: int, end: int, generation=None) -> bytes:
+        with open(os.path.join(self.root, name), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+
+def get_storage_backend(config: dict) -> StorageBackend: # Build the backend named in the data_ingestion config
+    if config.get("storage_backend", "gcs") == "local":
+        return LocalStorage(config["local_storage_dir"])
+    return GCSStorage(config["bucket_name"])
+
+
+class BlobDownloader: # Parallel, resumable, manifest-cached downloads from a StorageBackend
+
+    def __init__(self, backend: StorageBackend, manifest_path: str, max_workers: int = 8, part_size: int = 8 * 1024 * 1024):
+        self.backend = backend
+        self.manifest_path = manifest_path # JSON file mapping local paths to the remote version they hold
+        self.max_workers = max(1, int(max_workers)) # Concurrent range requests
+        self.part_size = max(1, int(part_size)) # Bytes per range request
+        self._lock = threading.Lock() # Guards the manifest and the resume sidecars
+        self.manifest = self._load_json(manifest_path)
+
+    def sync(self, targets) -> list: # targets: list of (BlobInfo, local path); returns the paths that were (re)downloaded
+        try:
+            pending = [(info, path) for info, path in targets if not self.is_current(info, path)]
+            skipped = len(targets) - len(pending)
+            if skipped:
+                logger.info(f"{skipped} object(s) unchanged since the last download, skipping them")
+            if not pending:
+                return []
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool: # One pool for every part of every object
+                jobs = [(info, path, self._prepare(info, path)) for info, path in pending]
+                futures = [pool.submit(self._fetch_part, info, path, offset)
+                           for info, path, offsets in jobs for offset in offsets]
+                for future in futures:
+                    future.result()
+
+            for info, path in pending:
+                self._finish(info, path)
+            return [path for _, path in pending]
+
+        except Exception as e:
+            logger.error(f"Error while downloading objects: {e}")
+            raise CustomException("Failed to download objects from storage", e)
+
+    def is_current(self, info: BlobInfo, path: str) -> bool: # Local file exists and holds exactly this remote version
+        entry = self.manifest.get(path)
+        return (entry is not None and os.path.exists(path) and os.path.getsize(path) == info.size
+                and entry["checksum"] == info.checksum and entry["generation"] == info.generation)
+
+    def _prepare(self, info: BlobInfo, path: str) -> list: # Allocate the .part file and return the offsets still missing
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        part_path, state_path = path + ".part", path + ".part.json"
+        state = self._load_json(state_path)
+        if state.get("generation") != info.generation or state.get("part_size") != self.part_size or not os.path.exists(part_path):
+            state = {"generation": info.generation, "part_size": self.part_size, "done": []} # Different version: start over
+            with open(part_path, "wb") as f:
+                f.truncate(info.size)
+            self._write_json(state_path, state)
+        else:
+            logger.info(f"Resuming {info.name}: {len(state['done'])} part(s) already on disk")
+        done = set(state["done"])
+        return [offset for offset in range(0, max(info.size, 1), self.part_size) if offset not in done]
+
+    def _fetch_part(self, info: BlobInfo, path: str, offset: int):
+        end = min(offset + self.part_size, info.size)
+        data = self.backend.read_range(info.name, offset, end, generation=info.generation) if end > offset else b""
+        fd = os.open(path + ".part", os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+        with self._lock: # Record progress so an interrupted run resumes from here
+            state_path = path + ".part.json"
+            state = self._load_json(state_path)
+            state["done"] = sorted(set(state.get("done", [])) | {offset})
+            self._write_json(state_path, state)
+
+    def _finish(self, info: BlobInfo, path: str):
+        part_path = path + ".part"
+        expected, digest = self._digest(info, part_path)
+        if digest is not None and digest != expected:
+            os.remove(part_path)
+            os.remove(part_path + ".json")
+            raise ValueError(f"Checksum mismatch for {info.name}")
+        os.replace(part_path, path)
+        os.remove(part_path + ".json")
+        self.record(path, {"name": info.name, "size": info.size, "checksum": info.checksum, "generation": info.generation})
+        logger.info(f"Downloaded {info.name} ({info.size} bytes) to {path}")
+
+    @staticmethod
+    def _digest(info: BlobInfo, part_path: str): # (expected, actual) base64 digest, actual None when it cannot be checked
+        kind, _, expected = info.checksum.partition(":")
+        if kind == "md5":
+            hasher = hashlib.md5()
+        elif kind == "crc32c":
+            try:
+                import google_crc32c # Installed with google-cloud-storage
+            except ImportError:
+                logger.warning(f"google_crc32c is not installed, {info.name} is kept without verifying its crc32c")
+                return expected, None
+            hasher = google_crc32c.Checksum()
+        else: # Local files carry no content checksum
+            return expected, None
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
+        return expected, base64.b64encode(hasher.digest()).decode() # GCS reports both as base64 of the big-endian digest
+
+    def record(self, path: str, entry: dict): # Store an entry in the manifest and persist it
+        with self._lock:
+            self.manifest[path] = entry
+            self._write_json(self.manifest_path, self.manifest)
+
+    @staticmethod
+    def _load_json(path: str) -> dict:
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_json(path: str, data: dict): # Write then rename so a crash never leaves half a file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,159 @@
+# This code is part of a machine learning project for diabetes classification.
+# It runs the RandomizedSearchCV trials through a TrialStore: the search samples the same candidates, writes them
+# and a snapshot of the training data next to the store, and then any number of worker processes claim trials
+# and checkpoint every CV fold. Rerunning after a crash resumes from the checkpoints, and more workers can join
+# with the command below (from other hosts only if the store is on a file system with working locks, never NFS;
+# see src/trial_store.py):
+#   python -m src.trial_search --store artifacts/trials/trials.db --threads 4
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+from src.trial_store import TrialStore, worker_name
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def to_builtin(params: dict) -> dict: # NumPy scalars from scipy distributions -> JSON-friendly Python values
+    return {key: value.item() if hasattr(value, "item") else value for key, value in params.items()}
+
+
+def load_study_data(data_path: str): # (X DataFrame, y) from a study snapshot
+    with np.load(data_path, allow_pickle=False) as data:
+        return pd.DataFrame(data["X"], columns=list(data["feature_names"])), data["y"]
+
+
+def run_worker(store_path: str, study_id: str = None, num_threads: int = 0, stale_after: float = 900.0) -> int:
+    # Claim and run trials of one study until none is left to claim; returns the number of trials completed
+    store = TrialStore(store_path, stale_after=stale_after)
+    study = store.study(study_id)
+    if study is None:
+        logger.info(f"No open study in {store_path}")
+        return 0
+    study_id, data_path, settings = study
+    X, y = load_study_data(data_path)
+    folds = list(StratifiedKFold(n_splits=settings["cv"]).split(X, y)) # Same folds as RandomizedSearchCV(cv=int)
+    scorer = get_scorer(settings["scoring"])
+    worker = worker_name()
+    completed = 0
+
+    while True:
+        claimed = store.claim(study_id, worker)
+        if claimed is None:
+            return completed
+        trial_id, params = claimed
+        try:
+            scores = store.completed_folds(study_id, trial_id) # Folds checkpointed by an earlier, interrupted worker
+            for fold, (train_idx, valid_idx) in enumerate(folds):
+                if fold in scores:
+                    continue
+                start = time.perf_counter()
+                model = lgb.LGBMClassifier(**settings["base_params"], **params, n_jobs=num_threads or None, verbosity=-1)
+                model.fit(X.iloc[train_idx], y[train_idx])
+                scores[fold] = float(scorer(model, X.iloc[valid_idx], y[valid_idx]))
+                store.record_fold(study_id, trial_id, fold, scores[fold], time.perf_counter() - start, worker)
+            store.complete(study_id, trial_id, float(np.mean([scores[fold] for fold in range(len(folds))])))
+            completed += 1
+        except Exception as e:
+            logger.error(f"Trial {trial_id} of study {study_id} failed: {e}")
+            store.fail(study_id, trial_id, repr(e))
+
+
+class StoredTrialSearch: # RandomizedSearchCV with persisted, resumable trials and a pool of worker processes
+
+    def __init__(self, param_distributions: dict, store_path: str, base_params: dict = None, n_iter: int = 15, cv: int = 5,
+                 scoring: str = "f1", random_state: int = 42, n_jobs: int = 1, num_threads: int = 0,
+                 stale_after: float = 900.0, poll_seconds: float = 10.0):
+        self.param_distributions = param_distributions
+        self.store_path = store_path # SQLite file; the training data snapshot of every study is written next to it
+        self.base_params = dict(base_params or {}) # Fixed LGBMClassifier parameters, e.g. scale_pos_weight
+        self.n_iter = n_iter
+        self.cv = cv
+        self.scoring = scoring
+        self.random_state = random_state
+        self.n_jobs = max(1, n_jobs) # Local worker processes
+        self.num_threads = num_threads # LightGBM threads per worker, 0 lets LightGBM use every core
+        self.stale_after = stale_after # Seconds without a heartbeat before another worker takes a trial over
+        self.poll_seconds = poll_seconds # Wait between checks while other hosts finish their trials
+        self.study_id_ = None
+        self.best_params_ = None
+        self.best_score_ = None
+        self.best_estimator_ = None
+        self.resumed_folds_ = 0 # Folds found in the store from an earlier run
+        self.candidates_ = [] # (params, score) of every completed trial, best first
+
+    def create_study(self, X: pd.DataFrame, y: np.ndarray) -> str: # Idempotent: the same data and settings give the same study
+        candidates = [to_builtin(params) for params in
+                      ParameterSampler(self.param_distributions, n_iter=self.n_iter, random_state=self.random_state)]
+        settings = {"base_params": to_builtin(self.base_params), "cv": self.cv, "scoring": self.scoring,
+                    "feature_names": list(X.columns)}
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+        digest.update(np.ascontiguousarray(y).tobytes())
+        digest.update(json.dumps([settings, candidates], sort_keys=True).encode())
+        study_id = digest.hexdigest()[:16]
+
+        store = TrialStore(self.store_path, stale_after=self.stale_after) # Creates the store directory
+        data_path = os.path.join(os.path.dirname(self.store_path) or ".", f"study_{study_id}.npz")
+        if not os.path.exists(data_path): # Written once, then read by every worker
+            temp_path = data_path + f".{os.getpid()}.tmp.npz"
+            np.savez(temp_path, X=X.to_numpy(dtype=np.float64), y=y, feature_names=np.array(settings["feature_names"]))
+            os.replace(temp_path, data_path)
+        if not store.create_study(study_id, data_path, settings, candidates):
+            logger.info(f"Resuming study {study_id}: {store.counts(study_id)}")
+        return study_id
+
+    def fit(self, X, y):
+        X_frame = (X if isinstance(X, pd.DataFrame) else pd.DataFrame(X)).rename(columns=str)
+        self.study_id_ = self.create_study(X_frame, np.asarray(y))
+        store = TrialStore(self.store_path, stale_after=self.stale_after)
+        self.resumed_folds_ = len(store.fold_results(self.study_id_))
+
+        while True:
+            if self.n_jobs == 1:
+                run_worker(self.store_path, self.study_id_, self.num_threads, self.stale_after)
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                    futures = [pool.submit(run_worker, self.store_path, self.study_id_, self.num_threads, self.stale_after)
+                               for _ in range(self.n_jobs)]
+                    for future in futures:
+                        future.result()
+            counts = store.counts(self.study_id_)
+            if not counts.get("pending") and not counts.get("running"):
+                break
+            logger.info(f"Waiting for trials held by other workers: {counts}")
+            time.sleep(self.poll_seconds) # Claims from other hosts are taken over once they go stale
+
+        if counts.get("failed"):
+            logger.warning(f"{counts['failed']} trial(s) of study {self.study_id_} failed, see the error column in {self.store_path}")
+        best = store.best_trial(self.study_id_)
+        if best is None:
+            raise RuntimeError(f"No trial of study {self.study_id_} completed")
+        trial_id, self.best_params_, self.best_score_ = best
+        self.candidates_ = [(params, score) for _, params, score in store.completed_trials(self.study_id_)]
+        logger.info(f"Best trial {trial_id} of study {self.study_id_}: score {self.best_score_:.4f}")
+
+        # Refit the best candidate on the full training set, as RandomizedSearchCV(refit=True) does
+        self.best_estimator_ = lgb.LGBMClassifier(**self.base_params, **self.best_params_,
+                                                  n_jobs=self.n_jobs * self.num_threads or None)
+        self.best_estimator_.fit(X, y)
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run hyperparameter trials from a shared trial store.")
+    parser.add_argument("--store", required=True, help="Path of the SQLite trial store")
+    parser.add_argument("--study", default=None, help="Study id; defaults to the most recent study with open trials")
+    parser.add_argument("--threads", type=int, default=0, help="LightGBM threads per model, 0 for every core")
+    parser.add_argument("--stale-after", type=float, default=900.0, help="Seconds before an abandoned trial is taken over")
+    args = parser.parse_args()
+    done = run_worker(args.store, args.study, args.threads, args.stale_after)
+    print(f"Completed {done} trial(s)")
@@ -0,0 +1,184 @@
+# This code is part of a machine learning project for diabetes classification.
+# It persists hyperparameter search trials in a SQLite file: the sampled parameters of every trial, the score and
+# fit time of every completed CV fold, and which worker is running it. Workers claim pending trials inside a write
+# transaction, so any number of processes can work on the same study, and a rerun after a crash only trains the
+# folds that are missing.
+# The store must live on a local disk, not on NFS or another network file system: the write transaction relies on
+# SQLite's file locks, which NFS does not reliably honour, so two workers could claim the same trial or corrupt
+# the file. Other hosts can only join through a shared file system whose POSIX locks are known to work.
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import time
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    study_id TEXT PRIMARY KEY,
+    data_path TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    study_id TEXT NOT NULL,
+    trial_id INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    heartbeat REAL,
+    score REAL,
+    error TEXT,
+    PRIMARY KEY (study_id, trial_id)
+);
+CREATE TABLE IF NOT EXISTS folds (
+    study_id TEXT NOT NULL,
+    trial_id INTEGER NOT NULL,
+    fold INTEGER NOT NULL,
+    score REAL NOT NULL,
+    fit_seconds REAL NOT NULL,
+    worker TEXT NOT NULL,
+    PRIMARY KEY (study_id, trial_id, fold)
+);
+"""
+
+
+def worker_name() -> str: # host:pid, so a restarted process can tell its dead predecessors' claims apart
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_dead_local_worker(worker: str) -> bool: # A claim from a process on this host that no longer exists
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class TrialStore: # SQLite-backed queue and result log for search trials
+
+    def __init__(self, path: str, stale_after: float = 900.0):
+        self.path = path
+        self.stale_after = stale_after # Seconds without a heartbeat after which a running trial may be reclaimed
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def connect(self): # One short-lived connection per operation; an open transaction is rolled back when it closes
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def create_study(self, study_id: str, data_path: str, settings: dict, trials: list) -> bool: # False if it already existed
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            created = db.execute(
+                "INSERT OR IGNORE INTO studies (study_id, data_path, settings, created) VALUES (?, ?, ?, ?)",
+                (study_id, data_path, json.dumps(settings), time.time()),
+            ).rowcount == 1
+            db.executemany(
+                "INSERT OR IGNORE INTO trials (study_id, trial_id, params) VALUES (?, ?, ?)",
+                [(study_id, trial_id, json.dumps(params)) for trial_id, params in enumerate(trials)],
+            )
+            db.execute("UPDATE trials SET status = 'pending' WHERE study_id = ? AND status = 'failed'", (study_id,)) # Retry on rerun
+            db.execute("COMMIT")
+        return created
+
+    def study(self, study_id: str = None): # (study_id, data_path, settings) of the given or most recent study with open trials
+        with self.connect() as db:
+            if study_id is None:
+                row = db.execute(
+                    "SELECT s.study_id, s.data_path, s.settings FROM studies s WHERE EXISTS "
+                    "(SELECT 1 FROM trials t WHERE t.study_id = s.study_id AND t.status IN ('pending', 'running')) "
+                    "ORDER BY s.created DESC LIMIT 1"
+                ).fetchone()
+            else:
+                row = db.execute("SELECT study_id, data_path, settings FROM studies WHERE study_id = ?", (study_id,)).fetchone()
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def claim(self, study_id: str, worker: str): # Next pending (or abandoned) trial as (trial_id, params), or None
+        now = time.time()
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE") # Serializes claims between processes
+            row = db.execute(
+                "SELECT trial_id, params FROM trials WHERE study_id = ? AND status = 'pending' ORDER BY trial_id LIMIT 1",
+                (study_id,),
+            ).fetchone()
+            if row is None: # Take over trials whose worker stopped sending heartbeats or died on this host
+                for trial_id, params, owner, heartbeat in db.execute(
+                    "SELECT trial_id, params, worker, heartbeat FROM trials WHERE study_id = ? AND status = 'running' ORDER BY trial_id",
+                    (study_id,),
+                ).fetchall():
+                    if now - (heartbeat or 0) > self.stale_after or is_dead_local_worker(owner):
+                        logger.info(f"Reclaiming trial {trial_id} of study {study_id} from {owner}")
+                        row = (trial_id, params)
+                        break
+            if row is not None:
+                db.execute(
+                    "UPDATE trials SET status = 'running', worker = ?, heartbeat = ? WHERE study_id = ? AND trial_id = ?",
+                    (worker, now, study_id, row[0]),
+                )
+            db.execute("COMMIT")
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def completed_folds(self, study_id: str, trial_id: int) -> dict: # fold -> score of the folds already checkpointed
+        with self.connect() as db:
+            rows = db.execute("SELECT fold, score FROM folds WHERE study_id = ? AND trial_id = ?", (study_id, trial_id)).fetchall()
+        return dict(rows)
+
+    def record_fold(self, study_id: str, trial_id: int, fold: int, score: float, fit_seconds: float, worker: str):
+        with self.connect() as db: # Checkpoint the fold and refresh the claim in one transaction
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT OR REPLACE INTO folds (study_id, trial_id, fold, score, fit_seconds, worker) VALUES (?, ?, ?, ?, ?, ?)",
+                (study_id, trial_id, fold, score, fit_seconds, worker),
+            )
+            db.execute("UPDATE trials SET heartbeat = ? WHERE study_id = ? AND trial_id = ?", (time.time(), study_id, trial_id))
+            db.execute("COMMIT")
+
+    def complete(self, study_id: str, trial_id: int, score: float):
+        with self.connect() as db:
+            db.execute("UPDATE trials SET status = 'done', score = ?, heartbeat = ? WHERE study_id = ? AND trial_id = ?",
+                       (score, time.time(), study_id, trial_id))
+
+    def fail(self, study_id: str, trial_id: int, error: str):
+        with self.connect() as db:
+            db.execute("UPDATE trials SET status = 'failed', error = ?, heartbeat = ? WHERE study_id = ? AND trial_id = ?",
+                       (error, time.time(), study_id, trial_id))
+
+    def counts(self, study_id: str) -> dict: # status -> number of trials
+        with self.connect() as db:
+            return dict(db.execute("SELECT status, COUNT(*) FROM trials WHERE study_id = ? GROUP BY status", (study_id,)).fetchall())
+
+    def best_trial(self, study_id: str): # (trial_id, params, score) of the best completed trial, lowest id on ties
+        with self.connect() as db:
+            row = db.execute(
+                "SELECT trial_id, params, score FROM trials WHERE study_id = ? AND status = 'done' ORDER BY score DESC, trial_id LIMIT 1",
+                (study_id,),
+            ).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]), row[2])
+
+    def completed_trials(self, study_id: str): # (trial_id, params, score) of every completed trial, best first
+        with self.connect() as db:
+            rows = db.execute(
+                "SELECT trial_id, params, score FROM trials WHERE study_id = ? AND status = 'done' ORDER BY score DESC, trial_id",
+                (study_id,),
+            ).fetchall()
+        return [(trial_id, json.loads(params), score) for trial_id, params, score in rows]
+
+    def fold_results(self, study_id: str): # (trial_id, fold, score, fit_seconds, worker) of every checkpointed fold
+        with self.connect() as db:
+            return db.execute(
+                "SELECT trial_id, fold, score, fit_seconds, worker FROM folds WHERE study_id = ? ORDER BY trial_id, fold", (study_id,)
+            ).fetchall()
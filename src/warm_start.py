@@ -0,0 +1,107 @@
+# This code is part of a machine learning project for diabetes classification.
+# It holds the pieces of incremental retraining that do not depend on ModelTraining: reading the best
+# hyperparameters of the last MLflow training run, and moving an existing booster to a refitted scaler.
+# Every preprocessing run refits the RobustScaler, so the trees of the previous model split on features scaled
+# with the old center/scale. Each split is moved to the new scale exactly: the largest raw value the old split sends
+# left is found by bisecting over the ordered float64 values, and that value scaled the new way becomes the new
+# threshold, so every raw value takes the same branch as before (values the new scaling maps onto the same float
+# excepted). Boosting can then continue from the moved booster with LightGBM's init_model.
+import ast
+import numpy as np
+import lightgbm as lgb
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+ZERO_MISSING, NAN_MISSING = 1, 2 # Missing type bits (2-3) of a LightGBM decision_type: 0 None, 1 Zero, 2 NaN
+DEFAULT_LEFT = 2 # Bit 1 of a decision_type
+SIGN = np.int64(-0x8000000000000000)
+
+
+def scaled(raw, center, scale) -> np.ndarray: # The float operations of RobustScaler.transform and FeatureTransform.scale
+    return (raw - center) / scale
+
+
+def float_key(x: np.ndarray) -> np.ndarray: # int64 keys ordered like the float64 values, one apart for neighbours
+    bits = np.asarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, -(bits & ~SIGN), bits)
+
+
+def key_float(key: np.ndarray) -> np.ndarray:
+    return np.where(key < 0, (-key) | SIGN, key).astype(np.int64).view(np.float64)
+
+
+def move_thresholds(threshold, old_center, old_scale, new_center, new_scale) -> np.ndarray:
+    # Bisection between a raw value the old split sends left and one it sends right, on the float64 order
+    goes_left = lambda raw: scaled(raw, old_center, old_scale) <= threshold
+    big = np.finfo(np.float64).max
+    with np.errstate(over="ignore", invalid="ignore"): # Scaling values near the float64 limits may overflow
+        moving = goes_left(-big) & ~goes_left(big) # Splits every finite value takes the same way keep their threshold
+        estimate = np.clip(threshold * old_scale + old_center, -big, big)
+        width = (np.abs(estimate) + np.abs(old_center)) * 1e-9 + np.finfo(np.float64).tiny
+        while True: # Widen the bracket until it holds the cutoff
+            low, high = np.clip(estimate - width, -big, big), np.clip(estimate + width, -big, big)
+            holds = ~moving | (goes_left(low) & ~goes_left(high))
+            if holds.all():
+                break
+            width = np.where(holds, width, width * 1024)
+        low, high = np.where(moving, float_key(low), 0), np.where(moving, float_key(high), 1)
+        while (high > low + 1).any():
+            middle = (low >> 1) + (high >> 1) + (low & high & 1) # Floor of the mean without overflow
+            left = goes_left(key_float(middle))
+            low, high = np.where(left, middle, low), np.where(left, high, middle)
+        return np.where(moving, scaled(key_float(low), new_center, new_scale), threshold)
+
+
+def parse_param(value: str): # MLflow stores every param as a string
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def last_run_params(param_names, experiment_ids=None): # (run_id, {name: value}) of the latest finished training run, or None
+    import mlflow
+    runs = mlflow.search_runs(
+        experiment_ids=experiment_ids,
+        filter_string="tags.PipelineStep = 'ModelTraining' and attributes.status = 'FINISHED'",
+        order_by=["attributes.start_time DESC"],
+        max_results=1,
+    )
+    if runs.empty:
+        return None
+    run = runs.iloc[0]
+    params = {name: parse_param(run[f"params.{name}"]) for name in param_names
+              if f"params.{name}" in run and isinstance(run[f"params.{name}"], str)}
+    return run["run_id"], params
+
+
+def rescale_booster(booster: lgb.Booster, old_center, old_scale, new_center, new_scale) -> lgb.Booster:
+    # Same trees, with thresholds moved from the old scaled feature space to the new one
+    old_center, old_scale = np.asarray(old_center, dtype=np.float64), np.asarray(old_scale, dtype=np.float64)
+    new_center, new_scale = np.asarray(new_center, dtype=np.float64), np.asarray(new_scale, dtype=np.float64)
+    out = []
+    split_feature = threshold = None
+    for line in booster.model_to_string().split("\n"):
+        if line.startswith("tree_sizes="): # Byte offsets of the tree blocks change; LightGBM parses without them
+            continue
+        if line.startswith("split_feature="):
+            split_feature = np.array(line.split("=", 1)[1].split(), dtype=np.int64)
+        elif line.startswith("threshold=") and split_feature is not None:
+            threshold = np.array(line.split("=", 1)[1].split(), dtype=np.float64)
+            f = split_feature
+            moved = move_thresholds(threshold, old_center[f], old_scale[f], new_center[f], new_scale[f])
+            line = "threshold=" + " ".join(repr(float(t)) for t in moved)
+        elif line.startswith("decision_type=") and threshold is not None:
+            decision = np.array(line.split("=", 1)[1].split(), dtype=np.int64)
+            if ((decision >> 2) & 3 == ZERO_MISSING).any() or (decision & 1).any():
+                raise ValueError("Zero-as-missing and categorical splits cannot be moved to a new scale")
+            # Without a missing type, NaN is read as the scaled value 0, which is a different raw value after
+            # rescaling; an explicit NaN default sends it where 0 went before
+            none = (decision >> 2) & 3 == 0
+            default_left = np.where(none, 0.0 <= threshold, decision & DEFAULT_LEFT)
+            decision = np.where(none, NAN_MISSING << 2, decision & ~DEFAULT_LEFT) | np.where(default_left, DEFAULT_LEFT, 0)
+            line = "decision_type=" + " ".join(str(int(d)) for d in decision)
+            split_feature = threshold = None
+        out.append(line)
+    return lgb.Booster(model_str="\n".join(out))
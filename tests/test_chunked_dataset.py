@@ -0,0 +1,109 @@
+# Tests for out-of-core training (src/chunked_dataset.py): the classifier wrapped around an lgb.train booster must
+# predict exactly like the booster, and the binned Dataset must be reused from its save_binary cache while the file
+# is unchanged and rebuilt, with the old bins removed, once it changes.
+#   python -m pytest tests
+import os
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import RobustScaler
+import src.chunked_dataset as chunked_dataset
+from src.chunked_dataset import as_classifier, build_dataset, sample_frame
+from src.inference_engine import TreeEngine
+
+PARAMS = {"objective": "binary", "num_leaves": 15, "learning_rate": 0.1, "verbose": -1}
+DATASET_PARAMS = {"max_bin": 63, "verbose": -1}
+
+
+def make_frame(n_rows: int = 3000, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.normal(size=(n_rows, 4)), columns=["Glucose", "BMI", "Age (years)", "Insulin"])
+    frame.loc[rng.uniform(size=n_rows) < 0.1, "Insulin"] = np.nan
+    frame["Outcome"] = (frame["Glucose"] + 0.5 * frame["BMI"] + rng.normal(scale=0.5, size=n_rows) > 0).astype(int)
+    return frame
+
+
+@pytest.fixture
+def train_file(tmp_path):
+    path = str(tmp_path / "train.csv")
+    make_frame().to_csv(path, index=False)
+    return path
+
+
+def test_wrapped_classifier_predicts_like_the_booster(train_file, tmp_path):
+    dataset = build_dataset(train_file, "Outcome", 700, DATASET_PARAMS, str(tmp_path / "bins"))
+    booster = lgb.train(PARAMS, dataset, num_boost_round=40)
+    X_sample, y_sample = sample_frame(train_file, "Outcome", 500)
+    model = as_classifier(booster, PARAMS, X_sample, y_sample)
+
+    X = make_frame(seed=1).drop(columns=["Outcome"]).rename(columns=chunked_dataset.sanitize_column)
+    assert model.booster_.num_trees() == booster.num_trees() == model.n_estimators == 40
+    np.testing.assert_array_equal(model.predict_proba(X)[:, 1], booster.predict(X))
+    np.testing.assert_array_equal(model.predict(X), (booster.predict(X) > 0.5).astype(int))
+    np.testing.assert_array_equal(model.predict(X, pred_contrib=True), booster.predict(X, pred_contrib=True))
+    assert list(model.classes_) == [0, 1] and model.n_features_in_ == 4
+    assert model.feature_name_ == booster.feature_name() == ["Glucose", "BMI", "Ageyears", "Insulin"]
+
+    path = str(tmp_path / "model.joblib") # The artifact the server loads
+    joblib.dump(model, path)
+    np.testing.assert_array_equal(joblib.load(path).predict_proba(X)[:, 1], booster.predict(X))
+    scaler = RobustScaler(with_centering=False, with_scaling=False).fit(X) # Identity, the engine then reads X as is
+    engine = TreeEngine.from_model(model, scaler)
+    np.testing.assert_allclose(engine.predict_proba(X.to_numpy()), booster.predict(X), rtol=0, atol=1e-12)
+
+
+def test_wrapping_rejects_a_sample_with_other_columns(train_file):
+    X_sample, y_sample = sample_frame(train_file, "Outcome", 500)
+    booster = lgb.train(PARAMS, lgb.Dataset(X_sample, y_sample), num_boost_round=3)
+    with pytest.raises(ValueError, match="do not match"):
+        as_classifier(booster, PARAMS, X_sample[X_sample.columns[::-1]], y_sample)
+
+
+def test_dataset_matches_in_memory_binning(train_file, tmp_path):
+    dataset = build_dataset(train_file, "Outcome", 700, DATASET_PARAMS, str(tmp_path / "bins"))
+    frame = pd.read_csv(train_file)
+    in_memory = lgb.Dataset(frame.drop(columns=["Outcome"]).to_numpy(), frame["Outcome"], params=DATASET_PARAMS).construct()
+    assert dataset.num_data() == len(frame) and dataset.num_feature() == 4
+    np.testing.assert_array_equal(dataset.get_label(), frame["Outcome"].to_numpy())
+    X = frame.drop(columns=["Outcome"]).to_numpy()
+    np.testing.assert_allclose(lgb.train(PARAMS, dataset, 20).predict(X), lgb.train(PARAMS, in_memory, 20).predict(X), atol=1e-12)
+
+
+def test_unchanged_file_loads_the_cached_bins(train_file, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "bins")
+    first = build_dataset(train_file, "Outcome", 700, DATASET_PARAMS, cache_dir)
+    (cached,) = os.listdir(cache_dir)
+    modified = os.stat(os.path.join(cache_dir, cached)).st_mtime_ns
+
+    def no_scan(*args, **kwargs):
+        raise AssertionError("the file was read again")
+
+    monkeypatch.setattr(chunked_dataset, "scan_labels", no_scan)
+    second = build_dataset(train_file, "Outcome", 700, DATASET_PARAMS, cache_dir)
+    assert os.listdir(cache_dir) == [cached] and os.stat(os.path.join(cache_dir, cached)).st_mtime_ns == modified
+    assert second.num_data() == first.num_data()
+    np.testing.assert_array_equal(second.get_label(), first.get_label())
+    X = pd.read_csv(train_file).drop(columns=["Outcome"]).to_numpy()
+    np.testing.assert_array_equal(lgb.train(PARAMS, second, 20).predict(X), lgb.train(PARAMS, first, 20).predict(X))
+
+
+def test_changed_file_or_params_rebuild_and_remove_stale_bins(train_file, tmp_path):
+    cache_dir = str(tmp_path / "bins")
+    os.makedirs(cache_dir)
+    other = os.path.join(cache_dir, "test_0123456789abcdef.bin") # Bins of another file stay
+    open(other, "wb").close()
+    build_dataset(train_file, "Outcome", 700, DATASET_PARAMS, cache_dir)
+    (first,) = [name for name in os.listdir(cache_dir) if name.startswith("train_")]
+
+    make_frame(seed=2).to_csv(train_file, index=False) # New content under the same name
+    dataset = build_dataset(train_file, "Outcome", 700, DATASET_PARAMS, cache_dir)
+    (second,) = [name for name in os.listdir(cache_dir) if name.startswith("train_")]
+    assert second != first and os.path.exists(other)
+    np.testing.assert_array_equal(dataset.get_label(), make_frame(seed=2)["Outcome"].to_numpy())
+
+    build_dataset(train_file, "Outcome", 700, {**DATASET_PARAMS, "max_bin": 31}, cache_dir)
+    (third,) = [name for name in os.listdir(cache_dir) if name.startswith("train_")]
+    assert third not in (first, second)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
@@ -0,0 +1,91 @@
+# Tests for the intermediate file formats (utils/common_functions.py): a frame written with save_data or
+# save_data_chunks comes back from load_data and iter_data_chunks with the same values, columns and dtypes as CSV,
+# Parquet or memory-mapped .npy, also when a column is int in one chunk and float with missing values in the next.
+#   python -m pytest tests
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from src.custom_exception import CustomException
+from utils.common_functions import iter_data_chunks, load_data, save_data, save_data_chunks, schema_path
+
+FORMATS = ["csv", "parquet", "npy"]
+
+
+def make_frame(n_rows: int = 50, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({"Pregnancies": rng.integers(0, 10, n_rows), "Glucose": rng.normal(120, 30, n_rows),
+                          "BMI": rng.normal(32, 7, n_rows), "Outcome": rng.integers(0, 2, n_rows)})
+    frame.loc[::7, "BMI"] = np.nan
+    return frame
+
+
+def chunked(frame: pd.DataFrame, chunk_size: int): # The frame as the chunks a streaming stage would produce
+    return (frame.iloc[start:start + chunk_size] for start in range(0, len(frame), chunk_size))
+
+
+def memory_mapped(array) -> bool:
+    while array is not None and not isinstance(array, np.memmap):
+        array = getattr(array, "base", None)
+    return array is not None
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_save_and_load_round_trip(tmp_path, fmt):
+    frame, path = make_frame(), str(tmp_path / "nested" / f"train.{fmt}") # The directory is created
+    save_data(frame, path)
+    pd.testing.assert_frame_equal(load_data(path), frame)
+    pd.testing.assert_frame_equal(load_data(path, mmap=False), frame)
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+@pytest.mark.parametrize("chunk_size", [1, 7, 50, 80])
+def test_chunks_round_trip(tmp_path, fmt, chunk_size):
+    frame, path = make_frame(), str(tmp_path / f"train.{fmt}")
+    save_data_chunks(chunked(frame, chunk_size), path, n_rows=len(frame))
+    pd.testing.assert_frame_equal(load_data(path), frame)
+    chunks = list(iter_data_chunks(path, chunk_size))
+    assert [len(chunk) for chunk in chunks] == [len(chunk) for chunk in chunked(frame, chunk_size)]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), frame)
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_column_int_in_one_chunk_and_float_in_the_next_loads_as_float(tmp_path, fmt):
+    first = pd.DataFrame({"Insulin": [94, 168], "Outcome": [0, 1]})
+    second = pd.DataFrame({"Insulin": [np.nan, 88.0], "Outcome": [1, 0]}) # Missing values make pandas read a float column
+    path = str(tmp_path / f"train.{fmt}")
+    save_data_chunks(iter([first, second]), path, n_rows=4)
+    expected = pd.DataFrame({"Insulin": [94.0, 168.0, np.nan, 88.0], "Outcome": [0, 1, 1, 0]})
+    pd.testing.assert_frame_equal(load_data(path), expected)
+
+
+def test_npy_is_column_major_and_memory_mapped(tmp_path):
+    frame, path = make_frame(), str(tmp_path / "train.npy")
+    save_data(frame, path)
+    matrix = np.load(path, mmap_mode="r")
+    assert matrix.dtype == np.float64 and matrix.shape == frame.shape and matrix.flags.f_contiguous
+    np.testing.assert_array_equal(matrix[:, 2], frame["BMI"].to_numpy()) # Each column is one contiguous slice
+    assert memory_mapped(load_data(path)["Glucose"].to_numpy()) and not memory_mapped(load_data(path, mmap=False)["Glucose"].to_numpy())
+    assert memory_mapped(next(iter_data_chunks(path, 10))["Glucose"].to_numpy())
+
+
+def test_npy_schema_sidecar(tmp_path):
+    path = str(tmp_path / "train.npy")
+    frame = pd.DataFrame({"Glucose": [148.0, 85.0], "Age": np.array([50, 31], dtype=np.int32), "Diabetic": [True, False],
+                          "Insulin": pd.array([94, None], dtype="Int64")})
+    save_data(frame, path)
+    assert schema_path(path) == str(tmp_path / "train.schema.json")
+    with open(schema_path(path)) as f:
+        assert json.load(f) == {"columns": ["Glucose", "Age", "Diabetic", "Insulin"], "dtypes": ["float64", "int32", "bool", "Int64"]}
+    pd.testing.assert_frame_equal(load_data(path), frame) # Stored as float64, restored to the recorded dtypes
+
+
+def test_npy_refuses_text_columns_and_a_wrong_row_count(tmp_path):
+    with pytest.raises(CustomException):
+        save_data(pd.DataFrame({"Glucose": [148.0], "Sex": ["F"]}), str(tmp_path / "text.npy"))
+    with pytest.raises(CustomException):
+        save_data_chunks(chunked(make_frame(), 10), str(tmp_path / "short.npy"), n_rows=60)
+
+    frame, path = make_frame(), str(tmp_path / "unknown_length.npy") # Without n_rows the chunks are gathered first
+    save_data_chunks(chunked(frame, 10), path)
+    pd.testing.assert_frame_equal(load_data(path), frame)
@@ -0,0 +1,74 @@
+# Tests for the chunked hash split (DataIngestion.split_data_chunked in src/data_ingestion.py) over a small CSV in a
+# temporary directory: the split is the same on every run and for every chunk size, sends about train_ratio of the
+# rows to train, and with key columns puts a row on the same side wherever it sits in the file.
+#   python -m pytest tests
+import numpy as np
+import pandas as pd
+import pytest
+import src.data_ingestion as data_ingestion
+from src.custom_exception import CustomException
+from src.data_ingestion import DataIngestion
+
+N_ROWS = 3000
+TRAIN_RATIO = 0.8
+
+
+@pytest.fixture
+def raw(tmp_path, monkeypatch): # Raw file with a row column giving each row's position, and the split outputs, all inside tmp_path
+    rng = np.random.default_rng(0)
+    raw = pd.DataFrame({"row": np.arange(N_ROWS), "id": pd.array(np.arange(N_ROWS), dtype="Int64"),
+                        "Glucose": rng.integers(50, 200, N_ROWS), "Outcome": rng.integers(0, 2, N_ROWS)})
+    raw.loc[raw.index % 700 == 5, "id"] = pd.NA # A few rows without a key, so only the chunks holding them read id as float
+    raw.to_csv(tmp_path / "raw.csv", index=False)
+    paths = {"RAW_DIR": str(tmp_path), "RAW_FILE_PATH": str(tmp_path / "raw.csv"), "TRAIN_FILE_PATH": str(tmp_path / "train.csv"),
+             "TEST_FILE_PATH": str(tmp_path / "test.csv")}
+    for name, path in paths.items():
+        monkeypatch.setattr(data_ingestion, name, path)
+    return raw
+
+
+def split(chunk_size: int, seed: int = 42, key_columns=()): # (train, test) frames as written by split_data_chunked
+    config = {"bucket_name": "bucket", "bucket_file_name": "raw.csv", "train_ratio": TRAIN_RATIO, "split_mode": "chunked",
+              "chunk_size": chunk_size, "split_seed": seed, "split_key_columns": list(key_columns)}
+    DataIngestion({"data_ingestion": config}).split()
+    return pd.read_csv(data_ingestion.TRAIN_FILE_PATH), pd.read_csv(data_ingestion.TEST_FILE_PATH)
+
+
+def row_ids(frame) -> list:
+    return sorted(frame["row"].tolist())
+
+
+@pytest.mark.parametrize("key_columns", [(), ("id",)])
+def test_split_is_the_same_for_every_run_and_chunk_size(raw, key_columns):
+    train, test = split(1000, key_columns=key_columns)
+    assert row_ids(split(1000, key_columns=key_columns)[0]) == row_ids(train) # Same seed, same split
+    for chunk_size in [3, 7, 499, N_ROWS + 1]:
+        chunk_train, chunk_test = split(chunk_size, key_columns=key_columns)
+        assert row_ids(chunk_train) == row_ids(train) and row_ids(chunk_test) == row_ids(test)
+    assert list(train.columns) == list(raw.columns) # One header, written with the first chunk only
+    assert sorted(row_ids(train) + row_ids(test)) == list(range(N_ROWS)) # Every row lands on exactly one side
+
+
+@pytest.mark.parametrize("key_columns", [(), ("id",)])
+def test_train_share_is_close_to_train_ratio(raw, key_columns):
+    train, _ = split(500, key_columns=key_columns)
+    tolerance = 4 * np.sqrt(TRAIN_RATIO * (1 - TRAIN_RATIO) / N_ROWS) # Each row is an independent draw
+    assert abs(len(train) / N_ROWS - TRAIN_RATIO) < tolerance
+
+
+def test_another_seed_gives_another_split(raw):
+    first, second = row_ids(split(500, seed=42)[0]), row_ids(split(500, seed=7)[0])
+    assert first != second and abs(len(first) - len(second)) < 0.05 * N_ROWS
+
+
+def test_key_columns_keep_a_row_on_its_side_when_the_file_is_reordered(raw):
+    train = set(split(500, key_columns=["id"])[0]["row"])
+    raw.sample(frac=1.0, random_state=1).to_csv(data_ingestion.RAW_FILE_PATH, index=False)
+    assert set(split(333, key_columns=["id"])[0]["row"]) == train
+    assert set(split(500)[0]["row"]) != train # Without key columns the position in the file decides
+
+
+def test_non_csv_outputs_are_refused(raw, monkeypatch):
+    monkeypatch.setattr(data_ingestion, "TRAIN_FILE_PATH", data_ingestion.TRAIN_FILE_PATH.replace(".csv", ".parquet"))
+    with pytest.raises(CustomException):
+        split(500)
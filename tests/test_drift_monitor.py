@@ -0,0 +1,179 @@
+# Tests for the serving drift monitor (src/drift_monitor.py): PSI and the binned KS statistic on known
+# distributions, counts kept per thread that add up to every observed row (also after the threads exit), and a
+# retrain request that is claimed once per cooldown however many threads or processes find drift at the same time.
+#   python -m pytest tests
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+import pytest
+from scipy.stats import ks_2samp
+from src.drift_monitor import (PROBABILITY, DriftMonitor, RetrainTrigger, add_probability_reference, bin_counts, binned_ks, psi,
+                               reference_from_data)
+from src.feature_transform import MODEL_FEATURES, RAW_FEATURES
+
+TIMEOUT = 30
+SHIFTED = RAW_FEATURES.index("BloodPressure") # In no interaction feature, so it is the only one that drifts
+
+
+def raw_rows(n: int, seed: int = 0, shift: float = 0.0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(loc=[4, 120, 70, 20, 80, 32, 0.5, 33], scale=[3, 30, 12, 10, 60, 7, 0.3, 12], size=(n, len(RAW_FEATURES)))
+    X[:, 0] = np.round(np.abs(X[:, 0])) # A discrete feature, so some quantile edges collapse
+    X[:, SHIFTED] += shift * 12
+    X[rng.uniform(size=X.shape) < 0.05] = np.nan
+    return X
+
+
+def test_psi_of_known_shares():
+    assert psi(np.array([0.25, 0.25, 0.5, 0.0]), np.array([0.25, 0.25, 0.5, 0.0])) == 0.0
+    expected = np.array([0.25, 0.25, 0.25, 0.25])
+    actual = np.array([0.4, 0.1, 0.25, 0.25])
+    assert psi(expected, actual) == pytest.approx(0.15 * np.log(1.6) - 0.15 * np.log(0.4))
+    empty = psi(np.array([0.5, 0.5, 0.0]), np.array([0.5, 0.4, 0.1])) # An empty reference bin counts as MIN_FRACTION
+    assert empty == pytest.approx(-0.1 * np.log(0.8) + (0.1 - 1e-4) * np.log(0.1 / 1e-4))
+
+
+def test_binned_ks_of_known_shares():
+    # The last share is the missing values, which KS leaves out: present values are renormalised
+    assert binned_ks(np.array([0.5, 0.5, 0.0]), np.array([0.25, 0.25, 0.5])) == 0.0
+    assert binned_ks(np.array([0.5, 0.3, 0.2, 0.0]), np.array([0.2, 0.3, 0.5, 0.0])) == pytest.approx(0.3)
+    assert binned_ks(np.array([0.5, 0.5, 0.0]), np.array([0.0, 0.0, 1.0])) == 0.0 # Only missing values, nothing to compare
+
+
+def test_bin_counts_put_edges_right_and_missing_last():
+    counts = bin_counts(np.array([-1.0, 0.0, 0.5, 1.0, 2.0, np.nan]), np.array([0.0, 1.0]))
+    assert counts.tolist() == [1, 2, 2, 1]
+
+
+def test_same_distribution_is_ok_and_a_shift_drifts():
+    reference = reference_from_data(raw_rows(20_000), bins=10)
+    assert list(reference["features"]) == MODEL_FEATURES and reference["rows"] == 20_000
+
+    same = DriftMonitor(reference, window_seconds=0, min_rows=1000)
+    same.observe(raw_rows(5_000, seed=1))
+    report = same.check()
+    assert report["status"] == "ok" and report["rows"] == 5_000 and report["max_psi"] < 0.02
+    assert report["features"]["Insulin"]["missing_rate"] == pytest.approx(0.05, abs=0.01)
+
+    reference_rows, live_rows = raw_rows(20_000), raw_rows(5_000, seed=1, shift=1.0)
+    shifted = DriftMonitor(reference, window_seconds=0, min_rows=1000)
+    shifted.observe(live_rows)
+    report = shifted.check()
+    assert report["status"] == "drift" and report["drifted"] == ["BloodPressure"]
+    feature = report["features"]["BloodPressure"]
+    assert feature["psi"] > 0.5
+    present = [column[~np.isnan(column)] for column in (reference_rows[:, SHIFTED], live_rows[:, SHIFTED])]
+    exact = ks_2samp(*present).statistic # The binned statistic only looks at the bin edges, so it can only be lower
+    assert exact - 0.05 <= feature["ks"] <= exact + 1e-6
+
+
+def test_too_few_rows_are_insufficient_data():
+    monitor = DriftMonitor(reference_from_data(raw_rows(2_000)), min_rows=500)
+    monitor.observe(raw_rows(100, shift=3.0))
+    report = monitor.check()
+    assert report["status"] == "insufficient_data" and report["drifted"] == [] and report["rows"] == 100
+
+
+def test_row_and_batch_updates_count_the_same_bins():
+    X = raw_rows(300, seed=2)
+    reference = add_probability_reference(reference_from_data(raw_rows(2_000)), np.random.default_rng(0).uniform(size=2_000))
+    X[:5] = [reference["features"][name]["edges"][0] for name in RAW_FEATURES] # Values right on a bin edge
+    proba = np.random.default_rng(3).uniform(size=len(X))
+    by_row, by_batch = DriftMonitor(reference), DriftMonitor(reference)
+    for row, p in zip(X, proba):
+        by_row.observe_row(row.tolist(), float(p))
+    by_batch.observe(X, proba)
+    by_batch.observe(X[:1], proba[:1]) # A single row goes through observe_row
+    by_row.observe_row(X[0].tolist(), float(proba[0]))
+    np.testing.assert_array_equal(by_row.totals(), by_batch.totals())
+    assert by_row.all_names[-1] == PROBABILITY and by_row.check()["rows"] == len(X) + 1
+
+
+def test_counts_of_every_thread_are_summed_and_folded_when_they_exit():
+    monitor = DriftMonitor(reference_from_data(raw_rows(2_000)), window_seconds=0, min_rows=1)
+    X = raw_rows(400, seed=4)
+    start = threading.Barrier(8)
+
+    def observe(rows):
+        start.wait(TIMEOUT)
+        for i in range(0, len(rows), 10):
+            monitor.observe(rows[i:i + 10])
+            monitor.observe_row(rows[i].tolist())
+
+    threads = [threading.Thread(target=observe, args=(X[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = DriftMonitor(monitor.reference)
+    expected.observe(np.vstack([X] + [X[i::8][::10] for i in range(8)]))
+    np.testing.assert_array_equal(monitor.totals(), expected.totals())
+    assert monitor._shards == [] # Exited threads are folded into one array
+    assert monitor.check()["rows"] == 400 + 40
+
+    more = threading.Thread(target=monitor.observe, args=(X,)) # New threads keep adding to the folded counts
+    more.start()
+    more.join()
+    assert monitor.check()["rows"] == 2 * 400 + 40
+
+
+def test_window_restarts_once_old_enough(monkeypatch):
+    monitor = DriftMonitor(reference_from_data(raw_rows(2_000)), window_seconds=60, min_rows=1)
+    monitor.observe(raw_rows(50))
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert monitor.check()["rows"] == 50 # The old window is reported, then a new one starts
+    monitor.observe(raw_rows(20))
+    assert monitor.check()["rows"] == 20
+
+
+DRIFT = {"status": "drift", "drifted": ["BloodPressure"], "max_psi": 0.9}
+
+
+def slow_getmtime(path, getmtime=os.path.getmtime): # Widens the gap between the cooldown check and the write
+    time.sleep(0.2)
+    return getmtime(path)
+
+
+def fire_at(path: str, start_at: float, results): # Runs in a server worker process
+    os.path.getmtime = slow_getmtime # This process only
+    trigger = RetrainTrigger(path, cooldown_seconds=3600)
+    time.sleep(max(0.0, start_at - time.time()))
+    results.put(trigger.maybe_fire(DRIFT, "v1"))
+
+
+def test_cooldown_is_claimed_once_by_concurrent_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(os.path, "getmtime", slow_getmtime)
+    path = str(tmp_path / "drift" / "retrain_request.json")
+    triggers = [RetrainTrigger(path, cooldown_seconds=3600) for _ in range(2)] # Two callers, each with its own trigger
+    start, fired = threading.Barrier(2), []
+
+    def fire(trigger):
+        start.wait(TIMEOUT)
+        fired.append(trigger.maybe_fire(DRIFT, "v1"))
+
+    threads = [threading.Thread(target=fire, args=(trigger,)) for trigger in triggers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(fired) == [False, True] and os.path.exists(path)
+    assert not triggers[0].maybe_fire({"status": "ok"}) and not triggers[0].maybe_fire(DRIFT) # Within the cooldown
+
+    os.utime(path, (time.time() - 3601, time.time() - 3601)) # The last request is older than the cooldown
+    assert triggers[1].maybe_fire(DRIFT, "v2")
+    assert not [name for name in os.listdir(tmp_path / "drift") if name.endswith(".tmp")]
+
+
+def test_cooldown_is_claimed_once_by_concurrent_processes(tmp_path):
+    path, results = str(tmp_path / "retrain_request.json"), multiprocessing.Queue()
+    start_at = time.time() + 1.0
+    workers = [multiprocessing.Process(target=fire_at, args=(path, start_at, results)) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    fired = [results.get(timeout=TIMEOUT) for _ in workers]
+    for worker in workers:
+        worker.join(TIMEOUT)
+    assert fired.count(True) == 1
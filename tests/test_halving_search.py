@@ -0,0 +1,162 @@
+# Tests for the successive-halving search (src/halving_search.py): the rung budgets, promotion of the best 1/eta
+# candidates, candidates whose early stopping already ended them staying out of later rungs, time_to_best_, the
+# n_estimators cap of a candidate, and the refit with the mean best iteration of the folds.
+#   python -m pytest tests
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+import src.halving_search as halving_search
+from src.halving_search import SuccessiveHalvingSearch
+
+
+class Clock: # Stands in for the time module inside src.halving_search
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+def scripted(search, clock, converged_at=None, gain_per_round=0.0):
+    # Replaces search.evaluate: candidate num_leaves / 100 (plus gain_per_round for every round of the budget) is
+    # its score, every evaluation takes one second, and converged_at maps num_leaves to the budget from which on
+    # early stopping ends that candidate
+    calls = []
+
+    def evaluate(candidate, folds, budget):
+        clock.now += 1.0
+        calls.append((candidate["num_leaves"], budget))
+        return {"score": candidate["num_leaves"] / 100 + budget * gain_per_round, "rounds": budget, "best_iteration": budget // 2,
+                "converged": budget >= (converged_at or {}).get(candidate["num_leaves"], np.inf)}
+
+    search.evaluate = evaluate
+    return calls
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(halving_search, "time", clock)
+    return clock
+
+
+def make_search(**params) -> SuccessiveHalvingSearch:
+    params = {"n_candidates": 9, "eta": 3, "min_rounds": 10, "max_rounds": 100, **params}
+    return SuccessiveHalvingSearch({"num_leaves": list(range(2, 11))}, **params)
+
+
+def rung_calls(calls, budget) -> list:
+    return sorted(leaves for leaves, rung_budget in calls if rung_budget == budget)
+
+
+def test_rung_budgets_grow_by_eta_up_to_max_rounds():
+    assert make_search().rungs() == [10, 30, 90, 100]
+    assert make_search(eta=2, min_rounds=25, max_rounds=100).rungs() == [25, 50, 100]
+    assert make_search(min_rounds=100, max_rounds=100).rungs() == [100]
+
+
+def test_best_third_is_promoted_at_every_rung(clock):
+    search = make_search()
+    calls = scripted(search, clock)
+    params = search.search([], clock.perf_counter())
+    assert rung_calls(calls, 10) == list(range(2, 11))
+    assert rung_calls(calls, 30) == [8, 9, 10]
+    assert rung_calls(calls, 90) == [10] and rung_calls(calls, 100) == [10] # A lone survivor still gets the last rung
+    assert len(calls) == 14 and len(search.history_) == 14
+    assert params == {"num_leaves": 10, "n_estimators": 50} == search.best_params_ # Best iteration at the last rung
+    assert search.best_score_ == 0.1
+    assert [candidate["num_leaves"] for candidate, _ in search.candidates_] == list(range(10, 1, -1))
+
+
+@pytest.mark.parametrize("n_candidates, survivors", [(7, [2, 1]), (4, [1]), (2, [1])])
+def test_at_least_one_candidate_survives_a_rung(clock, n_candidates, survivors):
+    search = make_search(n_candidates=n_candidates)
+    calls = scripted(search, clock)
+    search.search([], clock.perf_counter())
+    assert [len(rung_calls(calls, budget)) for budget in [30, 90]][:len(survivors)] == survivors
+
+
+def test_candidates_ended_by_early_stopping_are_not_retrained(clock):
+    search = make_search()
+    calls = scripted(search, clock, converged_at={9: 10})
+    search.search([], clock.perf_counter())
+    assert rung_calls(calls, 30) == [8, 10] # 9 is still ranked with its first score, but not trained again
+    assert rung_calls(calls, 90) == [10]
+    assert dict((candidate["num_leaves"], score) for candidate, score in search.candidates_)[9] == 0.09
+
+
+def test_converged_winner_ends_the_search_early(clock):
+    search = make_search()
+    calls = scripted(search, clock, converged_at={10: 30})
+    search.search([], clock.perf_counter())
+    assert rung_calls(calls, 30) == [8, 9, 10]
+    assert rung_calls(calls, 90) == [] and rung_calls(calls, 100) == []
+    assert search.best_params_["n_estimators"] == 15
+
+
+def test_time_to_best_is_when_the_best_score_was_first_reached(clock):
+    search = make_search()
+    calls = scripted(search, clock)
+    clock.now = 100.0
+    search.search([], clock.perf_counter())
+    assert search.time_to_best_ == calls.index((10, 10)) + 1 # The score at the first rung is already the best
+    assert search.history_[-1]["elapsed"] == len(calls)
+
+    search = make_search()
+    calls = scripted(search, clock, gain_per_round=1e-4)
+    clock.now = 0.0
+    search.search([], clock.perf_counter())
+    assert search.time_to_best_ == len(calls) # Reached only on the last rung
+
+
+def make_data(n_rows: int = 600, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_rows, 4)), columns=["Glucose", "BMI", "Age", "Insulin"])
+    y = (X["Glucose"] + rng.normal(scale=1.0, size=n_rows) > 0).astype(int) # Noisy, so early stopping fires
+    return X, y
+
+
+@pytest.fixture
+def train_calls(monkeypatch): # (num_boost_round, best_iteration) of every lgb.train call
+    calls, train = [], lgb.train
+
+    def recording_train(params, train_set, num_boost_round, **kwargs):
+        booster = train(params, train_set, num_boost_round, **kwargs)
+        calls.append((num_boost_round, booster.best_iteration))
+        return booster
+
+    monkeypatch.setattr(lgb, "train", recording_train)
+    return calls
+
+
+def test_candidate_n_estimators_caps_the_rounds(train_calls):
+    X, y = make_data()
+    search = make_search(cv=3, early_stopping_rounds=5)
+    folds = search.build_folds(X.to_numpy(), y.to_numpy())
+    result = search.evaluate({"num_leaves": 4, "n_estimators": 7}, folds, 30)
+    assert result["rounds"] == 7 and [rounds for rounds, _ in train_calls] == [7, 7, 7]
+    assert result["converged"] # More rounds are not allowed, so a later rung would change nothing
+
+
+def test_score_and_best_iteration_are_fold_means(train_calls):
+    X, y = make_data()
+    search = make_search(cv=3, early_stopping_rounds=5)
+    folds = search.build_folds(X.to_numpy(), y.to_numpy())
+    result = search.evaluate({"num_leaves": 15, "learning_rate": 0.5}, folds, 200)
+    best_iterations = [best for _, best in train_calls]
+    assert max(best_iterations) + 5 <= 200 and result["converged"]
+    assert result["best_iteration"] == int(np.mean(best_iterations))
+
+
+def test_refit_uses_the_mean_best_iteration(train_calls):
+    X, y = make_data()
+    search = SuccessiveHalvingSearch({"num_leaves": [4, 15], "learning_rate": [0.3]}, n_candidates=2, eta=2,
+                                     min_rounds=20, max_rounds=200, early_stopping_rounds=5, cv=3).fit(X, y)
+    final = [entry for entry in search.history_ if entry["score"] == search.best_score_][-1]
+    assert final["converged"] and final["best_iteration"] < 200
+    assert search.best_params_["n_estimators"] == final["best_iteration"]
+    assert search.best_estimator_.n_estimators == search.best_estimator_.booster_.num_trees() == final["best_iteration"]
+    assert search.best_estimator_.feature_name_ == list(X.columns)
+    assert 0 < search.time_to_best_ <= search.history_[-1]["elapsed"]
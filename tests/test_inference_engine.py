@@ -0,0 +1,99 @@
+# Parity tests for the NumPy tree engine (src/inference_engine.py): the engine built from a fitted model must give
+# the booster's own probabilities, including rows with missing values and models whose trees never split.
+#   python -m pytest tests
+import numpy as np
+import pytest
+from lightgbm import LGBMClassifier
+from sklearn.preprocessing import RobustScaler
+from src.inference_engine import MISSING_TYPES, TreeEngine
+
+TOLERANCE = 1e-9
+
+
+def make_data(n_rows: int = 600, n_features: int = 5, missing_rate: float = 0.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features))
+    y = (X[:, 0] + 0.5 * X[:, 1] - X[:, 2] * X[:, 3] + rng.normal(scale=0.5, size=n_rows) > 0).astype(int)
+    if missing_rate:
+        X[rng.uniform(size=X.shape) < missing_rate] = np.nan
+    return X, y
+
+
+def fit(X, y, **params):
+    scaler = RobustScaler().fit(X)
+    params = {"n_estimators": 30, "num_leaves": 15, "min_child_samples": 5, "verbose": -1, **params}
+    model = LGBMClassifier(**params).fit(scaler.transform(X), y)
+    return model, scaler, TreeEngine.from_model(model, scaler)
+
+
+def assert_parity(model, scaler, engine, X):
+    X_scaled = scaler.transform(X)
+    np.testing.assert_allclose(engine.proba_from_scaled(X_scaled), model.booster_.predict(X_scaled), rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X_scaled)[:, 1], rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(engine.raw_score(X_scaled), model.booster_.predict(X_scaled, raw_score=True), rtol=0, atol=TOLERANCE)
+
+
+def split_nodes(engine):
+    return engine.left != engine.right # Leaves loop onto themselves
+
+
+def test_matches_booster_without_missing_values():
+    X, y = make_data()
+    model, scaler, engine = fit(X, y)
+    X_test, _ = make_data(seed=1)
+    assert_parity(model, scaler, engine, X_test)
+
+
+def test_routes_nan_like_booster_when_trained_with_missing_values():
+    X, y = make_data(missing_rate=0.2)
+    model, scaler, engine = fit(X, y)
+    splits = split_nodes(engine)
+    assert (engine.missing_type[splits] == MISSING_TYPES["NaN"]).any()
+    assert engine.default_left[splits].any() and not engine.default_left[splits].all() # Both default directions
+    X_test, _ = make_data(missing_rate=0.3, seed=1)
+    assert_parity(model, scaler, engine, X_test)
+
+
+def test_routes_nan_like_booster_when_trained_without_missing_values():
+    X, y = make_data()
+    model, scaler, engine = fit(X, y)
+    assert (engine.missing_type[split_nodes(engine)] == MISSING_TYPES["None"]).all() # NaN is then read as 0
+    X_test, _ = make_data(missing_rate=0.3, seed=1)
+    assert_parity(model, scaler, engine, X_test)
+
+
+def test_routes_zero_as_missing_like_booster():
+    X, y = make_data(missing_rate=0.1)
+    X[np.random.default_rng(2).uniform(size=X.shape) < 0.1] = 0.0
+    model, scaler, engine = fit(X, y, zero_as_missing=True)
+    assert (engine.missing_type[split_nodes(engine)] == MISSING_TYPES["Zero"]).any()
+    X_test, _ = make_data(missing_rate=0.2, seed=1)
+    X_test[np.random.default_rng(3).uniform(size=X_test.shape) < 0.2] = 0.0
+    X_test[0] = scaler.center_ # Scales to exactly zero in every column
+    assert_parity(model, scaler, engine, X_test)
+
+
+def test_single_leaf_trees():
+    X, y = make_data(n_rows=100)
+    model, scaler, engine = fit(X, y, min_child_samples=1000) # Too few rows for any split
+    assert engine.max_depth == 0 and not split_nodes(engine).any()
+    X_test, _ = make_data(n_rows=50, missing_rate=0.2, seed=1)
+    assert_parity(model, scaler, engine, X_test)
+
+
+@pytest.mark.parametrize("n_rows", [1, 7])
+def test_small_batches_and_save_load(tmp_path, n_rows):
+    X, y = make_data(missing_rate=0.1)
+    model, scaler, engine = fit(X, y)
+    path = str(tmp_path / "engine.npz")
+    engine.save(path)
+    X_test, _ = make_data(n_rows=n_rows, missing_rate=0.2, seed=1)
+    assert_parity(model, scaler, TreeEngine.load(path), X_test)
+
+
+def test_rejects_multiclass_models():
+    X, _ = make_data()
+    y = np.arange(len(X)) % 3
+    model = LGBMClassifier(n_estimators=2, verbose=-1).fit(X, y)
+    with pytest.raises(ValueError):
+        TreeEngine.from_model(model, RobustScaler().fit(X))
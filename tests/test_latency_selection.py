@@ -0,0 +1,96 @@
+# Tests for latency-aware model selection (src/latency_selection.py): the Pareto front and the budget must pick the
+# expected candidate from a fixed table of scores and latencies, and a pruned model must predict exactly what the
+# full model predicts with num_iteration set to the iterations it kept.
+#   python -m pytest tests
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from lightgbm import LGBMClassifier
+from src.latency_selection import iteration_gains, pareto_front, prune_trailing_iterations, select_within_budget
+
+# score, p99_ms, batch_us_per_row of eight candidates
+TABLE = [
+    (0.80, 1.0, 9.0), # 0: fastest on p99
+    (0.78, 1.5, 1.0), # 1: slower and worse than 0 on p99, fastest per batch row
+    (0.84, 2.0, 5.0), # 2
+    (0.84, 2.5, 4.0), # 3: same score as 2, slower on p99
+    (0.83, 3.0, 3.0), # 4: slower and worse than 2 on p99
+    (0.86, 4.0, 8.0), # 5
+    (0.90, 6.0, 7.0), # 6: most accurate
+    (0.85, 6.0, 2.0), # 7: as slow as 6 on p99, less accurate
+]
+RESULTS = [{"score": score, "p99_ms": p99, "batch_us_per_row": batch} for score, p99, batch in TABLE]
+
+
+def test_pareto_front_keeps_the_candidates_nothing_beats_fastest_first():
+    assert pareto_front(RESULTS) == [0, 2, 5, 6]
+    assert pareto_front(RESULTS, "batch_us_per_row") == [1, 7, 6] # 3 and 2 are slower than 7 per row and less accurate
+
+
+@pytest.mark.parametrize("budget, expected", [
+    (1.0, 0), # Only the fastest fits
+    (2.4, 2), # 3 ties 2 on score but is slower, so it is never on the front
+    (3.9, 2), # 4 fits the budget but is dominated by 2
+    (4.0, 5), # On the budget counts as within
+    (10.0, 6),
+])
+def test_budget_picks_the_most_accurate_candidate_within_it(budget, expected):
+    selected, front = select_within_budget(RESULTS, budget)
+    assert selected == expected and front == [0, 2, 5, 6]
+
+
+def test_budget_picks_on_the_configured_latency_metric():
+    assert select_within_budget(RESULTS, 5.0, "batch_us_per_row") == (7, [1, 7, 6])
+    assert select_within_budget(RESULTS, 1.5, "batch_us_per_row")[0] == 1
+
+
+def test_no_candidate_within_the_budget_takes_the_fastest():
+    assert select_within_budget(RESULTS, 0.5) == (0, [0, 2, 5, 6])
+
+
+def make_data(n_rows: int = 1500, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n_rows, 4)), columns=["Glucose", "BMI", "Age", "Insulin"])
+    X.loc[rng.uniform(size=n_rows) < 0.1, "Insulin"] = np.nan
+    y = (X["Glucose"] + 0.5 * X["BMI"] + rng.normal(scale=0.5, size=n_rows) > 0).astype(int)
+    return X, y
+
+
+def fit(X, y, n_estimators: int = 60):
+    return LGBMClassifier(n_estimators=n_estimators, learning_rate=0.3, num_leaves=7, verbose=-1).fit(X, y)
+
+
+def test_pruned_model_predicts_like_the_first_iterations(tmp_path):
+    X, y = make_data()
+    model = fit(X, y)
+    gains = iteration_gains(model.booster_)
+    assert len(gains) == 60 and gains[:10].sum() > gains[-10:].sum() # Later trees fit what is left, with less gain
+
+    pruned = prune_trailing_iterations(model, 0.05, X, y)
+    keep = pruned.n_estimators
+    assert 1 <= keep < 60 and pruned.booster_.num_trees() == keep
+    tail = gains[keep:].sum() / gains.sum()
+    assert tail <= 0.05 < gains[keep - 1:].sum() / gains.sum() # As many dropped as the fraction allows, no more
+    assert model.booster_.num_trees() == 60 # The full model is left alone
+
+    X_test, _ = make_data(seed=1)
+    expected = model.predict_proba(X_test, num_iteration=keep)
+    np.testing.assert_array_equal(pruned.predict_proba(X_test), expected)
+    np.testing.assert_array_equal(pruned.booster_.predict(X_test), model.booster_.predict(X_test, num_iteration=keep))
+    np.testing.assert_array_equal(pruned.predict(X_test), model.predict(X_test, num_iteration=keep))
+    assert list(pruned.classes_) == [0, 1] and pruned.feature_name_ == model.feature_name_
+    assert pruned.get_params()["learning_rate"] == 0.3
+
+    path = str(tmp_path / "model.joblib") # The artifact the server loads
+    joblib.dump(pruned, path)
+    np.testing.assert_array_equal(joblib.load(path).predict_proba(X_test), expected)
+
+
+def test_nothing_to_prune_returns_the_model_itself():
+    X, y = make_data()
+    model = fit(X, y, n_estimators=20)
+    assert prune_trailing_iterations(model, 0.0, X, y) is model # Every iteration holds some gain
+    single = fit(X, y, n_estimators=1)
+    assert prune_trailing_iterations(single, 0.5, X, y) is single
+    assert prune_trailing_iterations(model, 1.0, X, y).n_estimators == 1 # At least one iteration is kept
@@ -0,0 +1,158 @@
+# Tests for versioned model bundles (src/model_bundle.py): publishing moves CURRENT, a BundleManager follows it and
+# rolls back from memory or from disk, pruning keeps the served bundle and never touches bundles another process is
+# still writing, and the watcher skips a bundle it cannot load.
+#   python -m pytest tests
+import json
+import os
+import time
+import numpy as np
+import pytest
+import src.model_bundle as model_bundle
+from src.model_bundle import (BUNDLE_FILES, MANIFEST_FILE, BundleManager, ModelBundle, current_version, list_versions,
+                              publish_bundle, set_current)
+
+TIMEOUT = 5.0
+
+
+class Clock: # Stands in for the time module inside src.model_bundle; every timestamp is one second after the last
+
+    def __init__(self):
+        self.now = time.mktime((2026, 1, 1, 0, 0, 0, 0, 0, 0))
+
+    def strftime(self, fmt):
+        self.now += 1
+        return time.strftime(fmt, time.localtime(self.now))
+
+    def __getattr__(self, name): # time(), perf_counter(), sleep()
+        return getattr(time, name)
+
+
+class StubPredictor: # Constant probabilities; the manager only needs warm_up() to succeed
+
+    def predict(self, X_raw):
+        return np.zeros(len(X_raw), dtype=int), np.full(len(X_raw), 0.5)
+
+
+@pytest.fixture
+def bundles_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_bundle, "time", Clock()) # Versions sort by creation even within one real second
+    return str(tmp_path / "bundles")
+
+
+def publish(bundles_dir, tmp_path, content: str, **kwargs) -> str:
+    files = {}
+    for role in ["model", "engine", "transform", "scaler"]:
+        path = tmp_path / f"{role}.src"
+        path.write_text(f"{role} {content}")
+        files[role] = str(path)
+    return publish_bundle(bundles_dir, files, run_id=f"run-{content}", **kwargs)
+
+
+class Loader: # version -> ModelBundle, recording which versions were loaded from disk
+
+    def __init__(self, bundles_dir, broken=()):
+        self.bundles_dir = bundles_dir
+        self.broken = set(broken)
+        self.loads = []
+
+    def __call__(self, version):
+        self.loads.append(version)
+        if version in self.broken:
+            raise ValueError(f"bundle {version} is broken")
+        with open(os.path.join(self.bundles_dir, version, MANIFEST_FILE)) as f:
+            return ModelBundle(version, StubPredictor(), json.load(f))
+
+
+def test_published_bundle_holds_copies_and_their_hashes(bundles_dir, tmp_path):
+    version = publish(bundles_dir, tmp_path, "a")
+    assert current_version(bundles_dir) == version and list_versions(bundles_dir) == [version]
+    path = os.path.join(bundles_dir, version)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    assert manifest["version"] == version and manifest["mlflow_run_id"] == "run-a"
+    assert sorted(manifest["files"]) == sorted(BUNDLE_FILES[role] for role in ["model", "engine", "transform", "scaler"])
+    for name, digest in manifest["files"].items():
+        assert model_bundle.sha256_file(os.path.join(path, name)) == digest
+    with open(os.path.join(path, BUNDLE_FILES["model"])) as f:
+        assert f.read() == "model a"
+    assert not [name for name in os.listdir(bundles_dir) if name.endswith(".tmp")]
+
+
+def test_publish_reload_and_rollback(bundles_dir, tmp_path):
+    first = publish(bundles_dir, tmp_path, "a")
+    loader, swaps = Loader(bundles_dir), []
+    manager = BundleManager(bundles_dir, loader, poll_seconds=0, keep_loaded=1, on_swap=lambda new, old: swaps.append(
+        (new.version, old.version)))
+    assert manager.start().version == first
+
+    second = publish(bundles_dir, tmp_path, "b")
+    assert second > first and current_version(bundles_dir) == second
+    assert manager.active.version == first # Nothing changes until the manager reloads
+    assert manager.reload().version == second and manager.reload() is manager.active # The second call has nothing to do
+    assert loader.loads == [first, second] and swaps == [(second, first)]
+
+    assert manager.rollback().version == first
+    assert current_version(bundles_dir) == first # The other processes follow the pointer
+    assert loader.loads == [first, second] # Rolled back from memory, nothing loaded
+    assert manager.rollback().version == second # The bundle rolled back from is now the one in memory
+    assert loader.loads == [first, second] and swaps == [(second, first), (first, second), (second, first)]
+    status = manager.status()
+    assert status["version"] == second == status["current_pointer"] and status["in_memory"] == [first]
+    assert status["mlflow_run_id"] == "run-b" and status["on_disk"] == [first, second]
+
+
+def test_rollback_without_a_bundle_in_memory_loads_the_previous_version(bundles_dir, tmp_path):
+    first, second, third = [publish(bundles_dir, tmp_path, content) for content in "abc"]
+    loader = Loader(bundles_dir)
+    manager = BundleManager(bundles_dir, loader, poll_seconds=0, keep_loaded=0)
+    manager.start()
+    assert manager.rollback().version == second and manager.rollback().version == first
+    assert loader.loads == [third, second, first] and current_version(bundles_dir) == first
+    with pytest.raises(LookupError):
+        manager.rollback()
+
+
+def test_pruning_keeps_the_served_bundle_and_bundles_being_written(bundles_dir, tmp_path):
+    served = publish(bundles_dir, tmp_path, "a")
+    writing = os.path.join(bundles_dir, ".20260101T000000-deadbeef.4242.tmp") # Another process is still copying into it
+    os.makedirs(writing)
+    with open(os.path.join(writing, MANIFEST_FILE), "w") as f:
+        f.write("{}")
+    published = [publish(bundles_dir, tmp_path, content, keep=2, activate=False) for content in "bcde"]
+    assert current_version(bundles_dir) == served
+    assert list_versions(bundles_dir) == [served] + published[-2:] # The two newest, plus the one being served
+    assert os.path.isdir(writing) and os.path.exists(os.path.join(writing, MANIFEST_FILE))
+
+    set_current(bundles_dir, published[-1])
+    newest = publish(bundles_dir, tmp_path, "f", keep=1)
+    assert list_versions(bundles_dir) == [newest] and os.path.isdir(writing)
+
+
+def test_pointer_to_a_missing_bundle_is_refused(bundles_dir, tmp_path):
+    version = publish(bundles_dir, tmp_path, "a")
+    with pytest.raises(FileNotFoundError):
+        set_current(bundles_dir, "20990101T000000-00000000")
+    assert current_version(bundles_dir) == version
+
+
+def test_watcher_follows_the_pointer_and_skips_a_broken_bundle(bundles_dir, tmp_path):
+    first = publish(bundles_dir, tmp_path, "a")
+    broken = publish(bundles_dir, tmp_path, "b", activate=False)
+    loader = Loader(bundles_dir, broken=[broken])
+    manager = BundleManager(bundles_dir, loader, poll_seconds=0.01)
+    set_current(bundles_dir, first)
+    manager.start()
+    manager.ensure_watcher()
+
+    set_current(bundles_dir, broken)
+    deadline = time.monotonic() + TIMEOUT
+    while manager._failed != broken and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager._failed == broken and manager.active.version == first # The active bundle keeps serving
+    time.sleep(0.1)
+    assert loader.loads.count(broken) == 1 # Not retried until the pointer changes
+
+    fixed = publish(bundles_dir, tmp_path, "c")
+    while manager.active.version != fixed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager.active.version == fixed
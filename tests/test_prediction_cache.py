@@ -0,0 +1,107 @@
+# Tests for the serving prediction cache (src/prediction_cache.py): least recently used entries are evicted first,
+# entries expire after their TTL, a changed model artifact drops everything, keys fold -0.0 and rounding noise
+# together, rows with NaN are never stored, and the counters in stats() follow all of it.
+#   python -m pytest tests
+import os
+import pytest
+import src.prediction_cache as prediction_cache
+from src.prediction_cache import PredictionCache
+
+
+class Clock: # Stands in for the time module inside src.prediction_cache
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prediction_cache, "time", clock)
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    cache = PredictionCache(max_size=3)
+    for name in "abc":
+        cache.put(name, name.upper())
+    assert cache.get("a") == "A" # "a" is now the most recently used, "b" the least
+    cache.put("d", "D")
+    assert cache.get("b") is None
+    assert [cache.get(name) for name in "acd"] == ["A", "C", "D"]
+    cache.put("c", "C2") # Overwriting refreshes too, so "a" goes next
+    cache.put("e", "E")
+    assert cache.get("a") is None and cache.get("c") == "C2"
+    stats = cache.stats()
+    assert stats["size"] == 3 and stats["evictions"] == 2
+    assert stats["hits"] == 5 and stats["misses"] == 2 and stats["hit_rate"] == 5 / 7
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put("a", 1)
+    clock.now += 5
+    cache.put("b", 2)
+    clock.now += 4.9
+    assert cache.get("a") == 1 # Reading does not extend the TTL
+    clock.now += 0.1
+    assert cache.get("a") is None and cache.get("b") == 2
+    clock.now += 5
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 2 and stats["size"] == 0
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["evictions"] == 0
+
+
+def test_changed_artifact_drops_every_entry(clock, tmp_path):
+    model = tmp_path / "model.pkl"
+    model.write_bytes(b"first model")
+    cache = PredictionCache(artifact_paths=[str(model), str(tmp_path / "scaler.pkl")], check_interval=1.0)
+    cache.put("a", 1)
+    clock.now += 1
+    assert cache.get("a") == 1 # Checked, nothing changed (the missing scaler stays missing)
+
+    model.write_bytes(b"second model, retrained")
+    assert cache.get("a") == 1 # Not checked again before check_interval
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
+
+    cache.put("a", 2)
+    os.utime(model, ns=(0, 123)) # Same size, new mtime: a file replaced in place
+    (tmp_path / "scaler.pkl").write_bytes(b"scaler")
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_keys_fold_negative_zero_and_rounding_noise():
+    cache = PredictionCache(decimals=2)
+    assert cache.make_key([-0.0, 1.0]) == cache.make_key([0.0, 1.0])
+    assert cache.make_key([-0.001, 1.004]) == cache.make_key([0.0, 1.0]) # Rounds to -0.0, then folded
+    assert cache.make_key([0.1 + 0.2, 148]) == cache.make_key([0.3, 148.0])
+    assert cache.make_key([1.006, 2]) != cache.make_key([1.0, 2])
+    assert str(cache.make_key([-0.0])) == "(0.0,)"
+
+
+def test_rows_with_nan_are_not_cached():
+    cache = PredictionCache(max_size=2)
+    assert cache.make_key([1.0, float("nan")]) is None
+    assert cache.make_key([float("nan")]) is None
+    cache.put(cache.make_key([1.0, 2.0]), "kept")
+    assert cache.get(cache.make_key([1.0, 2.0])) == "kept"
+    stats = cache.stats()
+    assert stats["skipped"] == 2 and stats["size"] == 1 and stats["misses"] == 0 # Skipped rows are no lookups
+
+
+def test_clear_keeps_the_counters(clock):
+    cache = PredictionCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.clear()
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["size"] == 0 and stats["hits"] == 1 and stats["misses"] == 1
@@ -0,0 +1,140 @@
+# Accuracy tests for the KLL quantile sketch (src/quantile_sketch.py) and the streaming fit built on it
+# (src/feature_transform.py): sketch quantiles must be within the sketch's rank error of np.quantile, alone and after
+# merging, and a chunked StreamingTransformFitter must give the FeatureTransform that fit() gives on all rows.
+#   python -m pytest tests
+import numpy as np
+import pytest
+from src.feature_transform import RAW_FEATURES, FeatureTransform, StreamingTransformFitter, add_interaction_features
+from src.quantile_sketch import KLLSketch, k_for_rank_error
+
+LEVELS = np.linspace(0.0, 1.0, 41)
+
+
+def rank_gap(data: np.ndarray, value: float, q: float) -> float: # Distance from q to the ranks value covers in data
+    data = np.sort(data[~np.isnan(data)])
+    low = np.searchsorted(data, value, side="left") / max(data.size - 1, 1)
+    high = (np.searchsorted(data, value, side="right") - 1) / max(data.size - 1, 1)
+    return max(low - q, q - high, 0.0)
+
+
+def assert_quantiles(sketch: KLLSketch, data: np.ndarray, levels=LEVELS):
+    estimates = sketch.quantile(levels)
+    gaps = [rank_gap(data, value, q) for value, q in zip(estimates, levels)]
+    assert max(gaps) <= sketch.rank_error, f"rank error {max(gaps):.4f} above {sketch.rank_error:.4f}"
+    assert np.isin(estimates, data).all() # Sketch values are always observed values
+
+
+def distributions(n: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {
+        "normal": rng.normal(size=n),
+        "lognormal": rng.lognormal(sigma=2.0, size=n),
+        "few values": rng.integers(0, 5, size=n).astype(np.float64),
+        "sorted": np.sort(rng.uniform(size=n)),
+    }
+
+
+@pytest.mark.parametrize("name", list(distributions(1)))
+@pytest.mark.parametrize("rank_error", [0.01, 0.005])
+def test_quantiles_within_rank_error(name, rank_error):
+    data = distributions(200_000)[name]
+    sketch = KLLSketch(k=k_for_rank_error(rank_error))
+    for chunk in np.array_split(data, 37):
+        sketch.update(chunk)
+    assert sketch.count == data.size
+    assert sketch.rank_error <= rank_error
+    assert sum(items.size for items in sketch.levels) < data.size / 50 # The point of the sketch
+    assert_quantiles(sketch, data)
+
+
+@pytest.mark.parametrize("name", list(distributions(1)))
+def test_merged_quantiles_within_rank_error(name):
+    data = distributions(200_000, seed=1)[name]
+    parts = np.array_split(data, [10_000, 50_000, 150_000]) # Workers that saw very different amounts
+    sketches = []
+    for seed, part in enumerate(parts):
+        sketch = KLLSketch(k=k_for_rank_error(0.005), seed=seed)
+        for chunk in np.array_split(part, 5):
+            sketch.update(chunk)
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert merged.count == data.size
+    assert_quantiles(merged, data)
+
+
+def test_small_inputs_are_exact():
+    data = np.random.default_rng(2).normal(size=100)
+    sketch = KLLSketch(k=200)
+    sketch.update(data)
+    np.testing.assert_array_equal(sketch.quantile(LEVELS), np.quantile(data, LEVELS, method="lower")) # Nothing compacted yet
+
+
+def test_weighted_update_counts_like_repeated_values():
+    rng = np.random.default_rng(3)
+    data, repeated = rng.normal(size=50_000), rng.normal(loc=3.0, size=10)
+    weighted, expanded = KLLSketch(k=400), KLLSketch(k=400)
+    weighted.update(data)
+    weighted.update(repeated, weight=2_000)
+    expanded.update(np.concatenate([data, np.repeat(repeated, 2_000)]))
+    assert weighted.count == expanded.count == data.size + repeated.size * 2_000
+    assert_quantiles(weighted, np.concatenate([data, np.repeat(repeated, 2_000)]))
+
+
+def test_nan_is_ignored_and_empty_sketch_has_no_quantiles():
+    sketch = KLLSketch()
+    assert np.isnan(sketch.quantile(0.5))
+    sketch.update(np.array([np.nan, 1.0, np.nan, 2.0, 3.0]))
+    assert sketch.count == 3 and sketch.quantile(0.5) == 2.0
+
+
+def raw_rows(n: int, seed: int = 0) -> np.ndarray: # Raw inputs in the ranges of the diabetes data, some missing
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.poisson(3.8, n), rng.normal(121, 32, n), rng.normal(69, 19, n), rng.gamma(2.0, 10.0, n),
+        rng.gamma(0.8, 100.0, n), rng.normal(32, 8, n), rng.lognormal(-0.9, 0.6, n), rng.integers(21, 82, n),
+    ]).astype(np.float64)
+    assert X.shape[1] == len(RAW_FEATURES)
+    X[rng.uniform(size=X.shape) < 0.05] = np.nan
+    X[:, 4][rng.uniform(size=n) < 0.3] = np.nan # A column with many missing values, as Insulin
+    return X
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_streaming_fit_matches_exact_fit(workers):
+    X = raw_rows(120_000)
+    exact = FeatureTransform().fit(X)
+    fitters = [StreamingTransformFitter(rank_error=0.005, seed=10 * i) for i in range(workers)]
+    for i, chunk in enumerate(np.array_split(X, 24)):
+        fitters[i % workers].partial_fit(chunk)
+    for other in fitters[1:]:
+        fitters[0].merge(other)
+    streamed = fitters[0].finalize()
+
+    assert streamed.numerical_columns == exact.numerical_columns
+    np.testing.assert_allclose(streamed.mean_, exact.mean_, rtol=1e-9) # Means are exact, only the quantiles are sketched
+
+    # The sketched median and quartiles are compared in rank space, on the columns as the fitter imputed them (the
+    # imputed value is often the median itself, so it must be the same float)
+    features = add_interaction_features(X)[:, exact.columns_]
+    features = np.where(np.isnan(features), streamed.mean_, features)
+    q_low, q_high = np.array(exact.quantile_range) / 100.0
+    for i in range(features.shape[1]):
+        assert rank_gap(features[:, i], streamed.center_[i], 0.5) <= fitters[0].rank_error
+    q_min, median, q_max = fitters[0].quantiles()
+    np.testing.assert_array_equal(median, streamed.center_)
+    for i in range(features.shape[1]):
+        assert rank_gap(features[:, i], q_min[i], q_low) <= fitters[0].rank_error
+        assert rank_gap(features[:, i], q_max[i], q_high) <= fitters[0].rank_error
+    # The IQR is a difference of two such estimates, so it lies between the exact IQRs of the narrowest and widest
+    # quantile pairs the rank error allows (np.percentile interpolates, the sketch returns observed values)
+    error = fitters[0].rank_error
+    low, high = np.quantile(features, [q_low - error, q_low + error, q_high - error, q_high + error], axis=0).reshape(2, 2, -1)
+    assert (streamed.scale_ >= high[0] - low[1] - 1e-9).all() and (streamed.scale_ <= high[1] - low[0] + 1e-9).all()
+    np.testing.assert_allclose(streamed.scale_, exact.scale_, rtol=0.1)
+
+
+def test_merge_rejects_different_columns():
+    with pytest.raises(ValueError):
+        StreamingTransformFitter().merge(StreamingTransformFitter(numerical_columns=RAW_FEATURES))
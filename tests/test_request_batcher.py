@@ -0,0 +1,137 @@
+# Concurrency tests for the micro-batcher (src/request_batcher.py): every request gets its own row's result, a
+# failing batch fails only its own requests, and close()/reopen() never strand a request, even while a batch is
+# still being scored.
+#   python -m pytest tests
+import threading
+import time
+import numpy as np
+import pytest
+from src.request_batcher import MicroBatcher
+
+TIMEOUT = 5.0
+
+
+class EchoPredictor: # Label and probability derived from the row itself, so results can be matched to requests
+
+    def __init__(self, gate: threading.Event = None):
+        self.gate = gate # While cleared, predict() blocks after signalling that a batch is in flight
+        self.in_flight = threading.Event()
+        self.batches = []
+        self.threads = []
+
+    def predict(self, X_raw: np.ndarray):
+        self.batches.append(len(X_raw))
+        self.threads.append(threading.current_thread().name)
+        if self.gate is not None:
+            self.in_flight.set()
+            assert self.gate.wait(TIMEOUT)
+        if np.isnan(X_raw).any():
+            raise ValueError("bad row in batch")
+        return (X_raw[:, 0] > 0).astype(int), X_raw[:, 0] / 1000.0
+
+
+def submit_all(batcher, values) -> list:
+    return [batcher.submit([value, 1.0]) for value in values]
+
+
+def test_results_go_back_to_their_own_requests():
+    predictor = EchoPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=16, max_wait_ms=20)
+    values = list(range(-50, 50))
+    results = [None] * len(values)
+
+    def request(i):
+        results[i] = batcher.predict([values[i], 1.0], timeout=TIMEOUT)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(values))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [(int(value > 0), value / 1000.0) for value in values]
+    assert max(predictor.batches) > 1 and max(predictor.batches) <= 16 # Coalesced, never above the limit
+    stats = batcher.stats()
+    assert stats["rows"] == len(values) and stats["batches"] == len(predictor.batches)
+
+
+def test_failed_batch_fails_only_its_requests_and_the_worker_survives():
+    gate = threading.Event()
+    predictor = EchoPredictor(gate)
+    batcher = MicroBatcher(predictor, max_batch_size=8, max_wait_ms=1)
+    blocker = batcher.submit([1.0, 1.0]) # Holds the worker so the next rows are collected into one batch
+    assert predictor.in_flight.wait(TIMEOUT)
+    bad_batch = submit_all(batcher, [2.0, np.nan, 3.0])
+    gate.set()
+    assert blocker.result(TIMEOUT) == (1, 0.001)
+    for future in bad_batch:
+        with pytest.raises(ValueError, match="bad row"):
+            future.result(TIMEOUT)
+    assert batcher.predict([4.0, 1.0], timeout=TIMEOUT) == (1, 0.004)
+
+
+def test_rows_queued_before_close_are_batched_and_later_rows_scored_directly():
+    gate = threading.Event()
+    predictor = EchoPredictor(gate)
+    batcher = MicroBatcher(predictor, max_batch_size=8, max_wait_ms=1)
+    first = batcher.submit([1.0, 1.0])
+    assert predictor.in_flight.wait(TIMEOUT)
+    queued = submit_all(batcher, [2.0, 3.0, 4.0])
+    batcher.close()
+    predictor.gate = None
+    after = submit_all(batcher, [5.0]) # Scored on this thread, while the worker is still blocked
+    assert after[0].done() and predictor.threads[-1] == threading.current_thread().name
+    gate.set()
+    assert [f.result(TIMEOUT)[1] for f in [first, *queued, *after]] == [0.001, 0.002, 0.003, 0.004, 0.005]
+    assert predictor.threads.count("micro-batcher") == 2 # The first row, then the three queued before close()
+    batcher._worker.join(TIMEOUT)
+    assert not batcher._worker.is_alive()
+
+
+def test_reopen_while_a_batch_is_in_flight_does_not_strand_requests():
+    gate = threading.Event()
+    predictor = EchoPredictor(gate)
+    batcher = MicroBatcher(predictor, max_batch_size=8, max_wait_ms=1)
+    slow = batcher.submit([1.0, 1.0])
+    assert predictor.in_flight.wait(TIMEOUT)
+    old_worker = batcher._worker
+    batcher.close()
+    batcher.reopen() # The old worker is still scoring and its stop sentinel is still queued
+    predictor.gate = None # Rows from now on are scored without blocking
+    start = time.perf_counter()
+    assert batcher.predict([2.0, 1.0], timeout=TIMEOUT) == (1, 0.002)
+    assert time.perf_counter() - start < 1.0
+    assert batcher._worker is not old_worker and old_worker.is_alive()
+    gate.set()
+    assert slow.result(TIMEOUT) == (1, 0.001)
+    old_worker.join(TIMEOUT)
+    assert not old_worker.is_alive()
+    assert batcher.predict([3.0, 1.0], timeout=TIMEOUT) == (1, 0.003) # The new worker keeps batching
+
+
+def test_close_and_reopen_under_concurrent_requests():
+    predictor = EchoPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=16, max_wait_ms=1)
+    errors, done = [], threading.Event()
+
+    def requests(offset):
+        i = 0
+        while not done.is_set():
+            value = offset + i
+            try:
+                assert batcher.predict([value, 1.0], timeout=TIMEOUT) == (1, value / 1000.0)
+            except Exception as e:
+                errors.append(e)
+            i += 1
+
+    threads = [threading.Thread(target=requests, args=(1 + 100_000 * n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for _ in range(50):
+        batcher.close()
+        time.sleep(0.001)
+        batcher.reopen()
+        time.sleep(0.001)
+    done.set()
+    for thread in threads:
+        thread.join()
+    assert not errors
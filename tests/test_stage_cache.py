@@ -0,0 +1,153 @@
+# Tests for the pipeline stage cache (pipeline/stage_cache.py) on a small project in a temporary directory: editing
+# an imported module, an input file or a config section reruns only the stages that depend on it, and --force and
+# --from-stage rerun everything or a suffix of the stages but cannot be combined.
+#   python -m pytest tests
+import json
+import os
+import subprocess
+import sys
+import pytest
+from pipeline.stage_cache import Stage, StageCache, code_closure
+from src.custom_exception import CustomException
+
+PROJECT = {
+    "stages/__init__.py": "",
+    "stages/split.py": "from helpers import shared\nimport numpy as np\n",
+    "stages/train.py": "def run():\n    from helpers.other import fit # Deferred import\n    return fit\n",
+    "stages/report.py": "import json\n",
+    "helpers/__init__.py": "",
+    "helpers/shared.py": "SEED = 1\n",
+    "helpers/other.py": "from helpers import shared\ndef fit():\n    pass\n",
+    "data/raw.csv": "Glucose,Outcome\n148,1\n",
+    "data/notes.txt": "first notes\n",
+}
+
+
+def write(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # code_closure resolves modules from the working directory, as the pipeline does
+    for path, text in PROJECT.items():
+        write(path, text)
+
+
+class Pipeline: # Three stages: split reads the raw file, train reads the split, report reads notes and its config
+
+    def __init__(self):
+        self.ran = []
+        self.config = {"report": {"top_k": 3}, "unrelated": {"x": 1}}
+
+    def stages(self) -> list:
+        def split():
+            self.ran.append("split")
+            with open("data/raw.csv") as f:
+                write("out/split.csv", f.read().upper()) # Same output for the same input
+
+        def train():
+            self.ran.append("train")
+            with open("out/split.csv") as f:
+                write("out/model.txt", f"model of {len(f.read())} bytes\n")
+
+        def report():
+            self.ran.append("report")
+            write("out/report.txt", "report\n")
+
+        return [
+            Stage("split", split, inputs=["data/raw.csv"], code=code_closure("stages/split.py"), outputs=["out/split.csv"]),
+            Stage("train", train, inputs=["out/split.csv"], code=code_closure("stages/train.py"), outputs=["out/model.txt"]),
+            Stage("report", report, inputs=["data/notes.txt"], config_sections=["report"], code=code_closure("stages/report.py"),
+                  outputs=["out/report.txt"]),
+        ]
+
+    def run(self, **kwargs) -> list: # Names of the stages that ran; a new StageCache per run, as every pipeline run has
+        self.ran = []
+        StageCache("out/manifest.json", self.config).run_stages(self.stages(), **kwargs)
+        return self.ran
+
+
+def test_code_closure_follows_imports_at_any_depth(project):
+    assert code_closure("stages/split.py") == ["helpers/shared.py", "stages/split.py"] # numpy is not a project file
+    assert code_closure("stages/train.py") == ["helpers/other.py", "helpers/shared.py", "stages/train.py"]
+    assert code_closure("stages/report.py") == ["stages/report.py"]
+
+
+def test_unchanged_stages_are_skipped(project):
+    pipeline = Pipeline()
+    assert pipeline.run() == ["split", "train", "report"]
+    assert pipeline.run() == []
+    with open("out/manifest.json") as f:
+        assert sorted(json.load(f)["stages"]) == ["report", "split", "train"]
+
+
+def test_editing_an_imported_module_reruns_only_the_stages_that_import_it(project):
+    pipeline = Pipeline()
+    pipeline.run()
+    write("helpers/other.py", "from helpers import shared\ndef fit():\n    return 2\n")
+    assert pipeline.run() == ["train"]
+    write("stages/split.py", "from helpers import shared\nimport numpy as np # Edited\n")
+    assert pipeline.run() == ["split"] # It writes the same output again, so train stays up to date
+    write("helpers/shared.py", "SEED = 2\n") # Imported by split directly and by train through helpers.other
+    assert pipeline.run() == ["split", "train"]
+    write("stages/report.py", "import json\nimport os\n")
+    assert pipeline.run() == ["report"]
+
+
+def test_editing_an_input_file_reruns_its_stage_and_the_stages_reading_its_outputs(project):
+    pipeline = Pipeline()
+    pipeline.run()
+    write("data/notes.txt", "second notes\n")
+    assert pipeline.run() == ["report"]
+    write("data/raw.csv", "Glucose,Outcome\n148,1\n85,0\n")
+    assert pipeline.run() == ["split", "train"] # train only reruns because split's output changed
+
+
+def test_config_section_reruns_only_the_stages_reading_it(project):
+    pipeline = Pipeline()
+    pipeline.run()
+    pipeline.config["unrelated"]["x"] = 2
+    assert pipeline.run() == []
+    pipeline.config["report"]["top_k"] = 5
+    assert pipeline.run() == ["report"]
+
+
+def test_missing_or_edited_output_reruns_its_stage(project):
+    pipeline = Pipeline()
+    pipeline.run()
+    os.remove("out/report.txt")
+    assert pipeline.run() == ["report"]
+    write("out/model.txt", "edited by hand\n")
+    assert pipeline.run() == ["train"]
+
+
+def test_force_and_from_stage(project):
+    pipeline = Pipeline()
+    pipeline.run()
+    assert pipeline.run(force=True) == ["split", "train", "report"]
+    assert pipeline.run(from_stage="train") == ["train", "report"]
+    with pytest.raises(ValueError, match="not both"):
+        pipeline.run(force=True, from_stage="train")
+    with pytest.raises(ValueError, match="Unknown stage"):
+        pipeline.run(from_stage="deploy")
+    assert pipeline.ran == [] # Refused before any stage ran
+
+
+def test_failed_stage_is_not_recorded(project):
+    pipeline = Pipeline()
+    pipeline.run()
+    write("data/notes.txt", "second notes\n")
+    stages = pipeline.stages()
+    stages[2].run = lambda: 1 / 0
+    with pytest.raises(CustomException):
+        StageCache("out/manifest.json", pipeline.config).run_stages(stages)
+    assert pipeline.run() == ["report"]
+
+
+def test_command_line_refuses_force_with_from_stage():
+    result = subprocess.run([sys.executable, "-m", "pipeline.training_pipeline", "--force", "--from-stage", "train"],
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, timeout=120)
+    assert result.returncode == 2 and "not allowed with argument" in result.stderr
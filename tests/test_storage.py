@@ -0,0 +1,127 @@
+# Tests for the resumable downloader (src/storage.py) over a local directory standing in for a bucket: an
+# interrupted download fetches only the missing parts on the next run, an unchanged object is skipped through the
+# manifest, and a part that arrives corrupted fails the md5 check and leaves no .part/.part.json behind.
+#   python -m pytest tests
+import base64
+import hashlib
+import json
+import os
+import pytest
+from src.custom_exception import CustomException
+from src.storage import BlobDownloader, BlobInfo, LocalStorage
+
+PART_SIZE = 1000
+
+
+class MD5Storage(LocalStorage): # LocalStorage reporting md5 checksums as GCS does, with reads that can fail or corrupt
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.reads = [] # (name, start) of every range request
+        self.fail_at = set() # Offsets whose read raises, once
+        self.corrupt_at = set() # Offsets whose bytes come back altered
+
+    def _info(self, name: str) -> BlobInfo:
+        info = super()._info(name)
+        with open(os.path.join(self.root, name), "rb") as f:
+            digest = base64.b64encode(hashlib.md5(f.read()).digest()).decode()
+        return info._replace(checksum=f"md5:{digest}")
+
+    def read_range(self, name: str, start: int, end: int, generation=None) -> bytes:
+        self.reads.append((name, start))
+        if start in self.fail_at:
+            self.fail_at.discard(start)
+            raise ConnectionError(f"connection reset reading {name} at {start}")
+        data = super().read_range(name, start, end, generation)
+        if start in self.corrupt_at:
+            data = bytes([data[0] ^ 0xFF]) + data[1:]
+        return data
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    root = tmp_path / "bucket"
+    (root / "raw").mkdir(parents=True)
+    (root / "raw" / "data.csv").write_bytes(os.urandom(5500)) # Six parts, the last one short
+    (root / "raw" / "small.csv").write_bytes(b"Glucose,BMI\n148,33.6\n")
+    return MD5Storage(str(root))
+
+
+def targets(storage, tmp_path) -> list:
+    return [(info, str(tmp_path / "local" / os.path.basename(info.name))) for info in storage.list_blobs("raw/")]
+
+
+def downloader(storage, tmp_path) -> BlobDownloader: # A new instance per run, as every ingestion run builds its own
+    return BlobDownloader(storage, str(tmp_path / "local" / "manifest.json"), max_workers=4, part_size=PART_SIZE)
+
+
+def assert_downloaded(storage, path: str, name: str):
+    with open(path, "rb") as local, open(os.path.join(storage.root, name), "rb") as remote:
+        assert local.read() == remote.read()
+    assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.json")
+
+
+def test_interrupted_download_resumes_only_the_missing_parts(bucket, tmp_path):
+    storage_targets = targets(bucket, tmp_path)
+    data_path = str(tmp_path / "local" / "data.csv")
+    bucket.fail_at = {2000, 4000}
+    with pytest.raises(CustomException):
+        downloader(bucket, tmp_path).sync(storage_targets)
+    assert not os.path.exists(data_path) and os.path.getsize(data_path + ".part") == 5500
+    with open(data_path + ".part.json") as f:
+        assert json.load(f)["done"] == [0, 1000, 3000, 5000]
+
+    bucket.reads.clear()
+    assert sorted(downloader(bucket, tmp_path).sync(storage_targets)) == sorted(path for _, path in storage_targets)
+    assert sorted(bucket.reads) == [("raw/data.csv", 2000), ("raw/data.csv", 4000)] # small.csv was complete in its .part
+    assert_downloaded(bucket, data_path, "raw/data.csv")
+    assert_downloaded(bucket, str(tmp_path / "local" / "small.csv"), "raw/small.csv")
+
+
+def test_unchanged_object_is_skipped_through_the_manifest(bucket, tmp_path):
+    downloader(bucket, tmp_path).sync(targets(bucket, tmp_path))
+    with open(tmp_path / "local" / "manifest.json") as f:
+        manifest = json.load(f)
+    data_path = str(tmp_path / "local" / "data.csv")
+    assert manifest[data_path]["checksum"] == bucket.stat("raw/data.csv").checksum and manifest[data_path]["size"] == 5500
+
+    bucket.reads.clear()
+    assert downloader(bucket, tmp_path).sync(targets(bucket, tmp_path)) == []
+    assert bucket.reads == []
+
+    with open(os.path.join(bucket.root, "raw", "small.csv"), "wb") as f: # A new version of one object, same size
+        f.write(b"Glucose,BMI\n183,23.3\n")
+    assert downloader(bucket, tmp_path).sync(targets(bucket, tmp_path)) == [str(tmp_path / "local" / "small.csv")]
+    assert bucket.reads == [("raw/small.csv", 0)]
+    assert_downloaded(bucket, str(tmp_path / "local" / "small.csv"), "raw/small.csv")
+
+    os.remove(data_path) # A local file that went missing is fetched again, whatever the manifest says
+    assert downloader(bucket, tmp_path).sync(targets(bucket, tmp_path)) == [data_path]
+
+
+def test_corrupted_part_fails_the_checksum_and_is_removed(bucket, tmp_path):
+    data_path = str(tmp_path / "local" / "data.csv")
+    bucket.corrupt_at = {3000}
+    with pytest.raises(CustomException) as error:
+        downloader(bucket, tmp_path).sync(targets(bucket, tmp_path))
+    assert isinstance(error.value.__context__, ValueError) and "Checksum mismatch" in str(error.value.__context__)
+    assert not os.path.exists(data_path)
+    assert not os.path.exists(data_path + ".part") and not os.path.exists(data_path + ".part.json")
+    assert data_path not in downloader(bucket, tmp_path).manifest # Only verified objects are recorded
+
+    bucket.corrupt_at, bucket.reads = set(), []
+    assert data_path in downloader(bucket, tmp_path).sync(targets(bucket, tmp_path))
+    assert sorted(start for name, start in bucket.reads if name == "raw/data.csv") == [0, 1000, 2000, 3000, 4000, 5000] # Starts over
+    assert_downloaded(bucket, data_path, "raw/data.csv")
+
+
+def test_new_generation_restarts_a_partial_download(bucket, tmp_path):
+    data_path = str(tmp_path / "local" / "data.csv")
+    bucket.fail_at = {1000}
+    with pytest.raises(CustomException):
+        downloader(bucket, tmp_path).sync(targets(bucket, tmp_path))
+    (tmp_path / "bucket" / "raw" / "data.csv").write_bytes(os.urandom(2500)) # Replaced before the rerun
+    bucket.reads.clear()
+    downloader(bucket, tmp_path).sync(targets(bucket, tmp_path))
+    assert sorted(start for name, start in bucket.reads if name == "raw/data.csv") == [0, 1000, 2000]
+    assert_downloaded(bucket, data_path, "raw/data.csv")
@@ -0,0 +1,148 @@
+# Multiprocess tests for the trial store (src/trial_store.py) and the search on top of it (src/trial_search.py),
+# over a temporary SQLite file: concurrent workers never claim the same trial, claims wait for another process's
+# write transaction, a trial held by a killed or silent worker is taken over, and a resumed search keeps the
+# finished trials and fold checkpoints instead of training them again.
+#   python -m pytest tests
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+from src.trial_search import StoredTrialSearch
+from src.trial_store import TrialStore, worker_name
+
+TIMEOUT = 30
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "trials" / "trials.db")
+
+
+def new_study(store_path: str, n_trials: int, stale_after: float = 900.0) -> TrialStore:
+    store = TrialStore(store_path, stale_after=stale_after)
+    store.create_study("study", "data.npz", {}, [{"num_leaves": 2 + i} for i in range(n_trials)])
+    return store
+
+
+def claim_until_empty(store_path: str, start_at: float, results): # Runs in a worker process; puts the trial ids it claimed
+    store = TrialStore(store_path)
+    worker = worker_name()
+    time.sleep(max(0.0, start_at - time.time())) # Every process starts claiming at the same moment
+    claimed = []
+    while (trial := store.claim("study", worker)) is not None:
+        claimed.append(trial[0])
+        time.sleep(0.02) # Training; without it one process can take every claim while the others are in SQLite's busy backoff
+        store.complete("study", trial[0], float(trial[0]))
+    results.put(claimed)
+
+
+def claim_one(store_path: str): # Runs in a worker process
+    return TrialStore(store_path).claim("study", worker_name())
+
+
+def hold_trial(store_path: str, claimed): # Runs in a worker process that claims a trial and never finishes it
+    TrialStore(store_path).claim("study", worker_name())
+    claimed.set()
+    time.sleep(TIMEOUT)
+
+
+def test_concurrent_workers_never_claim_the_same_trial(store_path):
+    store = new_study(store_path, 60)
+    start_at, results = time.time() + 1.0, multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=claim_until_empty, args=(store_path, start_at, results)) for _ in range(4)]
+    for worker in workers: # One process per worker; a pool could hand one process several of them in turn
+        worker.start()
+    claims = [results.get(timeout=TIMEOUT) for _ in workers]
+    for worker in workers:
+        worker.join(TIMEOUT)
+    claimed = sorted(trial for worker in claims for trial in worker)
+    assert claimed == list(range(60)) # Every trial exactly once
+    assert sum(1 for worker in claims if worker) > 1 # The workers really competed
+    assert store.counts("study") == {"done": 60}
+
+
+def test_claims_wait_for_another_write_transaction(store_path):
+    new_study(store_path, 1)
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        pool.submit(int).result(TIMEOUT) # Forked before the connection below: SQLite connections must not cross a fork
+        lock = sqlite3.connect(store_path, isolation_level=None)
+        lock.execute("BEGIN IMMEDIATE") # Another process in the middle of its own claim
+        future = pool.submit(claim_one, store_path)
+        time.sleep(1.0)
+        assert not future.done()
+        lock.execute("COMMIT")
+        assert future.result(TIMEOUT) == (0, {"num_leaves": 2})
+    lock.close()
+
+
+def test_trial_of_a_killed_worker_is_reclaimed(store_path):
+    store = new_study(store_path, 1)
+    claimed = multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_trial, args=(store_path, claimed))
+    holder.start()
+    try:
+        assert claimed.wait(TIMEOUT)
+        assert store.claim("study", "main:1") is None # Its worker is alive and its heartbeat is fresh
+    finally:
+        os.kill(holder.pid, signal.SIGKILL)
+        holder.join(TIMEOUT)
+    assert store.claim("study", "main:1") == (0, {"num_leaves": 2})
+    with sqlite3.connect(store_path) as db:
+        assert db.execute("SELECT status, worker FROM trials").fetchall() == [("running", "main:1")]
+
+
+def test_trial_without_a_heartbeat_is_reclaimed_from_another_host(store_path):
+    store = new_study(store_path, 1, stale_after=60.0)
+    assert store.claim("study", "other-host:1") == (0, {"num_leaves": 2})
+    assert store.claim("study", worker_name()) is None # Another host's pid cannot be checked, only its heartbeat
+    with sqlite3.connect(store_path) as db:
+        db.execute("UPDATE trials SET heartbeat = ?", (time.time() - 61.0,))
+    assert store.claim("study", worker_name()) == (0, {"num_leaves": 2})
+
+
+def dead_worker() -> str: # Name of a worker process on this host that has exited
+    process = multiprocessing.Process(target=int)
+    process.start()
+    process.join(TIMEOUT)
+    return f"{socket.gethostname()}:{process.pid}"
+
+
+def test_resumed_search_skips_finished_trials_and_folds(store_path):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(300, 3)), columns=["Glucose", "BMI", "Age"])
+    y = (X["Glucose"] + rng.normal(scale=0.5, size=300) > 0).astype(int).to_numpy()
+    search = StoredTrialSearch({"num_leaves": [3, 5, 7], "n_estimators": [5, 10]}, store_path,
+                               base_params={"min_child_samples": 5}, n_iter=4, cv=2, num_threads=1, poll_seconds=0.1)
+    study_id = search.create_study(X, y)
+
+    # An earlier run finished trial 0 and checkpointed one fold of trial 1 before its worker died (scores that no
+    # real fit would give, so any retraining shows)
+    store, crashed = TrialStore(store_path), dead_worker()
+    first, _ = store.claim(study_id, crashed)
+    store.record_fold(study_id, first, 0, 0.999, 1.0, crashed)
+    store.record_fold(study_id, first, 1, 0.999, 1.0, crashed)
+    store.complete(study_id, first, 0.999)
+    second, _ = store.claim(study_id, crashed)
+    store.record_fold(study_id, second, 0, 0.5, 1.0, crashed)
+
+    search.fit(X, y)
+    assert search.resumed_folds_ == 3 and store.counts(study_id) == {"done": 4}
+    folds = {(trial, fold): (score, worker) for trial, fold, score, _, worker in store.fold_results(study_id)}
+    assert folds[(first, 0)] == folds[(first, 1)] == (0.999, crashed)
+    assert folds[(second, 0)] == (0.5, crashed) and folds[(second, 1)][1] == worker_name()
+    assert len(folds) == 8 and sum(worker == worker_name() for _, worker in folds.values()) == 5
+    scores = {trial: score for trial, _, score in store.completed_trials(study_id)}
+    assert scores[second] == pytest.approx((0.5 + folds[(second, 1)][0]) / 2)
+    assert search.best_score_ == 0.999 and search.best_params_ == store.completed_trials(study_id)[0][1]
+
+    checkpoints = store.fold_results(study_id)
+    again = StoredTrialSearch(search.param_distributions, store_path, base_params={"min_child_samples": 5}, n_iter=4, cv=2,
+                              num_threads=1).fit(X, y) # Same data and settings: the same study, with nothing left to train
+    assert again.study_id_ == study_id and again.resumed_folds_ == 8
+    assert store.fold_results(study_id) == checkpoints and again.best_params_ == search.best_params_
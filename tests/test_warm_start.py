@@ -0,0 +1,193 @@
+# Tests for warm-start retraining (src/warm_start.py, ModelTraining.warm_start_or_search): a booster moved to a refitted
+# scaler must predict exactly what the old booster predicted on the old scaling, including NaN, values lying on a
+# threshold and the zero bin, and a warm-started model below min_metrics must fall back to the full search.
+#   python -m pytest tests
+import numpy as np
+import pandas as pd
+import pytest
+from lightgbm import LGBMClassifier
+from sklearn.preprocessing import RobustScaler
+from src.warm_start import float_key, key_float, move_thresholds, rescale_booster, scaled
+
+
+def make_data(n_rows: int = 2000, seed: int = 0, shift: float = 0.0, missing_rate: float = 0.1):
+    # A count with many rows on its median (the scaled zero bin), a measurement rounded to 0.1, a skewed value
+    # and one on a tiny scale
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(0, 6, n_rows), rng.normal(120 + shift, 30, n_rows).round(1),
+        rng.gamma(2.0, 10.0, n_rows), rng.normal(0.0, 1e-3, n_rows),
+    ]).astype(np.float64)
+    y = (((X[:, 0] > 2) ^ (X[:, 1] > 125)) | (rng.uniform(size=n_rows) < 0.1)).astype(int)
+    if missing_rate:
+        X[rng.uniform(size=X.shape) < missing_rate] = np.nan
+    return X, y
+
+
+def fit(X, y, **params):
+    scaler = RobustScaler().fit(X)
+    params = {"n_estimators": 40, "num_leaves": 15, "min_child_samples": 3, "verbose": -1, **params}
+    return LGBMClassifier(**params).fit(scaler.transform(X), y), scaler
+
+
+def thresholds(booster) -> list: # (feature, threshold) of every split
+    found, stack = [], [tree["tree_structure"] for tree in booster.dump_model()["tree_info"]]
+    while stack:
+        node = stack.pop()
+        if "split_feature" in node:
+            found.append((node["split_feature"], node["threshold"]))
+            stack += [node["left_child"], node["right_child"]]
+    return found
+
+
+def probe_rows(X, old, new) -> np.ndarray: # One feature at a time set to values on or around the split points
+    grids = [
+        np.arange(-1.0, 7.0, 0.5), # Between and on the counts
+        np.round(np.arange(0.0, 250.0, 0.05), 2), # Midpoints of the 0.1 grid lie exactly on LightGBM's thresholds
+        np.unique(X[:, 2]),
+        np.unique(X[:, 3]),
+    ]
+    base, rows = np.nanmedian(X, axis=0), []
+    for feature, grid in enumerate(grids):
+        for value in np.concatenate([grid, [old.center_[feature], new.center_[feature], np.nan]]):
+            row = base.copy()
+            row[feature] = value
+            rows.append(row)
+    return np.array(rows)
+
+
+@pytest.mark.parametrize("missing_rate", [0.1, 0.0])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_rescaled_booster_predicts_exactly_like_the_old_one(seed, missing_rate):
+    X, y = make_data(seed=seed, missing_rate=missing_rate)
+    model, old = fit(X, y)
+    X_new, _ = make_data(seed=seed + 10, shift=7.0) # Newer data: a shifted center and a different scale
+    new = RobustScaler().fit(X_new)
+    assert not np.allclose(old.center_, new.center_) and not np.allclose(old.scale_, new.scale_)
+    assert any(abs(t) <= 1e-34 for _, t in thresholds(model.booster_)) # LightGBM's +-1e-35 splits around the zero bin
+
+    booster = rescale_booster(model.booster_, old.center_, old.scale_, new.center_, new.scale_)
+    X_test = np.vstack([X, X_new, probe_rows(X, old, new)])
+    np.testing.assert_array_equal(booster.predict(new.transform(X_test)), model.booster_.predict(old.transform(X_test)))
+    np.testing.assert_array_equal(booster.predict(new.transform(X_test), pred_leaf=True),
+                                  model.booster_.predict(old.transform(X_test), pred_leaf=True))
+
+
+def test_moved_thresholds_send_every_raw_value_the_same_way():
+    # Around each cutoff, raw values the old split sent left still go left; one it sent right may only go left when
+    # the new scaling maps it onto the very float of the new threshold (two raw values, one scaled value)
+    rng = np.random.default_rng(4)
+    n = 500
+    threshold = np.concatenate([rng.normal(0, 2, n - 4), [1e-35, -1e-35, 1e-300, 0.0]])
+    old_center, new_center = rng.normal(50, 40, n), rng.normal(50, 40, n)
+    old_scale, new_scale = rng.lognormal(0, 3, n), rng.lognormal(0, 3, n)
+    moved = move_thresholds(threshold, old_center, old_scale, new_center, new_scale)
+    cutoff = threshold * old_scale + old_center
+    for step in range(-40, 41):
+        raw = key_float(float_key(cutoff) + step * 997) # Wide enough to cross the cutoff for every scale
+        old_left = scaled(raw, old_center, old_scale) <= threshold
+        new_value = scaled(raw, new_center, new_scale)
+        assert (new_value[old_left] <= moved[old_left]).all()
+        assert (new_value[~old_left] >= moved[~old_left]).all()
+    for step in range(-3, 4): # Right at the cutoff, one float64 apart
+        raw = key_float(float_key(cutoff) + step)
+        old_left = scaled(raw, old_center, old_scale) <= threshold
+        new_value = scaled(raw, new_center, new_scale)
+        assert (new_value[old_left] <= moved[old_left]).all()
+        assert (new_value[~old_left] >= moved[~old_left]).all()
+
+
+def test_splits_outside_the_finite_range_keep_their_threshold():
+    threshold = np.array([1e308, -1e308, 0.5])
+    moved = move_thresholds(threshold, np.ones(3), np.full(3, 2.0), np.zeros(3), np.ones(3))
+    np.testing.assert_array_equal(moved, [1e308, -1e308, 2.0])
+
+
+def test_float_keys_follow_the_float_order():
+    values = np.array([-np.inf, -1e300, -1.0, -5e-324, -0.0, 5e-324, 1e-300, 1.0, np.inf])
+    keys = float_key(values)
+    assert (np.diff(keys) > 0).all()
+    np.testing.assert_array_equal(key_float(keys), values)
+    assert float_key(np.array([5e-324]))[0] - float_key(np.array([0.0]))[0] == 1
+
+
+def test_zero_as_missing_models_are_rejected():
+    X, y = make_data(missing_rate=0.0)
+    model, scaler = fit(X, y, zero_as_missing=True)
+    with pytest.raises(ValueError, match="Zero-as-missing"):
+        rescale_booster(model.booster_, scaler.center_, scaler.scale_, scaler.center_, scaler.scale_)
+
+
+def test_categorical_models_are_rejected():
+    X, y = make_data(missing_rate=0.0)
+    model = LGBMClassifier(n_estimators=5, verbose=-1, min_data_per_group=5, cat_smooth=1).fit(X, y, categorical_feature=[0])
+    assert any(tree["tree_structure"].get("decision_type") == "==" for tree in model.booster_.dump_model()["tree_info"])
+    with pytest.raises(ValueError, match="categorical"):
+        rescale_booster(model.booster_, np.zeros(4), np.ones(4), np.ones(4), np.ones(4))
+
+
+class RecordingMlflow: # Stands in for the mlflow module inside src.model_training
+
+    def __init__(self):
+        self.tags, self.params, self.metrics = {}, {}, {}
+
+    def set_tag(self, name, value):
+        self.tags[name] = value
+
+    def log_params(self, params):
+        self.params.update(params)
+
+    def log_metrics(self, metrics):
+        self.metrics.update(metrics)
+
+
+@pytest.fixture
+def trainer(monkeypatch):
+    import src.model_training as model_training
+    recorder = RecordingMlflow()
+    monkeypatch.setattr(model_training, "mlflow", recorder)
+    training = model_training.ModelTraining(model_training.CONFIG_PATH)
+    training.training_mode = "incremental"
+    training.incremental_params = {**training.incremental_params, "min_metrics": {"f1_score": 0.6, "recall": 0.6}}
+    training.searched = []
+    monkeypatch.setattr(training, "train_model", lambda X, y, dataset=None: training.searched.append(len(X)) or searched_model)
+    return training, recorder
+
+
+def frames(seed: int = 0):
+    X, y = make_data(n_rows=600, seed=seed, missing_rate=0.0)
+    return pd.DataFrame(X, columns=["a", "b", "c", "d"]), pd.Series(y)
+
+
+X_TRAIN, Y_TRAIN = frames(0)
+X_TEST, Y_TEST = frames(1)
+searched_model = LGBMClassifier(n_estimators=20, verbose=-1).fit(X_TRAIN, Y_TRAIN)
+
+
+def test_warm_start_kept_when_it_meets_min_metrics(trainer, monkeypatch):
+    training, recorder = trainer
+    good = LGBMClassifier(n_estimators=20, verbose=-1).fit(X_TRAIN, Y_TRAIN)
+    monkeypatch.setattr(training, "warm_start_model", lambda X, y: (good, {"extra_rounds": 20}))
+    assert training.warm_start_or_search(X_TRAIN, Y_TRAIN, X_TEST, Y_TEST) is good
+    assert training.searched == [] and recorder.tags["TrainingMode"] == "incremental"
+    assert recorder.params == {"extra_rounds": 20} and recorder.metrics["f1_score"] >= 0.6
+
+
+@pytest.mark.filterwarnings("ignore:Precision is ill-defined")
+def test_warm_start_below_min_metrics_falls_back_to_the_search(trainer, monkeypatch):
+    training, recorder = trainer
+    labels = np.zeros(len(X_TRAIN), dtype=int)
+    labels[0] = 1 # Learns to predict only the negative class, so recall is 0
+    weak = LGBMClassifier(n_estimators=1, verbose=-1).fit(X_TRAIN, labels)
+    monkeypatch.setattr(training, "warm_start_model", lambda X, y: (weak, {"extra_rounds": 20}))
+    assert training.warm_start_or_search(X_TRAIN, Y_TRAIN, X_TEST, Y_TEST) is searched_model
+    assert training.searched == [len(X_TRAIN)]
+    assert recorder.tags["TrainingMode"] == "full" and "recall" in recorder.tags["WarmStartRejected"]
+    assert "extra_rounds" not in recorder.params # Params of a rejected warm start are never logged
+
+
+def test_no_previous_model_runs_the_search(trainer, monkeypatch):
+    training, recorder = trainer
+    monkeypatch.setattr(training, "warm_start_model", lambda X, y: (None, None))
+    assert training.warm_start_or_search(X_TRAIN, Y_TRAIN, X_TEST, Y_TEST) is searched_model
+    assert training.searched == [len(X_TRAIN)] and "WarmStartRejected" not in recorder.tags
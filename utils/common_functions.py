@@ -1,5 +1,6 @@
 import os
-import pandas as pd
+import json
+import numpy as np
 from src.logger import get_logger
 from src.custom_exception import CustomException
 import yaml
@@ -20,11 +21,125 @@ def read_yaml(file_path): # Function to read a YAML file
         logger.error("Error while reading YAML file") # Log error message
         raise CustomException("Failed to read YAMl file" , e) # Raise custom exception with error message and original exception
 
-def load_data(path):
+def load_data(path, mmap=True):
     try:
+        import pandas as pd # Imported on first use, so read_yaml (and the server) never pay for it
         logger.info(f"Loading data from {path}") # Log the data loading process
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".npy":
+            return _load_npy(path, mmap) # Columnar float matrix, memory-mapped by default
+        if extension == ".parquet":
+            return pd.read_parquet(path, memory_map=mmap) # Requires pyarrow
         return pd.read_csv(path) # Read and return the CSV data as a DataFrame
     except Exception as e: # Handle exceptions
         logger.error(f"Error while loading data {e}")
         raise CustomException("Failed to load data", e) # Raise custom exception with error message and original exception
-    
\ No newline at end of file
+
+def save_data(df, path): # Write a DataFrame in the format given by the file extension
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".npy":
+            _save_npy(df, path)
+        elif extension == ".parquet":
+            df.to_parquet(path, index=False) # Requires pyarrow
+        else:
+            df.to_csv(path, index=False)
+        logger.info(f"Data saved successfully to {path}")
+    except Exception as e:
+        logger.error(f"Error while saving data to {path}: {e}")
+        raise CustomException("Failed to save data", e)
+
+def iter_data_chunks(path, chunk_size): # Yield DataFrames of at most chunk_size rows without loading the whole file
+    try:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in (".npy", ".parquet"): # CSV, read by pandas in chunks
+            import pandas as pd
+            with pd.read_csv(path, chunksize=chunk_size) as reader:
+                yield from reader
+            return
+        if extension == ".parquet":
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+            return
+        df = _load_npy(path, mmap=True) # Memory-mapped, so a slice only pages in its own rows
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    except Exception as e:
+        logger.error(f"Error while reading chunks from {path}: {e}")
+        raise CustomException("Failed to read data in chunks", e)
+
+def save_data_chunks(chunks, path, n_rows=None): # Write an iterable of DataFrames as one file, one chunk in memory at a time
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".npy":
+            if n_rows is None: # The memmap needs its final shape up front
+                import pandas as pd
+                save_data(pd.concat(list(chunks), ignore_index=True), path)
+                return
+            _save_npy_chunks(chunks, path, n_rows)
+        elif extension == ".parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            writer = None
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = writer or pq.ParquetWriter(path, table.schema)
+                if table.schema != writer.schema: # e.g. an int column of the first chunk with missing values in this one
+                    table = table.cast(writer.schema) # Missing values become nulls; a lossy cast raises
+                writer.write_table(table)
+            if writer is not None:
+                writer.close()
+        else:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(path, index=False, mode="w" if i == 0 else "a", header=i == 0)
+        logger.info(f"Data saved successfully to {path}")
+    except Exception as e:
+        logger.error(f"Error while saving data to {path}: {e}")
+        raise CustomException("Failed to save data", e)
+
+def schema_path(path): # Sidecar file holding the column names and dtypes of a .npy file
+    return os.path.splitext(path)[0] + ".schema.json"
+
+def _save_npy(df, path): # One column-major float64 matrix, so every column is a contiguous slice
+    import pandas as pd
+    non_numeric = [col for col in df.columns if not pd.api.types.is_numeric_dtype(df[col])]
+    if non_numeric:
+        raise ValueError(f"The .npy format only stores numeric columns, got {non_numeric}")
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=df.shape, fortran_order=True)
+    for i, col in enumerate(df.columns):
+        matrix[:, i] = df[col].to_numpy(dtype=np.float64)
+    matrix.flush()
+    del matrix
+    with open(schema_path(path), "w") as f:
+        json.dump({"columns": [str(col) for col in df.columns], "dtypes": [str(dtype) for dtype in df.dtypes]}, f, indent=2)
+
+def _save_npy_chunks(chunks, path, n_rows):
+    matrix, start, first, dtypes = None, 0, None, None
+    for chunk in chunks:
+        if matrix is None:
+            first, dtypes = chunk, list(chunk.dtypes) # Column names and dtypes for the schema
+            matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(n_rows, chunk.shape[1]), fortran_order=True)
+        matrix[start:start + len(chunk)] = chunk.to_numpy(dtype=np.float64)
+        # A column whose dtype differs between chunks (int in one, float with missing values in another) is loaded as stored
+        dtypes = [dtype if dtype == other else np.dtype(np.float64) for dtype, other in zip(dtypes, chunk.dtypes)]
+        start += len(chunk)
+    if matrix is None or start != n_rows:
+        raise ValueError(f"Expected {n_rows} rows for {path}, got {start}")
+    matrix.flush()
+    del matrix
+    with open(schema_path(path), "w") as f:
+        json.dump({"columns": [str(col) for col in first.columns], "dtypes": [str(dtype) for dtype in dtypes]}, f, indent=2)
+
+def _load_npy(path, mmap):
+    import pandas as pd
+    with open(schema_path(path)) as f:
+        schema = json.load(f)
+    matrix = np.load(path, mmap_mode="r" if mmap else None)
+    columns = {}
+    for i, (col, dtype) in enumerate(zip(schema["columns"], schema["dtypes"])):
+        column = matrix[:, i] # A view on the file, no copy for float64 columns
+        columns[col] = column if dtype == "float64" else pd.Series(column, copy=False).astype(dtype) # Also nullable dtypes such as Int64
+    return pd.DataFrame(columns, copy=False)